@@ -2,9 +2,17 @@
 Configuração do Django Admin para o app accounts.
 """
 
-from django.contrib import admin
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, DoctorProfile, AttendantProfile, DoctorSchedule, DoctorAbsence, AccessLog
+from django.utils import timezone
+from .models import (
+    User, DoctorProfile, AttendantProfile, DoctorSchedule, DoctorAbsence, AccessLog,
+    ScheduleTemplate, ScheduleTemplateBlock, OnCallRequirement, BackgroundJob, StoredBlob
+)
+from .scheduling import generate_schedules
 
 
 @admin.register(User)
@@ -52,10 +60,49 @@ class AttendantProfileAdmin(admin.ModelAdmin):
 class DoctorScheduleAdmin(admin.ModelAdmin):
     """Admin para o modelo DoctorSchedule."""
     
-    list_display = ['doctor', 'weekday', 'start_time', 'end_time', 'is_on_call', 'is_active']
-    list_filter = ['weekday', 'is_on_call', 'is_active']
+    list_display = ['doctor', 'date', 'weekday', 'start_time', 'end_time', 'is_on_call', 'is_active']
+    list_filter = ['weekday', 'is_on_call', 'is_active', 'template']
     search_fields = ['doctor__user__first_name', 'doctor__user__last_name']
-    raw_id_fields = ['doctor']
+    raw_id_fields = ['doctor', 'template']
+    date_hierarchy = 'date'
+
+
+class ScheduleTemplateBlockInline(admin.TabularInline):
+    model = ScheduleTemplateBlock
+    extra = 1
+
+
+@admin.register(ScheduleTemplate)
+class ScheduleTemplateAdmin(admin.ModelAdmin):
+    """Admin para o modelo ScheduleTemplate."""
+    
+    list_display = ['name', 'slot_minutes', 'is_active', 'updated_at']
+    list_filter = ['is_active']
+    search_fields = ['name']
+    autocomplete_fields = ['doctors']
+    inlines = [ScheduleTemplateBlockInline]
+    actions = ['generate_next_quarter']
+
+    @admin.action(description='Gerar agenda dos próximos 3 meses')
+    def generate_next_quarter(self, request, queryset):
+        start_date = timezone.localdate() + timedelta(days=1)
+        end_date = start_date + relativedelta(months=3) - timedelta(days=1)
+        stats = generate_schedules(queryset.prefetch_related('blocks'), start_date, end_date)
+        self.message_user(
+            request,
+            f"{stats['created']} horários gerados; {stats['conflicts']} ignorados por sobreposição "
+            f"e {stats['absences']} por ausência.",
+            messages.SUCCESS
+        )
+
+
+@admin.register(OnCallRequirement)
+class OnCallRequirementAdmin(admin.ModelAdmin):
+    """Admin para o modelo OnCallRequirement."""
+    
+    list_display = ['name', 'weekday', 'start_time', 'end_time', 'doctors_required', 'specialty', 'weight', 'is_active']
+    list_filter = ['weekday', 'is_active', 'specialty']
+    search_fields = ['name', 'specialty']
 
 
 @admin.register(DoctorAbsence)
@@ -88,3 +135,22 @@ class AccessLogAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    """Admin para o modelo BackgroundJob."""
+    
+    list_display = ['task', 'status', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'task']
+    readonly_fields = ['task', 'payload', 'attempts', 'error', 'created_at', 'started_at', 'finished_at']
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    """Admin para o modelo StoredBlob."""
+    
+    list_display = ['digest', 'extension', 'size', 'ref_count', 'updated_at']
+    list_filter = ['extension']
+    search_fields = ['digest']
+    readonly_fields = ['digest', 'extension', 'size', 'ref_count', 'created_at', 'updated_at']
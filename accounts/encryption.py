@@ -0,0 +1,172 @@
+"""
+Criptografia de campos de texto clínico (AES-256-GCM).
+
+Cada valor é gravado como ``enc1:<id da chave>:<base64(nonce + texto cifrado + tag)>``,
+com nonce aleatório de 96 bits por gravação e o campo (``app.modelo.campo``)
+como dado associado: um valor copiado para outro campo ou tabela não é
+aceito. As chaves vêm de FIELD_ENCRYPTION_KEYS (``id:chave em base64``); a
+primeira cifra os valores novos e as demais só são usadas para ler valores
+antigos até o comando ``rotate_encryption_keys`` regravá-los.
+
+Índices de busca sobre campos cifrados usam ``blind_token``: uma marca
+HMAC-SHA256 determinística por termo, com chave derivada da chave principal.
+
+Sem chaves configuradas os valores só são gravados em texto puro se
+FIELD_ENCRYPTION_REQUIRED estiver desligada (padrão apenas com DEBUG); caso
+contrário a gravação é recusada. Valores em texto puro, gravados antes da
+criptografia, continuam legíveis e são cifrados pelo comando de rotação.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+
+PREFIX = 'enc1'
+NONCE_SIZE = 12
+KEY_SIZE = 32
+# Caracteres hexadecimais das marcas de busca (80 bits)
+TOKEN_SIZE = 20
+
+_keyring = None
+_keyring_lock = threading.Lock()
+
+
+class EncryptionError(Exception):
+    """Valor cifrado que não pode ser lido (chave ausente, valor adulterado ou de outro campo)."""
+
+
+class Keyring:
+    """Chaves de criptografia por ID; ``primary_id`` cifra os valores novos."""
+
+    def __init__(self, keys):
+        # Importado só com chaves configuradas: o pacote é exigido apenas em produção
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        self.primary_id = keys[0][0]
+        self.ciphers = {key_id: AESGCM(key) for key_id, key in keys}
+        # Chave própria das marcas de busca, para não reutilizar a do AES
+        self.token_key = hmac.new(keys[0][1], b'search-token', hashlib.sha256).digest()
+
+    def encrypt(self, text, associated_data):
+        nonce = os.urandom(NONCE_SIZE)
+        payload = self.ciphers[self.primary_id].encrypt(nonce, text.encode('utf-8'), associated_data)
+        return f'{PREFIX}:{self.primary_id}:{base64.b64encode(nonce + payload).decode("ascii")}'
+
+    def decrypt(self, token, associated_data):
+        from cryptography.exceptions import InvalidTag
+
+        key_id = token_key_id(token)
+        cipher = self.ciphers.get(key_id)
+        if cipher is None:
+            raise EncryptionError(f'Chave de criptografia "{key_id}" não configurada.')
+        try:
+            data = base64.b64decode(token.split(':', 2)[2], validate=True)
+            return cipher.decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], associated_data).decode('utf-8')
+        except (binascii.Error, InvalidTag, UnicodeDecodeError):
+            raise EncryptionError(f'Valor cifrado inválido com a chave "{key_id}".')
+
+
+def parse_keys(entries):
+    """Converte as entradas ``id:chave em base64`` em pares (id, chave de 32 bytes)."""
+    keys = []
+    for entry in entries:
+        key_id, _, encoded = entry.strip().partition(':')
+        try:
+            key = base64.b64decode(encoded, validate=True)
+        except binascii.Error:
+            key = b''
+        if not key_id or ':' in key_id or len(key) != KEY_SIZE:
+            raise ImproperlyConfigured(
+                f'FIELD_ENCRYPTION_KEYS: use "id:chave" com uma chave de {KEY_SIZE} bytes em base64.'
+            )
+        if key_id in dict(keys):
+            raise ImproperlyConfigured(f'FIELD_ENCRYPTION_KEYS: ID de chave repetido "{key_id}".')
+        keys.append((key_id, key))
+    return keys
+
+
+def get_keyring():
+    """Chaves do processo, ou None se a criptografia não estiver configurada."""
+    global _keyring
+    if _keyring is None:
+        with _keyring_lock:
+            if _keyring is None:
+                keys = parse_keys(settings.FIELD_ENCRYPTION_KEYS)
+                _keyring = Keyring(keys) if keys else False
+    return _keyring or None
+
+
+def reset_keyring():
+    """Descarta as chaves carregadas (após alterar FIELD_ENCRYPTION_KEYS)."""
+    global _keyring
+    with _keyring_lock:
+        _keyring = None
+
+
+def is_encrypted(value):
+    return isinstance(value, str) and value.startswith(PREFIX + ':')
+
+
+def token_key_id(value):
+    """ID da chave de um valor cifrado, ou None para texto puro."""
+    return value.split(':', 2)[1] if is_encrypted(value) else None
+
+
+def encrypt_value(text, associated_data):
+    """
+    Cifra o texto com a chave principal. Sem chaves, retorna o texto puro ou,
+    se FIELD_ENCRYPTION_REQUIRED estiver ligada, levanta EncryptionError.
+    """
+    if not text:
+        return text
+    keyring = get_keyring()
+    if keyring is None:
+        if settings.FIELD_ENCRYPTION_REQUIRED:
+            raise EncryptionError('FIELD_ENCRYPTION_KEYS não está configurada: campo clínico não gravado em texto puro.')
+        return text
+    return keyring.encrypt(text, associated_data)
+
+
+def decrypt_value(value, associated_data):
+    """Texto de um valor gravado, cifrado ou não."""
+    if not is_encrypted(value):
+        return value
+    keyring = get_keyring()
+    if keyring is None:
+        raise EncryptionError('Valor cifrado, mas FIELD_ENCRYPTION_KEYS não está configurada.')
+    return keyring.decrypt(value, associated_data)
+
+
+def blind_token(term):
+    """
+    Marca determinística de um termo para índices de busca sobre campos cifrados
+    (HMAC-SHA256 com a chave principal). Sem chaves, o próprio termo.
+    """
+    keyring = get_keyring()
+    if keyring is None:
+        return term
+    digest = hmac.new(keyring.token_key, term.encode('utf-8'), hashlib.sha256).hexdigest()
+    # Prefixo com letra: o parser do PostgreSQL trataria algumas marcas como números
+    return 't' + digest[:TOKEN_SIZE]
+
+
+@checks.register(checks.Tags.security, deploy=True)
+def check_encryption_keys(app_configs, **kwargs):
+    if settings.FIELD_ENCRYPTION_KEYS:
+        return []
+    if settings.FIELD_ENCRYPTION_REQUIRED:
+        return [checks.Error(
+            'FIELD_ENCRYPTION_KEYS não está configurada: as gravações de campos clínicos cifrados serão recusadas.',
+            id='accounts.E001',
+        )]
+    return [checks.Warning(
+        'FIELD_ENCRYPTION_KEYS não está configurada: os campos clínicos cifrados são gravados em texto puro.',
+        id='accounts.W001',
+    )]
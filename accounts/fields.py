@@ -0,0 +1,51 @@
+"""
+Campos de modelo compartilhados pelos apps.
+"""
+
+from django.apps import apps
+from django.db import models
+
+from .encryption import decrypt_value, encrypt_value
+
+
+class EncryptedTextField(models.TextField):
+    """
+    Texto cifrado com AES-GCM no banco (ver accounts.encryption).
+
+    O valor é decifrado ao ser carregado; listas que não exibem o campo
+    devem usar ``defer()`` para não pagar a decifragem. Como cada gravação
+    usa um nonce diferente, o campo não serve para filtros nem ordenação.
+    """
+
+    description = 'Texto cifrado'
+
+    @property
+    def associated_data(self):
+        return f'{self.model._meta.label_lower}.{self.name}'.encode('ascii')
+
+    def encrypt(self, value):
+        return encrypt_value(value, self.associated_data)
+
+    def decrypt(self, value):
+        return decrypt_value(value, self.associated_data)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.decrypt(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return value
+        return self.encrypt(value)
+
+
+def encrypted_fields(model):
+    """Nomes dos campos cifrados do modelo."""
+    return tuple(field.name for field in model._meta.concrete_fields if isinstance(field, EncryptedTextField))
+
+
+def encrypted_models():
+    """Pares (modelo, campos) de todos os modelos com campos cifrados."""
+    return [(model, fields) for model in apps.get_models() if (fields := encrypted_fields(model))]
@@ -0,0 +1,103 @@
+"""
+Idempotência de requisições POST que criam registros.
+
+O cliente envia uma chave única por submissão (cabeçalho ``Idempotency-Key``
+ou campo oculto ``idempotency_key``). A primeira requisição reserva a chave
+com um INSERT na tabela IdempotencyKey (índice único por usuário e chave) e
+guarda o redirecionamento de sucesso; reenvios com a mesma chave recebem a
+resposta original sem executar a view novamente.
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 64
+
+
+def claim_key(user, key, path):
+    """
+    Reserva a chave para a requisição atual.
+    Retorna (registro, criado); se a chave já existe, o registro é obtido com
+    uma única busca pelo índice (usuário, chave).
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, key=key, path=path, expires_at=expires_at), True
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(user=user, key=key)
+        if record.expires_at <= now:
+            record.delete()
+            return claim_key(user, key, path)
+        return record, False
+
+
+def replay_response(record, path):
+    """Reconstrói a resposta original de uma chave já utilizada."""
+    if record.path != path:
+        return HttpResponse('Chave de idempotência já utilizada em outra operação.', status=422)
+    if record.status_code is None:
+        return HttpResponse('Requisição original ainda em processamento.', status=409)
+    response = HttpResponse(status=record.status_code)
+    if record.location:
+        response['Location'] = record.location
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+class IdempotentPostMixin:
+    """
+    Mixin para views de criação: reenvios de um POST com a mesma chave
+    recebem o redirecionamento original em vez de criar registros duplicados.
+
+    Deve vir depois dos mixins de autenticação/permissão na herança. Apenas
+    respostas de redirecionamento (sucesso) são guardadas; em caso de erro de
+    validação a chave é liberada para que o usuário possa corrigir e reenviar.
+    """
+
+    def get_idempotency_key(self):
+        key = self.request.META.get(IDEMPOTENCY_HEADER) or self.request.POST.get(IDEMPOTENCY_FIELD, '')
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return None
+        return key
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'POST' or not request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+        key = self.get_idempotency_key()
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        record, created = claim_key(request.user, key, request.path)
+        if not created:
+            return replay_response(record, request.path)
+
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if 300 <= response.status_code < 400:
+            record.status_code = response.status_code
+            record.location = response.get('Location', '')[:255]
+            record.save(update_fields=['status_code', 'location'])
+        else:
+            record.delete()
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['idempotency_key'] = self.request.POST.get(IDEMPOTENCY_FIELD) or uuid.uuid4().hex
+        return context
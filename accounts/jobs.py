@@ -0,0 +1,119 @@
+"""
+Fila de tarefas em segundo plano baseada no banco de dados (BackgroundJob).
+
+As views enfileiram tarefas com ``enqueue`` na mesma transação em que gravam
+seus dados; os workers (comando run_jobs) reservam as tarefas pendentes com
+um UPDATE condicional, o que funciona em qualquer banco sem travas, e as
+executam importando a função indicada em ``task``. Tarefas que falham voltam
+à fila até ``max_attempts``; só então o gancho ``on_final_failure`` da
+tarefa, se houver, é chamado para marcar o objeto como falho.
+"""
+
+import logging
+import os
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Espera antes de uma nova tentativa: RETRY_DELAY_SECONDS * tentativas
+RETRY_DELAY_SECONDS = 30
+
+
+def enqueue(task, **payload):
+    """Enfileira a função ``task`` (caminho pontuado) com os parâmetros informados."""
+    return BackgroundJob.objects.create(task=task, payload=payload)
+
+
+def on_final_failure(hook):
+    """
+    Decorador de tarefa: ``hook(error, **payload)`` é chamado quando a tarefa
+    falha na última tentativa (nas anteriores ela apenas volta à fila).
+    """
+    def decorator(task):
+        task.on_final_failure = hook
+        return task
+    return decorator
+
+
+def claim_next():
+    """Reserva a próxima tarefa pendente. Retorna None se a fila estiver vazia."""
+    now = timezone.now()
+    candidates = (
+        BackgroundJob.objects
+        .filter(status='pending', run_after__lte=now)
+        .order_by('run_after', 'pk')
+        .values_list('pk', flat=True)[:10]
+    )
+    for pk in candidates:
+        # Outro worker pode ter reservado a tarefa entre a busca e o UPDATE
+        claimed = BackgroundJob.objects.filter(pk=pk, status='pending').update(
+            status='running', started_at=now
+        )
+        if claimed:
+            return BackgroundJob.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """Executa uma tarefa reservada e registra o resultado."""
+    job.attempts += 1
+    task = None
+    try:
+        task = import_string(job.task)
+        task(**job.payload)
+    except Exception as exc:
+        logger.exception('Falha na tarefa %s', job)
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_DELAY_SECONDS * job.attempts)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            hook = getattr(task, 'on_final_failure', None)
+            if hook is not None:
+                try:
+                    hook(exc, **job.payload)
+                except Exception:
+                    logger.exception('Falha no gancho de falha da tarefa %s', job)
+    else:
+        job.status = 'done'
+        job.error = ''
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'attempts', 'error', 'run_after', 'finished_at'])
+    return job.status == 'done'
+
+
+def run_pending_jobs(limit=None):
+    """Executa as tarefas pendentes até esvaziar a fila (ou atingir ``limit``)."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def work(poll_interval=1.0, stop=None):
+    """Laço de um worker: processa a fila e aguarda quando ela está vazia."""
+    logger.info('Worker %s iniciado', os.getpid())
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        if not run_pending_jobs(limit=100):
+            time.sleep(poll_interval)
+
+
+def requeue_stale(timeout_minutes=30):
+    """Devolve à fila tarefas presas em execução (ex.: worker encerrado no meio)."""
+    limit = timezone.now() - timedelta(minutes=timeout_minutes)
+    return BackgroundJob.objects.filter(status='running', started_at__lt=limit).update(status='pending')
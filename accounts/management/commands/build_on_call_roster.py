@@ -0,0 +1,64 @@
+"""
+Comando para gerar a escala de plantões de um mês.
+"""
+
+import time
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import DoctorProfile, OnCallRequirement
+from accounts.roster import build_roster, save_roster
+
+
+class Command(BaseCommand):
+    help = 'Gera a escala de plantões do mês a partir das coberturas exigidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Mês da escala (AAAA-MM). Padrão: próximo mês')
+        parser.add_argument('--specialty', help='Gera apenas as coberturas desta especialidade')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas exibe a escala, sem gravar')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                start_date = date.fromisoformat(f"{options['month']}-01")
+            except ValueError:
+                raise CommandError('Mês inválido. Use o formato AAAA-MM.')
+        else:
+            start_date = timezone.localdate().replace(day=1) + relativedelta(months=1)
+        end_date = start_date + relativedelta(months=1) - timedelta(days=1)
+
+        doctors = DoctorProfile.objects.filter(is_available=True)
+        requirements = OnCallRequirement.objects.filter(is_active=True)
+        if options['specialty']:
+            # Só as coberturas da especialidade são refeitas: as demais escalas
+            # do período não são tocadas por save_roster
+            doctors = doctors.filter(specialty__iexact=options['specialty'])
+            requirements = requirements.filter(specialty__iexact=options['specialty'])
+        requirements = list(requirements)
+        if not requirements:
+            raise CommandError('Nenhuma cobertura de plantão ativa para gerar.')
+        started = time.perf_counter()
+        roster = build_roster(requirements, start_date, end_date, doctors)
+        elapsed = time.perf_counter() - started
+
+        loads = [load for load in roster['load'].values()]
+        self.stdout.write(
+            f"{len(roster['assignments'])} plantões atribuídos em {elapsed:.1f}s "
+            f"(carga mín./máx.: {min(loads, default=0):.1f}/{max(loads, default=0):.1f})"
+        )
+        for shift, missing in roster['uncovered']:
+            self.stdout.write(self.style.WARNING(
+                f"✗ {shift.requirement.name} em {shift.date:%d/%m/%Y}: faltam {missing} médico(s)"
+            ))
+
+        if options['dry_run']:
+            return
+        stats = save_roster(roster['assignments'], requirements, start_date, end_date)
+        message = f"✓ {stats['created']} plantões gravados"
+        if stats['replaced']:
+            message += f" ({stats['replaced']} plantões gerados antes foram substituídos)"
+        self.stdout.write(self.style.SUCCESS(message))
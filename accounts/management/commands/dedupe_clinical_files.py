@@ -0,0 +1,102 @@
+"""
+Comando que converte os arquivos clínicos gravados antes do armazenamento
+endereçado por conteúdo em blobs, eliminando as cópias duplicadas.
+
+O arquivo antigo nunca é movido antes de o registro apontar para o blob: o
+conteúdo entra no blob por um hardlink (ou cópia), os registros são
+atualizados e só no fim os arquivos antigos que nenhum registro usa mais são
+apagados. Uma execução interrompida pode ser repetida sem perda de arquivos.
+"""
+
+import os
+import shutil
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.storage import (
+    BLOB_DIR, acquire, clean_extension, clinical_file_storage, content_addressed_models, new_temp_path,
+    parse_blob_name
+)
+
+
+def link_into_blob(storage, name):
+    """Grava o conteúdo do arquivo antigo como blob sem alterar o original; retorna o nome do blob."""
+    extension = clean_extension(name)
+    temp_path = new_temp_path(storage.location, suffix=extension)
+    os.remove(temp_path)
+    try:
+        os.link(storage.path(name), temp_path)
+    except OSError:
+        # Sistemas de arquivos sem hardlink
+        shutil.copyfile(storage.path(name), temp_path)
+    return storage.adopt(temp_path, extension)
+
+
+def still_referenced(names):
+    """Dos nomes antigos informados, os que algum registro ainda usa."""
+    referenced = set()
+    for model, fields in content_addressed_models():
+        for field in fields:
+            referenced.update(
+                model._base_manager.filter(**{f'{field}__in': names}).values_list(field, flat=True)
+            )
+    return referenced
+
+
+class Command(BaseCommand):
+    help = 'Converte arquivos clínicos antigos em blobs deduplicados, em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Registros por lote (padrão: 500)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        storage = clinical_file_storage()
+        converted = missing = 0
+        # Um mesmo arquivo antigo pode estar em mais de um registro
+        adopted = {}
+
+        for model, fields in content_addressed_models():
+            for field in fields:
+                legacy = (
+                    model._base_manager
+                    .exclude(**{field: ''})
+                    .exclude(**{f'{field}__startswith': f'{BLOB_DIR}/'})
+                )
+                last_pk = 0
+                while True:
+                    rows = list(
+                        legacy.filter(pk__gt=last_pk).order_by('pk').values_list('pk', field)[:options['chunk_size']]
+                    )
+                    if not rows:
+                        break
+                    last_pk = rows[-1][0]
+                    for pk, name in rows:
+                        if name not in adopted:
+                            if not storage.exists(name):
+                                missing += 1
+                                continue
+                            adopted[name] = link_into_blob(storage, name)
+                        else:
+                            # Cada registro adicional é mais uma referência ao mesmo blob
+                            digest, extension = parse_blob_name(adopted[name])
+                            acquire(digest, extension, 0)
+                        model._base_manager.filter(pk=pk).update(**{field: adopted[name]})
+                        converted += 1
+
+        # Os arquivos antigos só são apagados depois que os registros apontam para os blobs
+        names = list(adopted)
+        referenced = set()
+        for start in range(0, len(names), options['chunk_size']):
+            referenced |= still_referenced(names[start:start + options['chunk_size']])
+        for name in names:
+            if name not in referenced:
+                storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {converted} arquivos convertidos em {len(set(adopted.values()))} blobs '
+            f'em {time.perf_counter() - started:.1f}s'
+        ))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'✗ {missing} registros apontam para arquivos inexistentes'))
@@ -0,0 +1,146 @@
+"""
+Comando que remove do armazenamento endereçado por conteúdo os arquivos sem referências.
+"""
+
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import StoredBlob
+from accounts.storage import (
+    TEMP_DIR, TEMP_PREFIX, blob_name, clinical_file_storage, content_addressed_models, parse_blob_name
+)
+
+
+def referenced_names(names):
+    """Dos nomes informados, os que ainda são usados por algum FileField."""
+    referenced = set()
+    for model, fields in content_addressed_models():
+        for field in fields:
+            referenced.update(
+                model._base_manager.filter(**{f'{field}__in': names}).values_list(field, flat=True)
+            )
+    return referenced
+
+
+class Command(BaseCommand):
+    help = 'Remove arquivos clínicos sem referências (coleta de lixo dos blobs), em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help='Só remove blobs sem referências há pelo menos este tempo (padrão: 24)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Blobs por lote (padrão: 1000)')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recalcula as referências a partir dos registros antes da coleta')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas informa o que seria removido')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        chunk_size = options['chunk_size']
+        storage = clinical_file_storage()
+
+        if options['recount']:
+            fixed = self.recount(chunk_size)
+            self.stdout.write(f'{fixed} contagens de referências corrigidas')
+
+        removed = freed = still_referenced = 0
+        last_digest = ''
+        while True:
+            chunk = list(
+                StoredBlob.objects
+                .filter(ref_count=0, updated_at__lt=cutoff, digest__gt=last_digest)
+                .order_by('digest')
+                .values_list('digest', 'extension', 'size')[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_digest = chunk[-1][0]
+
+            names = {blob_name(digest, extension): (digest, size) for digest, extension, size in chunk}
+            referenced = referenced_names(list(names))
+            still_referenced += len(referenced)
+            candidates = {name: value for name, value in names.items() if name not in referenced}
+            if options['dry_run']:
+                removed += len(candidates)
+                freed += sum(size for _, size in candidates.values())
+                continue
+
+            with transaction.atomic():
+                # Só remove registros que continuam sem referências neste momento
+                doomed = set(
+                    StoredBlob.objects.select_for_update()
+                    .filter(digest__in=[digest for digest, _ in candidates.values()], ref_count=0)
+                    .values_list('digest', flat=True)
+                )
+                StoredBlob.objects.filter(digest__in=doomed).delete()
+                # Os arquivos são removidos com os registros ainda travados: um _commit
+                # concorrente do mesmo conteúdo espera a transação terminar e, sem
+                # registro nem arquivo, grava o conteúdo de novo
+                for name, (digest, size) in candidates.items():
+                    if digest in doomed:
+                        storage.delete_file(name)
+                        removed += 1
+                        freed += size
+
+        temp_removed = 0 if options['dry_run'] else self.purge_temp_files(storage, cutoff)
+
+        verb = 'seriam removidos' if options['dry_run'] else 'removidos'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {removed} arquivos {verb} ({freed / 1024 / 1024:.1f} MB) '
+            f'em {time.perf_counter() - started:.1f}s'
+        ))
+        if temp_removed:
+            self.stdout.write(f'{temp_removed} arquivos temporários abandonados removidos')
+        if still_referenced:
+            self.stdout.write(self.style.WARNING(
+                f'✗ {still_referenced} blobs sem contagem mas ainda referenciados (use --recount)'
+            ))
+
+    def recount(self, chunk_size):
+        """Recalcula ref_count de todos os blobs a partir dos FileFields."""
+        counts = Counter()
+        for model, fields in content_addressed_models():
+            for field in fields:
+                names = model._base_manager.exclude(**{field: ''}).values_list(field, flat=True)
+                for name in names.iterator(chunk_size=chunk_size):
+                    parsed = parse_blob_name(name)
+                    if parsed:
+                        counts[parsed[0]] += 1
+
+        fixed = 0
+        last_digest = ''
+        while True:
+            blobs = list(
+                StoredBlob.objects.filter(digest__gt=last_digest).order_by('digest')[:chunk_size]
+            )
+            if not blobs:
+                break
+            last_digest = blobs[-1].digest
+            changed = []
+            for blob in blobs:
+                if blob.ref_count != counts[blob.digest]:
+                    blob.ref_count = counts[blob.digest]
+                    blob.updated_at = timezone.now()
+                    changed.append(blob)
+            StoredBlob.objects.bulk_update(changed, ['ref_count', 'updated_at'])
+            fixed += len(changed)
+        return fixed
+
+    def purge_temp_files(self, storage, cutoff):
+        """Remove temporários de gravações interrompidas."""
+        directory = storage.path(TEMP_DIR)
+        if not os.path.isdir(directory):
+            return 0
+        removed = 0
+        limit = cutoff.timestamp()
+        for entry in os.scandir(directory):
+            if entry.name.startswith(TEMP_PREFIX) and entry.is_file() and entry.stat().st_mtime < limit:
+                os.remove(entry.path)
+                removed += 1
+        return removed
@@ -0,0 +1,50 @@
+"""
+Comando para gerar as agendas concretas dos médicos a partir dos modelos semanais.
+"""
+
+import time
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import ScheduleTemplate
+from accounts.scheduling import generate_schedules
+
+
+class Command(BaseCommand):
+    help = 'Gera os horários concretos (DoctorSchedule) a partir dos modelos de agenda ativos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Data inicial (AAAA-MM-DD). Padrão: amanhã')
+        parser.add_argument('--months', type=int, default=3, help='Quantidade de meses a gerar (padrão: 3)')
+        parser.add_argument('--template', type=int, action='append', help='ID do modelo (pode repetir)')
+        parser.add_argument('--doctor', type=int, action='append', help='ID do médico (pode repetir)')
+
+    def handle(self, *args, **options):
+        try:
+            start_date = (
+                date.fromisoformat(options['start']) if options['start']
+                else timezone.localdate() + timedelta(days=1)
+            )
+        except ValueError:
+            raise CommandError('Data inicial inválida. Use o formato AAAA-MM-DD.')
+        end_date = start_date + relativedelta(months=options['months']) - timedelta(days=1)
+
+        templates = ScheduleTemplate.objects.filter(is_active=True).prefetch_related('blocks')
+        if options['template']:
+            templates = templates.filter(pk__in=options['template'])
+
+        started = time.perf_counter()
+        stats = generate_schedules(templates, start_date, end_date, doctor_ids=options['doctor'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {stats['created']} horários gerados de {start_date:%d/%m/%Y} a {end_date:%d/%m/%Y} "
+            f"em {elapsed:.1f}s"
+        ))
+        if stats['conflicts'] or stats['absences']:
+            self.stdout.write(self.style.WARNING(
+                f"✗ Ignorados: {stats['conflicts']} por sobreposição, {stats['absences']} por ausência"
+            ))
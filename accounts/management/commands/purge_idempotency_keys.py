@@ -0,0 +1,28 @@
+"""
+Comando para remover chaves de idempotência expiradas.
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Remove as chaves de idempotência expiradas em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tamanho do lote (padrão: 5000)')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            pks = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now)
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'✓ {deleted} chaves expiradas removidas'))
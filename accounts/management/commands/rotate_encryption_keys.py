@@ -0,0 +1,111 @@
+"""
+Comando que regrava os campos cifrados com a chave principal.
+
+Percorre cada modelo com campos cifrados em lotes por ordem de ID (sem
+OFFSET), cada lote em uma transação curta com as linhas travadas: pode
+rodar com o sistema em uso. Só são regravados os valores cifrados com
+outra chave ou ainda em texto puro, com ``bulk_update``. Sem ``--model``,
+os campos cifrados guardados no histórico de versões do prontuário também
+são regravados e a busca textual é reindexada (suas marcas dependem da
+chave principal). Depois de uma rotação completa a chave antiga pode sair de
+FIELD_ENCRYPTION_KEYS.
+"""
+
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models.functions import Cast
+
+from accounts.encryption import get_keyring, token_key_id
+from accounts.fields import encrypted_fields, encrypted_models
+
+
+class Command(BaseCommand):
+    help = 'Cifra novamente os campos clínicos com a chave principal, em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help='Apenas este modelo (ex.: medical_records.MedicalRecord)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Linhas por lote (padrão: 1000)')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Pausa em segundos entre lotes, para aliviar o banco (padrão: 0)')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta os valores a regravar')
+
+    def handle(self, *args, **options):
+        keyring = get_keyring()
+        if keyring is None:
+            raise CommandError('FIELD_ENCRYPTION_KEYS não está configurada.')
+
+        if options['model']:
+            try:
+                model = apps.get_model(options['model'])
+            except (LookupError, ValueError):
+                raise CommandError(f"Modelo não encontrado: {options['model']}")
+            targets = [(model, encrypted_fields(model))]
+            if not targets[0][1]:
+                raise CommandError(f"{options['model']} não tem campos cifrados.")
+        else:
+            targets = encrypted_models()
+
+        for model, fields in targets:
+            started = time.perf_counter()
+            scanned, rewritten = self.rotate_model(model, fields, keyring.primary_id, options)
+            self.report(model._meta.label, scanned, rewritten, started, options)
+
+        if not options['model']:
+            from medical_records.models import MedicalRecordHistory
+            from medical_records.versioning import reseal_history
+
+            started = time.perf_counter()
+            scanned, rewritten = reseal_history(
+                keyring.primary_id, options['batch_size'], options['dry_run'], options['sleep']
+            )
+            self.report(MedicalRecordHistory._meta.label, scanned, rewritten, started, options)
+
+            if not options['dry_run']:
+                from medical_records.search import reindex_all
+
+                started = time.perf_counter()
+                total = reindex_all(batch_size=options['batch_size'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ Busca textual: {total} prontuários reindexados ({time.perf_counter() - started:.1f}s)'
+                ))
+
+    def report(self, label, scanned, rewritten, started, options):
+        verb = 'a regravar' if options['dry_run'] else 'regravados'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {label}: {rewritten} valores {verb} em {scanned} linhas '
+            f'({time.perf_counter() - started:.1f}s)'
+        ))
+
+    def rotate_model(self, model, fields, primary_id, options):
+        # Cast lê o texto gravado sem passar pela decifragem do campo
+        raw = {f'raw_{field}': Cast(field, output_field=models.TextField()) for field in fields}
+        scanned = rewritten = 0
+        last_pk = None
+        while True:
+            with transaction.atomic():
+                queryset = model._base_manager.order_by('pk')
+                if last_pk is not None:
+                    queryset = queryset.filter(pk__gt=last_pk)
+                if not options['dry_run']:
+                    queryset = queryset.select_for_update()
+                rows = list(queryset.annotate(**raw).values_list('pk', *raw)[:options['batch_size']])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                scanned += len(rows)
+
+                for index, field in enumerate(fields, start=1):
+                    model_field = model._meta.get_field(field)
+                    stale = [
+                        model(pk=row[0], **{field: model_field.decrypt(row[index])})
+                        for row in rows if row[index] and token_key_id(row[index]) != primary_id
+                    ]
+                    rewritten += len(stale)
+                    if stale and not options['dry_run']:
+                        model._base_manager.bulk_update(stale, [field])
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return scanned, rewritten
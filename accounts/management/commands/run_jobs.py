@@ -0,0 +1,51 @@
+"""
+Comando que executa os workers da fila de tarefas em segundo plano.
+"""
+
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from accounts.jobs import requeue_stale, run_pending_jobs, work
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas em segundo plano (geração de PDFs, processamento de arquivos etc.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Quantidade de processos worker (padrão: 2)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Intervalo em segundos entre consultas à fila vazia (padrão: 1)')
+        parser.add_argument('--once', action='store_true', help='Processa a fila atual e encerra')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'✗ {requeued} tarefas presas devolvidas à fila'))
+
+        if options['once']:
+            processed = run_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(f'✓ {processed} tarefas processadas'))
+            return
+
+        # As conexões não podem ser compartilhadas entre processos
+        connections.close_all()
+        stop = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(target=work, args=(options['poll_interval'], stop), daemon=True)
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f"✓ {options['workers']} workers iniciados"))
+
+        def shutdown(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        for worker in workers:
+            worker.join()
+        self.stdout.write('Workers encerrados')
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:58
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_profile_picture'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(django.db.models.functions.text.Upper('specialty'), name='doctor_specialty_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Upper('first_name'), django.db.models.functions.text.Upper('last_name'), name='user_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Upper('last_name'), name='user_last_name_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nome')),
+                ('slot_minutes', models.PositiveIntegerField(default=30, verbose_name='Duração do Horário (minutos)')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Modelo de Agenda',
+                'verbose_name_plural': 'Modelos de Agenda',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduleTemplateBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.IntegerField(choices=[(0, 'Segunda-feira'), (1, 'Terça-feira'), (2, 'Quarta-feira'), (3, 'Quinta-feira'), (4, 'Sexta-feira'), (5, 'Sábado'), (6, 'Domingo')], verbose_name='Dia da Semana')),
+                ('block_type', models.CharField(choices=[('work', 'Atendimento'), ('break', 'Intervalo'), ('on_call', 'Plantão')], default='work', max_length=10, verbose_name='Tipo')),
+                ('start_time', models.TimeField(verbose_name='Horário de Início')),
+                ('end_time', models.TimeField(verbose_name='Horário de Término')),
+            ],
+            options={
+                'verbose_name': 'Bloco de Modelo de Agenda',
+                'verbose_name_plural': 'Blocos de Modelos de Agenda',
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='doctorschedule',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='doctorschedule',
+            name='date',
+            field=models.DateField(blank=True, help_text='Preenchido para horários concretos; vazio para horários semanais recorrentes', null=True, verbose_name='Data'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorschedule',
+            index=models.Index(fields=['doctor', 'date'], name='schedule_doctor_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.UniqueConstraint(condition=models.Q(('date__isnull', True)), fields=('doctor', 'weekday', 'start_time'), name='unique_weekly_schedule'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.UniqueConstraint(condition=models.Q(('date__isnull', False)), fields=('doctor', 'date', 'start_time'), name='unique_dated_schedule'),
+        ),
+        migrations.AddField(
+            model_name='scheduletemplateblock',
+            name='template',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocks', to='accounts.scheduletemplate', verbose_name='Modelo de Agenda'),
+        ),
+        migrations.AddField(
+            model_name='scheduletemplate',
+            name='doctors',
+            field=models.ManyToManyField(blank=True, related_name='schedule_templates', to='accounts.doctorprofile', verbose_name='Médicos'),
+        ),
+        migrations.AddField(
+            model_name='doctorschedule',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generated_schedules', to='accounts.scheduletemplate', verbose_name='Modelo de Agenda'),
+        ),
+    ]
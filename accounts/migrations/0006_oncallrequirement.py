@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_schedule_templates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OnCallRequirement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nome do Turno')),
+                ('weekday', models.IntegerField(blank=True, choices=[(0, 'Segunda-feira'), (1, 'Terça-feira'), (2, 'Quarta-feira'), (3, 'Quinta-feira'), (4, 'Sexta-feira'), (5, 'Sábado'), (6, 'Domingo')], help_text='Deixe vazio para aplicar a todos os dias', null=True, verbose_name='Dia da Semana')),
+                ('start_time', models.TimeField(verbose_name='Horário de Início')),
+                ('end_time', models.TimeField(help_text='Se for menor que o início, o plantão termina no dia seguinte', verbose_name='Horário de Término')),
+                ('doctors_required', models.PositiveIntegerField(default=1, verbose_name='Médicos Necessários')),
+                ('specialty', models.CharField(blank=True, help_text='Restringe a escala a médicos desta especialidade', max_length=100, verbose_name='Especialidade')),
+                ('weight', models.DecimalField(decimal_places=2, default=1, help_text='Peso por hora na distribuição justa (ex.: 1.5 para noites de fim de semana)', max_digits=4, verbose_name='Peso')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+            ],
+            options={
+                'verbose_name': 'Cobertura de Plantão',
+                'verbose_name_plural': 'Coberturas de Plantão',
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+    ]
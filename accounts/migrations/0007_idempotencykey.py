@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_oncallrequirement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, verbose_name='Chave')),
+                ('path', models.CharField(max_length=255, verbose_name='Caminho')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, help_text='Vazio enquanto a requisição original está em processamento', null=True, verbose_name='Código de Resposta')),
+                ('location', models.CharField(blank=True, max_length=255, verbose_name='Redirecionamento')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Expira em')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Chave de Idempotência',
+                'verbose_name_plural': 'Chaves de Idempotência',
+                'unique_together': {('user', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:08
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(help_text='Caminho da função que executa a tarefa', max_length=200, verbose_name='Tarefa')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Parâmetros')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Em Execução'), ('done', 'Concluída'), ('failed', 'Falhou')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='Máximo de Tentativas')),
+                ('error', models.TextField(blank=True, verbose_name='Erro')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Executar a partir de')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado em')),
+            ],
+            options={
+                'verbose_name': 'Tarefa em Segundo Plano',
+                'verbose_name_plural': 'Tarefas em Segundo Plano',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Atualizado em'),
+            preserve_default=False,
+        ),
+    ]
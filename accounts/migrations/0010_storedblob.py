@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_doctorprofile_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='SHA-256')),
+                ('extension', models.CharField(blank=True, max_length=10, verbose_name='Extensão')),
+                ('size', models.BigIntegerField(verbose_name='Tamanho (bytes)')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Referências')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Arquivo Armazenado',
+                'verbose_name_plural': 'Arquivos Armazenados',
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='blob_refcount_updated_idx')],
+            },
+        ),
+    ]
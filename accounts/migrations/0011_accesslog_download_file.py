@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_storedblob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accesslog',
+            name='action',
+            field=models.CharField(choices=[('login', 'Login'), ('logout', 'Logout'), ('view_patient', 'Visualização de Paciente'), ('view_record', 'Visualização de Prontuário'), ('create_record', 'Criação de Prontuário'), ('update_record', 'Atualização de Prontuário'), ('generate_pdf', 'Geração de PDF (Receita/Exame)'), ('download_file', 'Download de Arquivo Clínico')], max_length=50, verbose_name='Ação'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_data_exports'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorschedule',
+            name='on_call_requirement',
+            field=models.ForeignKey(blank=True, help_text='Preenchido nos plantões gravados pelo gerador de escalas', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generated_schedules', to='accounts.oncallrequirement', verbose_name='Cobertura de Plantão'),
+        ),
+    ]
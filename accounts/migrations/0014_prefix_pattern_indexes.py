@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:38
+
+import accounts.models
+from django.db import migrations
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_on_call_requirement_schedules'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='doctorprofile',
+            name='doctor_specialty_upper_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_name_upper_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_last_name_upper_idx',
+        ),
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=accounts.models.PrefixIndex(django.db.models.functions.text.Upper('specialty'), name='doctor_specialty_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=accounts.models.PrefixIndex(django.db.models.functions.text.Upper('first_name'), django.db.models.functions.text.Upper('last_name'), name='user_name_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=accounts.models.PrefixIndex(django.db.models.functions.text.Upper('last_name'), name='user_last_name_upper_idx'),
+        ),
+    ]
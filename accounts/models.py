@@ -3,10 +3,30 @@ Modelos para o app de contas e autenticação.
 """
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
+class PrefixIndex(models.Index):
+    """
+    Índice de expressões para buscas por prefixo (``istartswith``). No
+    PostgreSQL usa text_pattern_ops: com colação diferente de C, um btree comum
+    não atende ``UPPER(...) LIKE 'x%'``. Nos demais bancos é um índice comum.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+        index = models.Index(
+            *(OpClass(expression, name='text_pattern_ops') for expression in self.expressions),
+            name=self.name, db_tablespace=self.db_tablespace, condition=self.condition,
+        )
+        return index.create_sql(model, schema_editor, using=using, **kwargs)
+
+
 class User(AbstractUser):
     """
     Modelo de usuário customizado que estende AbstractUser.
@@ -106,6 +126,11 @@ class User(AbstractUser):
         verbose_name = 'Usuário'
         verbose_name_plural = 'Usuários'
         ordering = ['-created_at']
+        indexes = [
+            # Busca por prefixo de nome (autocomplete, sem diferenciar maiúsculas)
+            PrefixIndex(Upper('first_name'), Upper('last_name'), name='user_name_upper_idx'),
+            PrefixIndex(Upper('last_name'), name='user_last_name_upper_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_user_type_display()})"
@@ -177,9 +202,17 @@ class DoctorProfile(models.Model):
         help_text='Indica se o médico está disponível para consultas'
     )
     
+    updated_at = models.DateTimeField(
+        'Atualizado em',
+        auto_now=True
+    )
+    
     class Meta:
         verbose_name = 'Perfil de Médico'
         verbose_name_plural = 'Perfis de Médicos'
+        indexes = [
+            PrefixIndex(Upper('specialty'), name='doctor_specialty_upper_idx'),
+        ]
     
     def __str__(self):
         return f"Dr(a). {self.user.get_full_name()} - CRM: {self.crm}"
@@ -269,13 +302,55 @@ class DoctorSchedule(models.Model):
         default=True
     )
     
+    date = models.DateField(
+        'Data',
+        null=True,
+        blank=True,
+        help_text='Preenchido para horários concretos; vazio para horários semanais recorrentes'
+    )
+    
+    template = models.ForeignKey(
+        'ScheduleTemplate',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='generated_schedules',
+        verbose_name='Modelo de Agenda'
+    )
+    
+    on_call_requirement = models.ForeignKey(
+        'OnCallRequirement',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='generated_schedules',
+        verbose_name='Cobertura de Plantão',
+        help_text='Preenchido nos plantões gravados pelo gerador de escalas'
+    )
+    
     class Meta:
         verbose_name = 'Horário de Médico'
         verbose_name_plural = 'Horários de Médicos'
         ordering = ['weekday', 'start_time']
-        unique_together = ['doctor', 'weekday', 'start_time']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'weekday', 'start_time'],
+                condition=models.Q(date__isnull=True),
+                name='unique_weekly_schedule'
+            ),
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'start_time'],
+                condition=models.Q(date__isnull=False),
+                name='unique_dated_schedule'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='schedule_doctor_date_idx'),
+        ]
     
     def __str__(self):
+        if self.date:
+            return f"{self.doctor.user.get_full_name()} - {self.date.strftime('%d/%m/%Y')} ({self.start_time} - {self.end_time})"
         return f"{self.doctor.user.get_full_name()} - {self.get_weekday_display()} ({self.start_time} - {self.end_time})"
 
 
@@ -304,6 +379,171 @@ class DoctorAbsence(models.Model):
         return f"{self.doctor.user.get_full_name()} - {self.start_datetime.strftime('%d/%m/%Y')}"
 
 
+class ScheduleTemplate(models.Model):
+    """
+    Modelo de agenda semanal (padrão de atendimento) aplicável a vários médicos.
+    É expandido em horários concretos (DoctorSchedule com data) pelo gerador de agendas.
+    """
+    
+    name = models.CharField(
+        'Nome',
+        max_length=100
+    )
+    
+    doctors = models.ManyToManyField(
+        DoctorProfile,
+        related_name='schedule_templates',
+        blank=True,
+        verbose_name='Médicos'
+    )
+    
+    slot_minutes = models.PositiveIntegerField(
+        'Duração do Horário (minutos)',
+        default=30
+    )
+    
+    is_active = models.BooleanField(
+        'Ativo',
+        default=True
+    )
+    
+    created_at = models.DateTimeField(
+        'Criado em',
+        auto_now_add=True
+    )
+    
+    updated_at = models.DateTimeField(
+        'Atualizado em',
+        auto_now=True
+    )
+    
+    class Meta:
+        verbose_name = 'Modelo de Agenda'
+        verbose_name_plural = 'Modelos de Agenda'
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.slot_minutes} min)"
+
+
+class ScheduleTemplateBlock(models.Model):
+    """
+    Bloco de um modelo de agenda: período de atendimento, intervalo ou plantão
+    em um dia da semana.
+    """
+    
+    BLOCK_TYPE_CHOICES = (
+        ('work', 'Atendimento'),
+        ('break', 'Intervalo'),
+        ('on_call', 'Plantão'),
+    )
+    
+    template = models.ForeignKey(
+        ScheduleTemplate,
+        on_delete=models.CASCADE,
+        related_name='blocks',
+        verbose_name='Modelo de Agenda'
+    )
+    
+    weekday = models.IntegerField(
+        'Dia da Semana',
+        choices=DoctorSchedule.WEEKDAY_CHOICES
+    )
+    
+    block_type = models.CharField(
+        'Tipo',
+        max_length=10,
+        choices=BLOCK_TYPE_CHOICES,
+        default='work'
+    )
+    
+    start_time = models.TimeField(
+        'Horário de Início'
+    )
+    
+    end_time = models.TimeField(
+        'Horário de Término'
+    )
+    
+    class Meta:
+        verbose_name = 'Bloco de Modelo de Agenda'
+        verbose_name_plural = 'Blocos de Modelos de Agenda'
+        ordering = ['weekday', 'start_time']
+    
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.get_block_type_display()} ({self.start_time} - {self.end_time})"
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.start_time == self.end_time:
+            raise ValidationError('O horário de término deve ser diferente do de início.')
+        # Apenas plantões podem atravessar a meia-noite
+        if self.block_type != 'on_call' and self.start_time > self.end_time:
+            raise ValidationError('O horário de término deve ser posterior ao de início.')
+
+
+
+
+class OnCallRequirement(models.Model):
+    """
+    Cobertura de plantão exigida por turno, usada pelo gerador de escalas.
+    """
+    
+    name = models.CharField(
+        'Nome do Turno',
+        max_length=100
+    )
+    
+    weekday = models.IntegerField(
+        'Dia da Semana',
+        choices=DoctorSchedule.WEEKDAY_CHOICES,
+        null=True,
+        blank=True,
+        help_text='Deixe vazio para aplicar a todos os dias'
+    )
+    
+    start_time = models.TimeField(
+        'Horário de Início'
+    )
+    
+    end_time = models.TimeField(
+        'Horário de Término',
+        help_text='Se for menor que o início, o plantão termina no dia seguinte'
+    )
+    
+    doctors_required = models.PositiveIntegerField(
+        'Médicos Necessários',
+        default=1
+    )
+    
+    specialty = models.CharField(
+        'Especialidade',
+        max_length=100,
+        blank=True,
+        help_text='Restringe a escala a médicos desta especialidade'
+    )
+    
+    weight = models.DecimalField(
+        'Peso',
+        max_digits=4,
+        decimal_places=2,
+        default=1,
+        help_text='Peso por hora na distribuição justa (ex.: 1.5 para noites de fim de semana)'
+    )
+    
+    is_active = models.BooleanField(
+        'Ativo',
+        default=True
+    )
+    
+    class Meta:
+        verbose_name = 'Cobertura de Plantão'
+        verbose_name_plural = 'Coberturas de Plantão'
+        ordering = ['weekday', 'start_time']
+    
+    def __str__(self):
+        day = self.get_weekday_display() if self.weekday is not None else 'Todos os dias'
+        return f"{self.name} - {day} ({self.start_time} - {self.end_time})"
 
 
 class AccessLog(models.Model):
@@ -319,6 +559,8 @@ class AccessLog(models.Model):
         ('create_record', 'Criação de Prontuário'),
         ('update_record', 'Atualização de Prontuário'),
         ('generate_pdf', 'Geração de PDF (Receita/Exame)'),
+        ('download_file', 'Download de Arquivo Clínico'),
+        ('export_data', 'Exportação de Dados do Paciente'),
     )
     
     user = models.ForeignKey(
@@ -358,3 +600,188 @@ class AccessLog(models.Model):
     
     def __str__(self):
         return f"[{self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}] {self.user.username if self.user else 'N/A'} - {self.get_action_display()}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Chave de idempotência de requisições POST.
+    Guarda a resposta da primeira execução para que reenvios (ex.: rede instável)
+    recebam a mesma resposta em vez de repetir a operação.
+    """
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        verbose_name='Usuário'
+    )
+    
+    key = models.CharField(
+        'Chave',
+        max_length=64
+    )
+    
+    path = models.CharField(
+        'Caminho',
+        max_length=255
+    )
+    
+    status_code = models.PositiveSmallIntegerField(
+        'Código de Resposta',
+        null=True,
+        blank=True,
+        help_text='Vazio enquanto a requisição original está em processamento'
+    )
+    
+    location = models.CharField(
+        'Redirecionamento',
+        max_length=255,
+        blank=True
+    )
+    
+    created_at = models.DateTimeField(
+        'Criado em',
+        auto_now_add=True
+    )
+    
+    expires_at = models.DateTimeField(
+        'Expira em',
+        db_index=True
+    )
+    
+    class Meta:
+        verbose_name = 'Chave de Idempotência'
+        verbose_name_plural = 'Chaves de Idempotência'
+        unique_together = ['user', 'key']
+    
+    def __str__(self):
+        return f"{self.key} ({self.path})"
+
+
+class BackgroundJob(models.Model):
+    """
+    Tarefa executada fora da requisição pelos workers (comando run_jobs).
+    A fila fica no próprio banco, sem depender de serviços externos.
+    """
+    
+    STATUS_CHOICES = (
+        ('pending', 'Pendente'),
+        ('running', 'Em Execução'),
+        ('done', 'Concluída'),
+        ('failed', 'Falhou'),
+    )
+    
+    task = models.CharField(
+        'Tarefa',
+        max_length=200,
+        help_text='Caminho da função que executa a tarefa'
+    )
+    
+    payload = models.JSONField(
+        'Parâmetros',
+        default=dict,
+        blank=True
+    )
+    
+    status = models.CharField(
+        'Status',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    
+    attempts = models.PositiveSmallIntegerField(
+        'Tentativas',
+        default=0
+    )
+    
+    max_attempts = models.PositiveSmallIntegerField(
+        'Máximo de Tentativas',
+        default=3
+    )
+    
+    error = models.TextField(
+        'Erro',
+        blank=True
+    )
+    
+    run_after = models.DateTimeField(
+        'Executar a partir de',
+        default=timezone.now
+    )
+    
+    created_at = models.DateTimeField(
+        'Criado em',
+        auto_now_add=True
+    )
+    
+    started_at = models.DateTimeField(
+        'Iniciado em',
+        null=True,
+        blank=True
+    )
+    
+    finished_at = models.DateTimeField(
+        'Finalizado em',
+        null=True,
+        blank=True
+    )
+    
+    class Meta:
+        verbose_name = 'Tarefa em Segundo Plano'
+        verbose_name_plural = 'Tarefas em Segundo Plano'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
+
+
+class StoredBlob(models.Model):
+    """
+    Arquivo armazenado por conteúdo (ContentAddressedStorage).
+    Cada conteúdo é gravado uma única vez; ref_count indica quantos campos o referenciam.
+    """
+    
+    digest = models.CharField(
+        'SHA-256',
+        max_length=64,
+        primary_key=True
+    )
+    
+    extension = models.CharField(
+        'Extensão',
+        max_length=10,
+        blank=True
+    )
+    
+    size = models.BigIntegerField(
+        'Tamanho (bytes)'
+    )
+    
+    ref_count = models.PositiveIntegerField(
+        'Referências',
+        default=0
+    )
+    
+    created_at = models.DateTimeField(
+        'Criado em',
+        auto_now_add=True
+    )
+    
+    updated_at = models.DateTimeField(
+        'Atualizado em',
+        auto_now=True
+    )
+    
+    class Meta:
+        verbose_name = 'Arquivo Armazenado'
+        verbose_name_plural = 'Arquivos Armazenados'
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at'], name='blob_refcount_updated_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.digest}{self.extension} ({self.ref_count} ref.)"
@@ -0,0 +1,299 @@
+"""
+Gerador de escalas de plantão.
+
+Expande as coberturas exigidas (OnCallRequirement) em turnos concretos e
+distribui os médicos com uma heurística gulosa com reparo:
+
+1. Os turnos mais restritos (menos médicos elegíveis) são preenchidos primeiro,
+   sempre com o médico elegível de menor carga acumulada.
+2. Vagas que ficaram descobertas são reparadas liberando um médico que só
+   estava bloqueado pelo descanso mínimo, realocando o plantão que o bloqueava.
+3. Uma etapa de balanceamento move plantões do médico mais carregado para
+   médicos com menos carga enquanto a diferença diminuir.
+
+Ausências (DoctorAbsence) e horários concretos já existentes (DoctorSchedule)
+são respeitados. O resultado é gravado como DoctorSchedule em uma transação,
+ligado à cobertura que o gerou, substituindo os plantões gerados antes para as
+mesmas coberturas no período: gerar a escala de novo não duplica plantões.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import DoctorAbsence, DoctorProfile, DoctorSchedule
+from .scheduling import MINUTES_PER_DAY, _TIMES, _epoch_day, _epoch_minutes, _minutes
+
+Shift = namedtuple('Shift', ['requirement', 'date', 'start', 'end', 'load'])
+
+
+def expand_requirements(requirements, start_date, end_date):
+    """Gera os turnos concretos do período (início/fim em minutos absolutos)."""
+    shifts = []
+    day = start_date
+    while day <= end_date:
+        base = _epoch_day(day) * MINUTES_PER_DAY
+        for requirement in requirements:
+            if requirement.weekday is not None and requirement.weekday != day.weekday():
+                continue
+            start = base + _minutes(requirement.start_time)
+            end = base + _minutes(requirement.end_time)
+            if end <= start:
+                end += MINUTES_PER_DAY
+            load = float(requirement.weight) * (end - start) / 60
+            shifts.append(Shift(requirement, day, start, end, load))
+        day += timedelta(days=1)
+    return shifts
+
+
+class RosterSolver:
+    """
+    Mantém o estado da escala (bloqueios, plantões e carga por médico)
+    e implementa as etapas gulosa, de reparo e de balanceamento.
+    """
+
+    def __init__(self, shifts, doctors, blocked, existing_on_call, min_rest_minutes):
+        self.shifts = shifts
+        self.doctors = doctors
+        self.blocked = blocked
+        self.on_call = defaultdict(list, {k: list(v) for k, v in existing_on_call.items()})
+        self.rest = min_rest_minutes
+        self.load = {doctor.pk: 0.0 for doctor in doctors}
+        self.assigned = defaultdict(list)  # índice do turno -> médicos
+        self.by_doctor = defaultdict(set)  # médico -> índices dos turnos novos
+
+    def _specialty_ok(self, doctor, shift):
+        specialty = shift.requirement.specialty
+        return not specialty or doctor.specialty.lower() == specialty.lower()
+
+    def _hard_ok(self, doctor_id, shift):
+        """Sem ausências ou outros horários sobrepostos ao turno."""
+        return not any(start < shift.end and shift.start < end for start, end in self.blocked.get(doctor_id, ()))
+
+    def _rest_conflicts(self, doctor_id, shift):
+        """Plantões do médico que violam o descanso mínimo em relação ao turno."""
+        return [
+            (start, end, index) for start, end, index in self.on_call[doctor_id]
+            if start < shift.end + self.rest and shift.start < end + self.rest
+        ]
+
+    def eligible(self, doctor, index):
+        shift = self.shifts[index]
+        return (
+            doctor.pk not in self.assigned[index]
+            and self._specialty_ok(doctor, shift)
+            and self._hard_ok(doctor.pk, shift)
+            and not self._rest_conflicts(doctor.pk, shift)
+        )
+
+    def assign(self, doctor_id, index):
+        shift = self.shifts[index]
+        self.assigned[index].append(doctor_id)
+        self.by_doctor[doctor_id].add(index)
+        self.on_call[doctor_id].append((shift.start, shift.end, index))
+        self.load[doctor_id] += shift.load
+
+    def unassign(self, doctor_id, index):
+        shift = self.shifts[index]
+        self.assigned[index].remove(doctor_id)
+        self.by_doctor[doctor_id].discard(index)
+        self.on_call[doctor_id] = [entry for entry in self.on_call[doctor_id] if entry[2] != index]
+        self.load[doctor_id] -= shift.load
+
+    def _least_loaded(self, index, exclude=()):
+        candidates = [
+            doctor for doctor in self.doctors
+            if doctor.pk not in exclude and self.eligible(doctor, index)
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda doctor: (self.load[doctor.pk], len(self.by_doctor[doctor.pk]), doctor.pk))
+
+    def greedy(self):
+        def flexibility(index):
+            shift = self.shifts[index]
+            return sum(
+                1 for doctor in self.doctors
+                if self._specialty_ok(doctor, shift) and self._hard_ok(doctor.pk, shift)
+            )
+
+        order = sorted(range(len(self.shifts)), key=lambda index: (flexibility(index), self.shifts[index].start))
+        for index in order:
+            for _ in range(self.shifts[index].requirement.doctors_required):
+                doctor = self._least_loaded(index)
+                if doctor is None:
+                    break
+                self.assign(doctor.pk, index)
+
+    def repair(self):
+        """Tenta cobrir vagas descobertas realocando plantões que bloqueiam o descanso."""
+        for index, shift in enumerate(self.shifts):
+            while len(self.assigned[index]) < shift.requirement.doctors_required:
+                if not self._repair_slot(index):
+                    break
+
+    def _repair_slot(self, index):
+        shift = self.shifts[index]
+        candidates = sorted(
+            (
+                doctor for doctor in self.doctors
+                if doctor.pk not in self.assigned[index]
+                and self._specialty_ok(doctor, shift)
+                and self._hard_ok(doctor.pk, shift)
+            ),
+            key=lambda doctor: self.load[doctor.pk]
+        )
+        for doctor in candidates:
+            conflicts = self._rest_conflicts(doctor.pk, shift)
+            # Só é possível liberar plantões gerados nesta escala
+            if any(conflict_index is None for _, _, conflict_index in conflicts):
+                continue
+            moves = []
+            for _, _, conflict_index in conflicts:
+                self.unassign(doctor.pk, conflict_index)
+                replacement = self._least_loaded(conflict_index, exclude={doctor.pk})
+                if replacement is None:
+                    self.assign(doctor.pk, conflict_index)
+                    break
+                self.assign(replacement.pk, conflict_index)
+                moves.append((conflict_index, replacement.pk))
+            else:
+                if self.eligible(doctor, index):
+                    self.assign(doctor.pk, index)
+                    return True
+            # Desfaz as realocações parciais
+            for conflict_index, replacement_id in moves:
+                self.unassign(replacement_id, conflict_index)
+                self.assign(doctor.pk, conflict_index)
+        return False
+
+    def balance(self, max_moves=None):
+        """Move plantões do médico mais carregado enquanto a diferença de carga diminuir."""
+        max_moves = max_moves or 2 * len(self.shifts) + 1
+        for _ in range(max_moves):
+            heaviest = max(self.doctors, key=lambda doctor: self.load[doctor.pk])
+            if not self._move_from(heaviest):
+                break
+
+    def _move_from(self, doctor):
+        for index in sorted(self.by_doctor[doctor.pk], key=lambda i: -self.shifts[i].load):
+            shift = self.shifts[index]
+            lighter = sorted(
+                (other for other in self.doctors if self.load[other.pk] + shift.load < self.load[doctor.pk]),
+                key=lambda other: self.load[other.pk]
+            )
+            for other in lighter:
+                if self.eligible(other, index):
+                    self.unassign(doctor.pk, index)
+                    self.assign(other.pk, index)
+                    return True
+        return False
+
+    def solve(self):
+        self.greedy()
+        self.repair()
+        self.balance()
+        assignments = [
+            (self.shifts[index], doctor_id)
+            for index in sorted(self.assigned) for doctor_id in self.assigned[index]
+        ]
+        uncovered = [
+            (shift, shift.requirement.doctors_required - len(self.assigned[index]))
+            for index, shift in enumerate(self.shifts)
+            if len(self.assigned[index]) < shift.requirement.doctors_required
+        ]
+        return {'assignments': assignments, 'uncovered': uncovered, 'load': dict(self.load)}
+
+
+def _generated_in_period(requirement_ids, start_date, end_date):
+    """Plantões já gravados pelo gerador para as coberturas no período (serão substituídos)."""
+    return DoctorSchedule.objects.filter(
+        on_call_requirement_id__in=requirement_ids,
+        date__gte=start_date,
+        date__lte=end_date,
+    )
+
+
+def _blocked_intervals(doctor_ids, start_date, end_date, requirement_ids=()):
+    """
+    Ausências e horários concretos existentes por médico (minutos absolutos),
+    exceto os plantões gerados antes para as coberturas no período.
+    """
+    blocked = defaultdict(list)
+    existing_on_call = defaultdict(list)
+
+    absences = DoctorAbsence.objects.filter(
+        doctor_id__in=doctor_ids,
+        start_datetime__date__lte=end_date + timedelta(days=1),
+        end_datetime__date__gte=start_date - timedelta(days=1),
+    ).values_list('doctor_id', 'start_datetime', 'end_datetime')
+    for doctor_id, start_datetime, end_datetime in absences:
+        blocked[doctor_id].append((_epoch_minutes(start_datetime), _epoch_minutes(end_datetime)))
+
+    schedules = DoctorSchedule.objects.filter(
+        doctor_id__in=doctor_ids,
+        is_active=True,
+        date__gte=start_date - timedelta(days=1),
+        date__lte=end_date + timedelta(days=1),
+    ).exclude(
+        pk__in=_generated_in_period(requirement_ids, start_date, end_date).values('pk')
+    ).values_list('doctor_id', 'date', 'start_time', 'end_time', 'is_on_call')
+    for doctor_id, day, start_time, end_time, is_on_call in schedules:
+        start = _epoch_day(day) * MINUTES_PER_DAY + _minutes(start_time)
+        end = _epoch_day(day) * MINUTES_PER_DAY + _minutes(end_time)
+        if end <= start:
+            end += MINUTES_PER_DAY
+        if is_on_call:
+            existing_on_call[doctor_id].append((start, end, None))
+        else:
+            blocked[doctor_id].append((start, end))
+
+    return blocked, existing_on_call
+
+
+def build_roster(requirements, start_date, end_date, doctors=None, min_rest_hours=None):
+    """
+    Calcula a escala de plantões do período sem gravar nada.
+
+    Retorna um dict com ``assignments`` (lista de (turno, id do médico)),
+    ``uncovered`` (lista de (turno, vagas faltantes)) e ``load`` (carga por médico).
+    """
+    if doctors is None:
+        doctors = DoctorProfile.objects.filter(is_available=True)
+    doctors = list(doctors)
+    if min_rest_hours is None:
+        min_rest_hours = settings.ON_CALL_MIN_REST_HOURS
+
+    requirements = list(requirements)
+    shifts = expand_requirements(requirements, start_date, end_date)
+    blocked, existing_on_call = _blocked_intervals(
+        [doctor.pk for doctor in doctors], start_date, end_date, [requirement.pk for requirement in requirements]
+    )
+    solver = RosterSolver(shifts, doctors, blocked, existing_on_call, int(min_rest_hours * 60))
+    return solver.solve()
+
+
+def save_roster(assignments, requirements, start_date, end_date, batch_size=1000):
+    """
+    Grava as atribuições como DoctorSchedule de plantão em uma única transação,
+    substituindo os plantões gerados antes para as mesmas coberturas no período.
+    Retorna um dict com as contagens de criados e substituídos.
+    """
+    objects = []
+    for shift, doctor_id in assignments:
+        objects.append(DoctorSchedule(
+            doctor_id=doctor_id,
+            date=shift.date,
+            weekday=shift.date.weekday(),
+            start_time=_TIMES[shift.start % MINUTES_PER_DAY],
+            end_time=_TIMES[shift.end % MINUTES_PER_DAY],
+            is_on_call=True,
+            on_call_requirement=shift.requirement,
+        ))
+    requirement_ids = [requirement.pk for requirement in requirements]
+    with transaction.atomic():
+        replaced, _ = _generated_in_period(requirement_ids, start_date, end_date).delete()
+        DoctorSchedule.objects.bulk_create(objects, batch_size=batch_size)
+    return {'created': len(objects), 'replaced': replaced}
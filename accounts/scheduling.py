@@ -0,0 +1,264 @@
+"""
+Geração de agendas concretas a partir de modelos semanais (ScheduleTemplate).
+
+A expansão é vetorizada com NumPy: as datas do período são geradas como
+datetime64[D] e combinadas com os horários de cada dia da semana. Todos os
+horários são representados como minutos absolutos desde 1970-01-01 (horário
+local), o que permite validar sobreposições em lote com ordenação e busca
+binária antes de gravar tudo com bulk_create.
+"""
+
+from datetime import date, time, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DoctorAbsence, DoctorSchedule
+
+MINUTES_PER_DAY = 24 * 60
+
+# 1970-01-01 foi uma quinta-feira (weekday 3 no padrão do Python)
+EPOCH_WEEKDAY = 3
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Separa os médicos na chave de ordenação (minutos absolutos < 10^9)
+DOCTOR_KEY_OFFSET = 10 ** 9
+
+_TIMES = [time(minute // 60, minute % 60) for minute in range(MINUTES_PER_DAY)]
+
+
+def _minutes(value):
+    """Converte um time em minutos desde a meia-noite."""
+    return value.hour * 60 + value.minute
+
+
+def _epoch_day(value):
+    """Converte uma data em dias desde 1970-01-01."""
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def _epoch_minutes(value):
+    """Converte um datetime (aware ou não) em minutos absolutos no horário local."""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return _epoch_day(value.date()) * MINUTES_PER_DAY + _minutes(value)
+
+
+def weekly_pattern(template, blocks=None):
+    """
+    Calcula, para cada dia da semana, os horários do modelo em minutos desde
+    a meia-noite: (inícios, términos, plantão).
+
+    Blocos de atendimento são fatiados em horários de ``slot_minutes``,
+    descartando os que tocam um intervalo. Plantões viram um único horário e
+    podem atravessar a meia-noite (término menor que o início).
+    """
+    if blocks is None:
+        blocks = list(template.blocks.all())
+    slot = template.slot_minutes
+    pattern = {}
+
+    for weekday in range(7):
+        day_blocks = [block for block in blocks if block.weekday == weekday]
+        breaks = [
+            (_minutes(block.start_time), _minutes(block.end_time))
+            for block in day_blocks if block.block_type == 'break'
+        ]
+        starts, ends, on_call = [], [], []
+
+        for block in day_blocks:
+            start, end = _minutes(block.start_time), _minutes(block.end_time)
+            if block.block_type == 'work':
+                block_starts = np.arange(start, end - slot + 1, slot, dtype=np.int64)
+                block_ends = block_starts + slot
+                keep = np.ones(len(block_starts), dtype=bool)
+                for break_start, break_end in breaks:
+                    keep &= ~((block_starts < break_end) & (block_ends > break_start))
+                starts.append(block_starts[keep])
+                ends.append(block_ends[keep])
+                on_call.append(np.zeros(keep.sum(), dtype=bool))
+            elif block.block_type == 'on_call':
+                if end <= start:
+                    end += MINUTES_PER_DAY
+                starts.append(np.array([start], dtype=np.int64))
+                ends.append(np.array([end], dtype=np.int64))
+                on_call.append(np.ones(1, dtype=bool))
+
+        if starts:
+            pattern[weekday] = (np.concatenate(starts), np.concatenate(ends), np.concatenate(on_call))
+
+    return pattern
+
+
+def expand_template(template, doctor_ids, start_date, end_date, blocks=None):
+    """
+    Expande um modelo semanal em horários concretos para vários médicos.
+
+    Retorna um dict de arrays paralelos: ``doctor``, ``start`` e ``end``
+    (minutos absolutos) e ``on_call``.
+    """
+    days = np.arange(
+        np.datetime64(start_date, 'D'),
+        np.datetime64(end_date, 'D') + 1,
+        dtype='datetime64[D]'
+    ).astype(np.int64)
+    weekdays = (days + EPOCH_WEEKDAY) % 7
+
+    starts, ends, on_call = [], [], []
+    for weekday, (day_starts, day_ends, day_on_call) in weekly_pattern(template, blocks).items():
+        base = days[weekdays == weekday][:, None] * MINUTES_PER_DAY
+        starts.append((base + day_starts[None, :]).ravel())
+        ends.append((base + day_ends[None, :]).ravel())
+        on_call.append(np.broadcast_to(day_on_call, (len(base), len(day_on_call))).ravel())
+
+    if not starts:
+        starts, ends, on_call = [np.empty(0, dtype=np.int64)] * 2 + [np.empty(0, dtype=bool)]
+    else:
+        starts, ends, on_call = np.concatenate(starts), np.concatenate(ends), np.concatenate(on_call)
+
+    doctor_ids = np.asarray(doctor_ids, dtype=np.int64)
+    per_doctor = len(starts)
+    return {
+        'doctor': np.repeat(doctor_ids, per_doctor),
+        'start': np.tile(starts, len(doctor_ids)),
+        'end': np.tile(ends, len(doctor_ids)),
+        'on_call': np.tile(on_call, len(doctor_ids)),
+    }
+
+
+def overlap_mask(slots, existing):
+    """
+    Marca os horários novos que se sobrepõem a horários existentes do mesmo
+    médico ou a outro horário novo anterior (ambos como dicts de arrays).
+
+    Usa chaves (médico, minuto) ordenadas: um horário novo conflita quando o
+    maior término entre os existentes que começam antes do seu término é
+    posterior ao seu início.
+    """
+    new_start = slots['doctor'] * DOCTOR_KEY_OFFSET + slots['start']
+    new_end = slots['doctor'] * DOCTOR_KEY_OFFSET + slots['end']
+    conflicts = np.zeros(len(new_start), dtype=bool)
+
+    if len(existing['start']):
+        ex_start = existing['doctor'] * DOCTOR_KEY_OFFSET + existing['start']
+        ex_end = existing['doctor'] * DOCTOR_KEY_OFFSET + existing['end']
+        order = np.argsort(ex_start, kind='stable')
+        ex_start = ex_start[order]
+        max_end = np.maximum.accumulate(ex_end[order])
+        idx = np.searchsorted(ex_start, new_end, side='left')
+        has_prior = idx > 0
+        conflicts[has_prior] = max_end[idx[has_prior] - 1] > new_start[has_prior]
+
+    # Sobreposição entre os próprios horários novos (ex.: dois modelos no mesmo médico)
+    if len(new_start) > 1:
+        order = np.argsort(new_start, kind='stable')
+        max_end = np.maximum.accumulate(new_end[order])
+        self_conflict = np.zeros(len(order), dtype=bool)
+        self_conflict[1:] = new_start[order][1:] < max_end[:-1]
+        conflicts[order[self_conflict]] = True
+
+    return conflicts
+
+
+def _existing_schedules(doctor_ids, start_date, end_date):
+    """Horários concretos já gravados no período, como dict de arrays."""
+    rows = DoctorSchedule.objects.filter(
+        doctor_id__in=doctor_ids,
+        date__gte=start_date - timedelta(days=1),  # plantões que atravessam a meia-noite
+        date__lte=end_date,
+    ).values_list('doctor_id', 'date', 'start_time', 'end_time')
+
+    doctors, starts, ends = [], [], []
+    for doctor_id, day, start_time, end_time in rows:
+        start = _epoch_day(day) * MINUTES_PER_DAY + _minutes(start_time)
+        end = _epoch_day(day) * MINUTES_PER_DAY + _minutes(end_time)
+        if end <= start:
+            end += MINUTES_PER_DAY
+        doctors.append(doctor_id)
+        starts.append(start)
+        ends.append(end)
+
+    return {
+        'doctor': np.array(doctors, dtype=np.int64),
+        'start': np.array(starts, dtype=np.int64),
+        'end': np.array(ends, dtype=np.int64),
+    }
+
+
+def absence_mask(slots, doctor_ids, start_date, end_date):
+    """Marca os horários que caem em ausências cadastradas (DoctorAbsence)."""
+    mask = np.zeros(len(slots['start']), dtype=bool)
+    absences = DoctorAbsence.objects.filter(
+        doctor_id__in=doctor_ids,
+        start_datetime__date__lte=end_date + timedelta(days=1),
+        end_datetime__date__gte=start_date,
+    ).values_list('doctor_id', 'start_datetime', 'end_datetime')
+
+    for doctor_id, start_datetime, end_datetime in absences:
+        absence_start = _epoch_minutes(start_datetime)
+        absence_end = _epoch_minutes(end_datetime)
+        mask |= (
+            (slots['doctor'] == doctor_id)
+            & (slots['start'] < absence_end)
+            & (slots['end'] > absence_start)
+        )
+    return mask
+
+
+def generate_schedules(templates, start_date, end_date, doctor_ids=None, batch_size=2000):
+    """
+    Gera e grava os horários concretos dos modelos no período informado.
+
+    Horários que se sobrepõem a horários já existentes ou a ausências são
+    ignorados. Retorna um dict com as contagens de criados e ignorados.
+    """
+    batches = []
+    for template in templates:
+        template_doctors = [pk for pk in template.doctors.values_list('pk', flat=True)
+                            if doctor_ids is None or pk in doctor_ids]
+        if not template_doctors:
+            continue
+        slots = expand_template(template, template_doctors, start_date, end_date)
+        slots['template'] = np.full(len(slots['start']), template.pk, dtype=np.int64)
+        batches.append(slots)
+
+    stats = {'created': 0, 'conflicts': 0, 'absences': 0}
+    if not batches:
+        return stats
+
+    slots = {key: np.concatenate([batch[key] for batch in batches]) for key in batches[0]}
+    all_doctors = np.unique(slots['doctor']).tolist()
+
+    with transaction.atomic():
+        absent = absence_mask(slots, all_doctors, start_date, end_date)
+        conflicts = overlap_mask(slots, _existing_schedules(all_doctors, start_date, end_date)) & ~absent
+        keep = ~(absent | conflicts)
+
+        dates = {}
+        objects = []
+        for doctor_id, start, end, on_call, template_id in zip(
+            slots['doctor'][keep].tolist(),
+            slots['start'][keep].tolist(),
+            slots['end'][keep].tolist(),
+            slots['on_call'][keep].tolist(),
+            slots['template'][keep].tolist(),
+        ):
+            day, start_minute = divmod(start, MINUTES_PER_DAY)
+            if day not in dates:
+                dates[day] = date.fromordinal(day + EPOCH_ORDINAL)
+            objects.append(DoctorSchedule(
+                doctor_id=doctor_id,
+                date=dates[day],
+                weekday=(day + EPOCH_WEEKDAY) % 7,
+                start_time=_TIMES[start_minute],
+                end_time=_TIMES[end % MINUTES_PER_DAY],
+                is_on_call=on_call,
+                template_id=template_id,
+            ))
+        DoctorSchedule.objects.bulk_create(objects, batch_size=batch_size)
+
+    stats['created'] = len(objects)
+    stats['conflicts'] = int(conflicts.sum())
+    stats['absences'] = int(absent.sum())
+    return stats
@@ -0,0 +1,41 @@
+"""
+Sinais do app accounts.
+"""
+
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+
+from .encryption import reset_keyring
+from .storage import content_addressed_fields, release
+
+
+@receiver(pre_save, dispatch_uid='release_replaced_blobs')
+def release_replaced_blobs(sender, instance, raw=False, **kwargs):
+    """Libera a referência dos arquivos substituídos ao salvar o registro."""
+    fields = content_addressed_fields(sender)
+    if not fields or raw or instance.pk is None:
+        return
+    old = sender._base_manager.filter(pk=instance.pk).values_list(*fields).first()
+    if old is None:
+        return
+    for field, old_name in zip(fields, old):
+        if old_name and old_name != getattr(instance, field).name:
+            transaction.on_commit(lambda name=old_name: release(name))
+
+
+@receiver(post_delete, dispatch_uid='release_deleted_blobs')
+def release_deleted_blobs(sender, instance, **kwargs):
+    """Libera a referência dos arquivos de um registro excluído."""
+    for field in content_addressed_fields(sender):
+        name = getattr(instance, field).name
+        if name:
+            transaction.on_commit(lambda name=name: release(name))
+
+
+@receiver(setting_changed, dispatch_uid='reset_encryption_keyring')
+def reset_encryption_keyring(setting, **kwargs):
+    """Recarrega as chaves de criptografia quando FIELD_ENCRYPTION_KEYS muda (testes)."""
+    if setting == 'FIELD_ENCRYPTION_KEYS':
+        reset_keyring()
@@ -0,0 +1,197 @@
+"""
+Armazenamento de arquivos clínicos endereçado por conteúdo.
+
+Cada arquivo é gravado uma única vez em ``blobs/ab/cd/<sha256><extensão>``,
+independentemente do nome de upload: conteúdos idênticos (a mesma receita
+regenerada, o mesmo laudo enviado duas vezes) ocupam um único arquivo em
+disco e no backup. A tabela StoredBlob guarda quantos campos referenciam
+cada conteúdo; arquivos sem referências são removidos pelo comando gc_blobs.
+
+Como o nome deriva do conteúdo, a URL de um arquivo nunca muda de conteúdo:
+pode ser guardada em cache indefinidamente, com o próprio hash como ETag forte.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F, FileField
+from django.utils import timezone
+
+from .models import StoredBlob
+
+BLOB_DIR = 'blobs'
+TEMP_DIR = os.path.join(BLOB_DIR, 'tmp')
+TEMP_PREFIX = 'upload_'
+CHUNK_SIZE = 64 * 1024
+
+BLOB_NAME_RE = re.compile(
+    r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?P<extension>\.\w{1,9})?$'
+)
+
+# Arquivos servidos pelo hash podem ser guardados em cache para sempre
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+def blob_name(digest, extension=''):
+    """Caminho relativo (em MEDIA_ROOT) do conteúdo com o hash informado."""
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def parse_blob_name(name):
+    """Retorna (hash, extensão) de um nome de blob, ou None para outros arquivos."""
+    match = BLOB_NAME_RE.match(name or '')
+    if match is None:
+        return None
+    return match.group('digest'), match.group('extension') or ''
+
+
+def clean_extension(name):
+    """Extensão do nome em minúsculas, descartada se não for simples (ex.: ``.pdf``)."""
+    extension = os.path.splitext(name)[1].lower()
+    return extension if re.fullmatch(r'\.\w{1,9}', extension) else ''
+
+
+def new_temp_path(location=None, suffix=''):
+    """
+    Cria um arquivo temporário no diretório de blobs (mesmo sistema de arquivos,
+    para que a gravação final seja um rename atômico). Não acessa o banco, podendo
+    ser usado em processos worker.
+    """
+    directory = os.path.join(location or settings.MEDIA_ROOT, TEMP_DIR)
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX, suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as blob:
+        for chunk in iter(lambda: blob.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def acquire(digest, extension, size):
+    """Incrementa as referências do conteúdo, registrando-o se for novo."""
+    now = timezone.now()
+    if StoredBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + 1, updated_at=now):
+        return
+    try:
+        with transaction.atomic():
+            StoredBlob.objects.create(digest=digest, extension=extension, size=size, ref_count=1)
+    except IntegrityError:
+        # Outro processo registrou o mesmo conteúdo ao mesmo tempo
+        StoredBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + 1, updated_at=now)
+
+
+def release(name):
+    """Decrementa as referências de um blob (o arquivo só é removido pelo gc_blobs)."""
+    parsed = parse_blob_name(name)
+    if parsed is None:
+        return False
+    return bool(StoredBlob.objects.filter(digest=parsed[0], ref_count__gt=0).update(
+        ref_count=F('ref_count') - 1, updated_at=timezone.now()
+    ))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage que grava cada conteúdo uma única vez, pelo hash SHA-256.
+
+    O nome sugerido pelo ``upload_to`` é usado apenas para obter a extensão.
+    Arquivos antigos, gravados antes deste armazenamento, continuam acessíveis
+    pelos nomes originais.
+    """
+
+    def _save(self, name, content):
+        extension = clean_extension(name)
+        temp_path = new_temp_path(self.location, suffix=extension)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, 'wb') as output:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    output.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return self._commit(temp_path, digest.hexdigest(), extension, size)
+
+    def adopt(self, path, extension=None, digest=None):
+        """
+        Move um arquivo já gravado em disco (ex.: PDF gerado em new_temp_path)
+        para o armazenamento e retorna o nome do blob. Se o conteúdo já existir,
+        o arquivo informado é apenas removido. ``digest`` evita reler arquivos
+        cujo SHA-256 já foi calculado.
+        """
+        if extension is None:
+            extension = clean_extension(path)
+        return self._commit(path, digest or file_digest(path), extension, os.path.getsize(path))
+
+    def _commit(self, path, digest, extension, size):
+        name = blob_name(digest, extension)
+        # A referência é registrada antes de mexer no disco: o gc_blobs só remove
+        # arquivos cujo registro está sem referências
+        acquire(digest, extension, size)
+        final_path = self.path(name)
+        try:
+            if os.path.exists(final_path):
+                os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+                os.replace(path, final_path)
+        except BaseException:
+            release(name)
+            raise
+        return name
+
+    def delete(self, name):
+        if parse_blob_name(name) is None:
+            return super().delete(name)
+        release(name)
+
+    def delete_file(self, name):
+        """Remove o arquivo do disco (usado pelo gc_blobs após excluir o registro)."""
+        super().delete(name)
+
+    def etag(self, name):
+        """ETag forte do arquivo: o próprio hash do conteúdo (None para arquivos antigos)."""
+        parsed = parse_blob_name(name)
+        return f'"{parsed[0]}"' if parsed else None
+
+
+_clinical_storage = None
+
+
+def clinical_file_storage():
+    """Armazenamento dos arquivos clínicos (usado como ``storage`` dos FileFields)."""
+    global _clinical_storage
+    if _clinical_storage is None:
+        _clinical_storage = ContentAddressedStorage()
+    return _clinical_storage
+
+
+@lru_cache(maxsize=None)
+def content_addressed_fields(model):
+    """Nomes dos FileFields do modelo que usam ContentAddressedStorage."""
+    return tuple(
+        field.name for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    )
+
+
+def content_addressed_models():
+    """Pares (modelo, campos) de todos os modelos com arquivos endereçados por conteúdo."""
+    return [(model, fields) for model in apps.get_models() if (fields := content_addressed_fields(model))]
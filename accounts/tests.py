@@ -2,9 +2,34 @@
 Testes para o app accounts.
 """
 
+import base64
+import hashlib
+from datetime import date, datetime, time
+from io import StringIO
+
 import pytest
 from django.contrib.auth import get_user_model
-from accounts.models import DoctorProfile, AttendantProfile
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseRedirect
+from django.test import RequestFactory
+from django.utils import timezone
+from django.views import View
+from accounts.encryption import EncryptionError, check_encryption_keys
+from accounts.idempotency import IdempotentPostMixin
+from accounts.models import (
+    DoctorProfile, AttendantProfile, DoctorAbsence, DoctorSchedule, OnCallRequirement, ScheduleTemplate,
+    StoredBlob
+)
+from accounts.roster import build_roster, save_roster
+from accounts.scheduling import generate_schedules
+from accounts.storage import clinical_file_storage
+from appointments.models import Appointment
+from medical_records.models import Exam, MedicalRecord, MedicalRecordHistory
+from medical_records.search import search_records
+from medical_records.versioning import reconstruct_version, record_version
+from patients.models import Patient
 
 User = get_user_model()
 
@@ -60,3 +85,352 @@ class TestDoctorProfile:
         assert profile.crm == '12345-SP'
         assert profile.specialty == 'Cardiologia'
         assert str(profile).startswith('Dr(a).')
+
+
+@pytest.mark.django_db
+class TestScheduleGeneration:
+    """Testes para a geração de agendas a partir de modelos semanais."""
+
+    def _doctor(self, username, crm):
+        user = User.objects.create_user(
+            username=username, password='x', cpf=f'{crm}.000.000-00', user_type='doctor'
+        )
+        return DoctorProfile.objects.create(user=user, crm=crm, specialty='Clínica')
+
+    def _template(self, *doctors):
+        template = ScheduleTemplate.objects.create(name='Manhãs de segunda', slot_minutes=30)
+        template.doctors.add(*doctors)
+        template.blocks.create(weekday=0, block_type='work', start_time=time(8), end_time=time(12))
+        template.blocks.create(weekday=0, block_type='break', start_time=time(10), end_time=time(10, 30))
+        template.blocks.create(weekday=2, block_type='on_call', start_time=time(19), end_time=time(7))
+        return template
+
+    def test_expand_and_skip_existing(self):
+        """Testa expansão, intervalos, plantões noturnos e reexecução idempotente."""
+        doctors = [self._doctor('d1', '111'), self._doctor('d2', '222')]
+        template = self._template(*doctors)
+        # 2026-01-05 é segunda-feira; período de duas semanas
+        stats = generate_schedules([template], date(2026, 1, 5), date(2026, 1, 18))
+
+        assert stats == {'created': 2 * 2 * 8, 'conflicts': 0, 'absences': 0}
+        mondays = DoctorSchedule.objects.filter(doctor=doctors[0], date=date(2026, 1, 5))
+        assert mondays.filter(is_on_call=False).count() == 7
+        assert not mondays.filter(start_time=time(10)).exists()
+        on_call = DoctorSchedule.objects.get(doctor=doctors[0], date=date(2026, 1, 7))
+        assert on_call.is_on_call and on_call.end_time == time(7)
+
+        again = generate_schedules([template], date(2026, 1, 5), date(2026, 1, 18))
+        assert again['created'] == 0
+        assert again['conflicts'] == 32
+
+    def test_absences_are_skipped(self):
+        """Testa que horários durante ausências não são gerados."""
+        doctor = self._doctor('d3', '333')
+        template = self._template(doctor)
+        tz = timezone.get_current_timezone()
+        DoctorAbsence.objects.create(
+            doctor=doctor,
+            start_datetime=datetime(2026, 1, 5, 0, 0, tzinfo=tz),
+            end_datetime=datetime(2026, 1, 5, 23, 59, tzinfo=tz),
+            is_full_day=True,
+        )
+        stats = generate_schedules([template], date(2026, 1, 5), date(2026, 1, 11))
+
+        assert stats['absences'] == 7
+        assert stats['created'] == 1
+
+
+@pytest.mark.django_db
+class TestOnCallRoster:
+    """Testes para o gerador de escalas de plantão."""
+
+    def test_roster_is_fair_and_respects_absences(self):
+        """Testa cobertura completa, descanso mínimo, ausências e gravação."""
+        doctors = []
+        for i in range(4):
+            user = User.objects.create_user(
+                username=f'oc{i}', password='x', cpf=f'{i}{i}{i}.000.000-00', user_type='doctor'
+            )
+            doctors.append(DoctorProfile.objects.create(user=user, crm=f'OC{i}', specialty='Clínica'))
+        OnCallRequirement.objects.create(
+            name='Noturno', start_time=time(19), end_time=time(7), doctors_required=1
+        )
+        tz = timezone.get_current_timezone()
+        DoctorAbsence.objects.create(
+            doctor=doctors[0],
+            start_datetime=datetime(2026, 2, 1, tzinfo=tz),
+            end_datetime=datetime(2026, 2, 14, 23, 59, tzinfo=tz),
+        )
+
+        roster = build_roster(OnCallRequirement.objects.all(), date(2026, 2, 1), date(2026, 2, 28))
+
+        assert roster['uncovered'] == []
+        assert len(roster['assignments']) == 28
+        absent = [shift for shift, doctor_id in roster['assignments'] if doctor_id == doctors[0].pk]
+        assert all(shift.date > date(2026, 2, 14) for shift in absent)
+        loads = sorted(roster['load'].values())
+        assert loads[-1] - loads[0] <= 24  # no máximo dois plantões de diferença
+
+        requirements = list(OnCallRequirement.objects.all())
+        assert save_roster(roster['assignments'], requirements, date(2026, 2, 1), date(2026, 2, 28)) == {
+            'created': 28, 'replaced': 0,
+        }
+        assert DoctorSchedule.objects.filter(is_on_call=True, date__month=2).count() == 28
+
+        # Gerar de novo substitui a escala do período em vez de duplicá-la
+        roster = build_roster(requirements, date(2026, 2, 1), date(2026, 2, 28))
+        assert roster['uncovered'] == [] and len(roster['assignments']) == 28
+        assert save_roster(roster['assignments'], requirements, date(2026, 2, 1), date(2026, 2, 28)) == {
+            'created': 28, 'replaced': 28,
+        }
+        assert DoctorSchedule.objects.filter(is_on_call=True, date__month=2).count() == 28
+
+    def test_specialty_runs_keep_other_rosters(self):
+        """Testa que gerar a escala de uma especialidade não apaga nem refaz a de outra."""
+        for specialty, prefix in (('Pediatria', 'pd'), ('Cardiologia', 'cd')):
+            for i in range(3):
+                user = User.objects.create_user(
+                    username=f'{prefix}{i}', password='x', cpf=f'{prefix}{i}', user_type='doctor'
+                )
+                DoctorProfile.objects.create(user=user, crm=f'{prefix.upper()}{i}', specialty=specialty)
+            OnCallRequirement.objects.create(
+                name=f'Plantão {specialty}', start_time=time(19), end_time=time(7), specialty=specialty
+            )
+
+        call_command('build_on_call_roster', '--month', '2026-02', '--specialty', 'pediatria', stdout=StringIO())
+        call_command('build_on_call_roster', '--month', '2026-02', '--specialty', 'Cardiologia', stdout=StringIO())
+
+        for specialty in ('Pediatria', 'Cardiologia'):
+            shifts = DoctorSchedule.objects.filter(on_call_requirement__specialty=specialty, date__month=2)
+            assert shifts.count() == 28
+            assert set(shifts.values_list('doctor__specialty', flat=True)) == {specialty}
+
+
+@pytest.mark.django_db
+class TestIdempotentPost:
+    """Testes para a camada de idempotência de POSTs."""
+
+    def _view(self):
+        calls = []
+
+        class CreateSomething(IdempotentPostMixin, View):
+            def post(self, request):
+                calls.append(request.POST.get('value'))
+                if request.POST.get('value') == 'invalid':
+                    return HttpResponse('form com erros')
+                return HttpResponseRedirect(f'/done/{len(calls)}/')
+
+        return CreateSomething.as_view(), calls
+
+    def _post(self, view, user, key, value='ok', path='/create/'):
+        request = RequestFactory().post(path, {'value': value}, HTTP_IDEMPOTENCY_KEY=key)
+        request.user = user
+        return view(request)
+
+    def test_replay_returns_original_response(self):
+        """Testa que o reenvio devolve a resposta original sem reexecutar."""
+        user = User.objects.create_user(username='idem', password='x', cpf='555.000.000-00')
+        view, calls = self._view()
+
+        first = self._post(view, user, 'abc')
+        second = self._post(view, user, 'abc')
+
+        assert calls == ['ok']
+        assert second.status_code == 302 and second['Location'] == first['Location']
+        assert second['Idempotent-Replayed'] == 'true'
+        assert self._post(view, user, 'abc', path='/other/').status_code == 422
+
+    def test_failed_attempt_releases_key(self):
+        """Testa que erros de validação não bloqueiam um novo envio com a mesma chave."""
+        user = User.objects.create_user(username='idem2', password='x', cpf='556.000.000-00')
+        view, calls = self._view()
+
+        assert self._post(view, user, 'xyz', value='invalid').status_code == 200
+        assert self._post(view, user, 'xyz').status_code == 302
+        assert calls == ['invalid', 'ok']
+
+
+@pytest.mark.django_db
+class TestContentAddressedStorage:
+    """Testes para o armazenamento deduplicado de arquivos clínicos."""
+
+    def test_identical_content_stored_once_and_collected(self, settings, tmp_path):
+        """Testa a deduplicação, as referências, a ETag e a coleta de lixo."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        storage = clinical_file_storage()
+
+        first = storage.save('exams/2026/01/laudo.PDF', ContentFile(b'%PDF-conteudo'))
+        second = storage.save('prescriptions/receita.pdf', ContentFile(b'%PDF-conteudo'))
+        digest = hashlib.sha256(b'%PDF-conteudo').hexdigest()
+
+        assert first == second == f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf'
+        assert storage.etag(first) == f'"{digest}"'
+        assert StoredBlob.objects.get(digest=digest).ref_count == 2
+
+        storage.delete(first)
+        call_command('gc_blobs', '--grace-hours', '0', stdout=StringIO())
+        assert storage.exists(first)
+
+        storage.delete(second)
+        call_command('gc_blobs', '--grace-hours', '0', stdout=StringIO())
+        assert not storage.exists(first)
+        assert not StoredBlob.objects.filter(digest=digest).exists()
+
+    def test_recount_keeps_referenced_blobs(self, settings, tmp_path):
+        """Testa que o gc_blobs --recount corrige contagens sem apagar arquivos em uso."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        storage = clinical_file_storage()
+        doctor_user = User.objects.create_user(username='docb', password='x', cpf='700.000.000-00', user_type='doctor')
+        doctor = DoctorProfile.objects.create(user=doctor_user, crm='B1', specialty='Clínica')
+        patient_user = User.objects.create_user(username='pacb', password='x', cpf='701.000.000-00', user_type='patient')
+        patient = Patient.objects.create(user=patient_user)
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, scheduled_date=date(2026, 1, 1), scheduled_time=time(8, 0)
+        )
+        record = MedicalRecord.objects.create(
+            appointment=appointment, patient=patient, doctor=doctor, chief_complaint='x', diagnosis='y'
+        )
+        exam = Exam.objects.create(
+            medical_record=record, patient=patient, doctor=doctor,
+            exam_type='blood', exam_name='Hemograma',
+        )
+        exam.result_file.save('resultado.pdf', ContentFile(b'resultado'))
+        StoredBlob.objects.update(ref_count=0)
+
+        call_command('gc_blobs', '--grace-hours', '0', '--recount', stdout=StringIO())
+
+        assert storage.exists(exam.result_file.name)
+        assert StoredBlob.objects.get().ref_count == 1
+
+    def test_dedupe_keeps_legacy_file_until_rows_point_to_blob(self, settings, tmp_path, monkeypatch):
+        """Testa que uma conversão interrompida não perde o arquivo antigo e pode ser repetida."""
+        from accounts.management.commands import dedupe_clinical_files
+
+        settings.MEDIA_ROOT = str(tmp_path)
+        storage = clinical_file_storage()
+        doctor_user = User.objects.create_user(username='docd', password='x', cpf='710.000.000-00', user_type='doctor')
+        doctor = DoctorProfile.objects.create(user=doctor_user, crm='D1', specialty='Clínica')
+        patient = Patient.objects.create(user=User.objects.create_user(
+            username='pacd', password='x', cpf='711.000.000-00', user_type='patient'
+        ))
+        (tmp_path / 'exams').mkdir()
+        (tmp_path / 'exams' / 'laudo.pdf').write_bytes(b'laudo antigo')
+        exams = [
+            Exam.objects.create(
+                patient=patient, doctor=doctor, exam_type='blood', exam_name='Hemograma', result_file='exams/laudo.pdf',
+            )
+            for _ in range(2)
+        ]
+
+        def crash(*args, **kwargs):
+            raise RuntimeError('queda do processo')
+
+        monkeypatch.setattr(dedupe_clinical_files, 'acquire', crash)
+        with pytest.raises(RuntimeError):
+            call_command('dedupe_clinical_files', stdout=StringIO())
+        assert (tmp_path / 'exams' / 'laudo.pdf').read_bytes() == b'laudo antigo'
+
+        monkeypatch.undo()
+        call_command('dedupe_clinical_files', stdout=StringIO())
+        for exam in exams:
+            exam.refresh_from_db()
+            assert exam.result_file.name.startswith('blobs/')
+            assert exam.result_file.read() == b'laudo antigo'
+            exam.result_file.close()
+        assert not (tmp_path / 'exams' / 'laudo.pdf').exists()
+        assert StoredBlob.objects.get().ref_count == 2
+
+
+KEY_1 = 'k1:' + base64.b64encode(b'1' * 32).decode()
+KEY_2 = 'k2:' + base64.b64encode(b'2' * 32).decode()
+
+
+def raw_column(table, column, pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {column} FROM {table} WHERE id = %s', [pk])
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db
+class TestFieldEncryption:
+    """Testes para os campos clínicos cifrados e a rotação de chaves."""
+
+    @pytest.fixture
+    def record(self):
+        doctor_user = User.objects.create_user(username='docc', password='x', cpf='800.000.000-00', user_type='doctor')
+        doctor = DoctorProfile.objects.create(user=doctor_user, crm='C1', specialty='Clínica')
+        patient_user = User.objects.create_user(username='pacc', password='x', cpf='801.000.000-00', user_type='patient')
+        patient = Patient.objects.create(user=patient_user, medical_notes='Portador de HIV')
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, scheduled_date=date(2026, 1, 1), scheduled_time=time(8, 0)
+        )
+        return MedicalRecord.objects.create(
+            appointment=appointment, patient=patient, doctor=doctor, chief_complaint='Tosse',
+            diagnosis='Pneumonia', physical_examination='Estertores em base direita',
+        )
+
+    @pytest.fixture
+    def encryption_keys(self, settings):
+        pytest.importorskip('cryptography')
+        settings.FIELD_ENCRYPTION_KEYS = [KEY_1]
+        return settings
+
+    def test_plaintext_without_keys(self, settings, record):
+        settings.FIELD_ENCRYPTION_KEYS = []
+        raw = raw_column('medical_records_medicalrecord', 'physical_examination', record.pk)
+        assert raw == 'Estertores em base direita'
+        assert MedicalRecord.objects.get(pk=record.pk).physical_examination == raw
+
+    def test_values_are_encrypted_and_bound_to_field(self, encryption_keys, record):
+        record.save()
+        raw = raw_column('medical_records_medicalrecord', 'physical_examination', record.pk)
+        assert raw.startswith('enc1:k1:') and 'Estertores' not in raw
+        # Nonce por gravação: o mesmo texto gera outro valor
+        record.save()
+        assert raw_column('medical_records_medicalrecord', 'physical_examination', record.pk) != raw
+        assert MedicalRecord.objects.get(pk=record.pk).physical_examination == 'Estertores em base direita'
+        assert 'Pneumonia' not in raw_column('medical_records_medicalrecord', 'diagnosis', record.pk)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE medical_records_medicalrecord SET observations = physical_examination WHERE id = %s', [record.pk]
+            )
+        with pytest.raises(EncryptionError):
+            MedicalRecord.objects.get(pk=record.pk)
+
+    def test_refuses_plaintext_when_required(self, settings, record):
+        settings.FIELD_ENCRYPTION_KEYS = []
+        settings.FIELD_ENCRYPTION_REQUIRED = True
+        record.diagnosis = 'Tuberculose'
+        with pytest.raises(EncryptionError), transaction.atomic():
+            record.save()
+        assert MedicalRecord.objects.get(pk=record.pk).diagnosis == 'Pneumonia'
+        assert [error.id for error in check_encryption_keys(None)] == ['accounts.E001']
+
+    def test_rotation_rewrites_old_and_plaintext_values(self, encryption_keys, record):
+        patient = record.patient
+        patient.save()
+        old_raw = raw_column('patients_patient', 'medical_notes', patient.pk)
+        assert old_raw.startswith('enc1:k1:')
+        # Versão 1 no histórico: alterações e cópia completa cifradas com a k1
+        record_version(record, record.doctor.user, 'created')
+
+        encryption_keys.FIELD_ENCRYPTION_KEYS = [KEY_2, KEY_1]
+        assert Patient.objects.get(pk=patient.pk).medical_notes == 'Portador de HIV'
+        out = StringIO()
+        call_command('rotate_encryption_keys', '--batch-size', '1', stdout=out)
+        assert 'medical_records.MedicalRecord: 3 valores regravados' in out.getvalue()
+        assert 'medical_records.MedicalRecordHistory: 6 valores regravados' in out.getvalue()
+        assert 'Busca textual: 1 prontuários reindexados' in out.getvalue()
+
+        assert raw_column('patients_patient', 'medical_notes', patient.pk).startswith('enc1:k2:')
+        assert raw_column('medical_records_medicalrecord', 'physical_examination', record.pk).startswith('enc1:k2:')
+        snapshot = MedicalRecordHistory.objects.get(medical_record=record).snapshot
+        assert snapshot['diagnosis'].startswith('enc1:k2:')
+        encryption_keys.FIELD_ENCRYPTION_KEYS = [KEY_2]
+        record = MedicalRecord.objects.select_related('patient').get(pk=record.pk)
+        assert record.physical_examination == 'Estertores em base direita'
+        assert record.patient.medical_notes == 'Portador de HIV'
+        assert reconstruct_version(record, 1)['diagnosis'] == 'Pneumonia'
+        # As marcas da busca foram refeitas com a chave nova
+        assert [result[0] for result in search_records(record.doctor.user, 'pneumonia')] == [record]
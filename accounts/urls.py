@@ -33,6 +33,7 @@ urlpatterns = [
     
     # Doctor Management
     path('doctors/', views.DoctorListView.as_view(), name='doctor_list'),
+    path('doctors/autocomplete/', views.DoctorAutocompleteView.as_view(), name='doctor_autocomplete'),
     path('doctors/<int:pk>/schedule/', views.DoctorScheduleView.as_view(), name='doctor_schedule'),
     path('doctors/<int:pk>/absence/', views.DoctorAbsenceCreateView.as_view(), name='doctor_absence_create'),
     
@@ -20,3 +20,33 @@ def log_access(request, action, details=''):
             ip_address=get_client_ip(request),
             details=details
         )
+
+
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_LIMIT = 20
+
+
+def format_cpf_prefix(digits):
+    """
+    Aplica a máscara 000.000.000-00 a um prefixo de dígitos do CPF,
+    permitindo busca por prefixo no campo formatado (e indexado).
+    """
+    digits = digits[:11]
+    parts = [digits[0:3], digits[3:6], digits[6:9]]
+    formatted = '.'.join(part for part in parts if part)
+    if len(digits) > 9:
+        formatted += '-' + digits[9:]
+    # Completa o separador quando o bloco está cheio ("123" -> "123.")
+    if len(digits) in (3, 6):
+        formatted += '.'
+    elif len(digits) == 9:
+        formatted += '-'
+    return formatted
+
+
+def get_autocomplete_term(request):
+    """Retorna o termo de busca normalizado ou None se for curto demais."""
+    term = ' '.join(request.GET.get('q', '').split())
+    if len(term) < AUTOCOMPLETE_MIN_LENGTH:
+        return None
+    return term
@@ -13,10 +13,14 @@ from django.views.generic import (
 from django.db.models import Q
 from .forms import DoctorProfileUpdateForm, AttendantProfileUpdateForm
 from django.contrib import messages
+from django.http import JsonResponse
 from django.utils import timezone
+from django.views import View
+from datetime import timedelta
 
 from .models import User, DoctorProfile, AttendantProfile, DoctorSchedule, DoctorAbsence, AccessLog
 from .forms import UserUpdateForm
+from .utils import AUTOCOMPLETE_LIMIT, get_autocomplete_term
 from .forms import DoctorProfileUpdateForm, AttendantProfileUpdateForm, UserUpdateForm
 
 
@@ -193,6 +197,38 @@ class DoctorListView(LoginRequiredMixin, ListView):
     paginate_by = 20
 
 
+class DoctorAutocompleteView(LoginRequiredMixin, View):
+    """
+    API JSON de autocomplete de médicos por prefixo de nome ou especialidade.
+    Retorna apenas id e rótulo, sem instanciar os modelos.
+    """
+
+    def get(self, request):
+        term = get_autocomplete_term(request)
+        if term is None:
+            return JsonResponse({'results': []})
+
+        first, _, rest = term.partition(' ')
+        name_filter = Q(user__first_name__istartswith=first)
+        if rest:
+            name_filter &= Q(user__last_name__istartswith=rest)
+        else:
+            name_filter |= Q(user__last_name__istartswith=first)
+
+        rows = (
+            DoctorProfile.objects
+            .filter(name_filter | Q(specialty__istartswith=term), is_available=True)
+            .order_by('user__first_name', 'user__last_name')
+            .values_list('pk', 'user__first_name', 'user__last_name', 'specialty')
+            [:AUTOCOMPLETE_LIMIT]
+        )
+        results = [
+            {'id': pk, 'text': f"Dr(a). {first_name} {last_name} - {specialty}"}
+            for pk, first_name, last_name, specialty in rows
+        ]
+        return JsonResponse({'results': results})
+
+
 class DoctorScheduleView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
     """Gerenciamento de horários do médico."""
     template_name = 'accounts/doctor_schedule.html'
@@ -201,7 +237,12 @@ class DoctorScheduleView(LoginRequiredMixin, AdminRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         doctor = get_object_or_404(DoctorProfile, pk=kwargs['pk'])
         context['doctor'] = doctor
-        context['schedules'] = doctor.schedules.all()
+        # Horários semanais recorrentes e os horários concretos das próximas 4 semanas
+        today = timezone.localdate()
+        context['schedules'] = doctor.schedules.filter(date__isnull=True)
+        context['upcoming_schedules'] = doctor.schedules.filter(
+            date__gte=today, date__lt=today + timedelta(weeks=4)
+        ).order_by('date', 'start_time')
         return context
 
 
@@ -0,0 +1,51 @@
+"""
+Widgets compartilhados entre os apps.
+"""
+
+from django import forms
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Select que renderiza apenas a opção selecionada.
+
+    As demais opções são buscadas pelo navegador no endpoint de autocomplete
+    indicado em ``url``, evitando percorrer o queryset inteiro na renderização.
+    """
+
+    def __init__(self, url, attrs=None, min_length=2):
+        attrs = {'class': 'form-control', **(attrs or {})}
+        super().__init__(attrs=attrs)
+        self.url = url
+        self.min_length = min_length
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = str(self.url)
+        context['widget']['attrs']['data-autocomplete-min-length'] = self.min_length
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        """Monta somente a opção vazia e as opções já selecionadas."""
+        selected = {str(v) for v in value if v not in (None, '')}
+        groups = []
+        queryset = getattr(self.choices, 'queryset', None)
+
+        if queryset is None:
+            return super().optgroups(name, value, attrs)
+
+        empty_label = getattr(self.choices.field, 'empty_label', None)
+        if empty_label is not None:
+            groups.append((None, [self.create_option(name, '', empty_label, not selected, 0)], 0))
+
+        if selected:
+            for index, obj in enumerate(queryset.filter(pk__in=selected), start=1):
+                option_value = self.choices.field.prepare_value(obj)
+                label = self.choices.field.label_from_instance(obj)
+                groups.append((None, [self.create_option(name, option_value, label, True, index)], index))
+
+        return groups
+
+
+class AutocompleteSelectMultiple(AutocompleteSelect, forms.SelectMultiple):
+    """Versão de seleção múltipla do AutocompleteSelect."""
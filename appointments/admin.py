@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Appointment, AppointmentNotification, ReturnRequest
+from .models import Appointment, AppointmentNotification, ReturnRequest, ConsultDurationEstimate
 
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
@@ -20,3 +20,9 @@ class ReturnRequestAdmin(admin.ModelAdmin):
     list_display = ['patient', 'doctor', 'status', 'created_at']
     list_filter = ['status']
     raw_id_fields = ['original_appointment', 'patient', 'doctor', 'requested_by', 'new_appointment']
+
+@admin.register(ConsultDurationEstimate)
+class ConsultDurationEstimateAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'appointment_type', 'duration_minutes', 'quantile', 'sample_size', 'updated_at']
+    list_filter = ['appointment_type']
+    raw_id_fields = ['doctor']
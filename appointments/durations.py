@@ -0,0 +1,191 @@
+"""
+Modelo de duração de consultas.
+
+As durações reais são medidas do check-in da consulta até o fechamento do
+prontuário. Para cada par (médico, tipo de consulta) é calculado um quantil
+das durações, de forma vetorizada com NumPy: as amostras são ordenadas por
+grupo e por duração, e o quantil de todos os grupos é obtido de uma vez a
+partir dos índices de início e do tamanho de cada grupo.
+
+As estimativas ficam gravadas em ConsultDurationEstimate e em cache; novas
+consultas usam a estimativa como duração padrão.
+"""
+
+import math
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F
+
+from .models import Appointment, ConsultDurationEstimate
+
+CACHE_KEY = 'consult_duration_estimates'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+MIN_DURATION_MINUTES = 5
+MAX_DURATION_MINUTES = 240
+ROUND_TO_MINUTES = 5
+
+# Minutos de atendimento usados para comparar a capacidade (um turno de 8h)
+CAPACITY_WINDOW_MINUTES = 8 * 60
+
+TYPE_CODES = {value: code for code, (value, _) in enumerate(Appointment.APPOINTMENT_TYPE_CHOICES)}
+TYPE_VALUES = {code: value for value, code in TYPE_CODES.items()}
+
+
+def training_samples():
+    """
+    Retorna arrays (médico, código do tipo, duração em minutos) das consultas
+    com check-in e prontuário fechado, descartando durações implausíveis.
+    """
+    rows = (
+        Appointment.objects
+        .filter(checked_in_at__isnull=False, medical_record__closed_at__isnull=False)
+        .annotate(real_duration=ExpressionWrapper(
+            F('medical_record__closed_at') - F('checked_in_at'), output_field=DurationField()
+        ))
+        .values_list('doctor_id', 'appointment_type', 'real_duration')
+    )
+    doctors, types, minutes = [], [], []
+    for doctor_id, appointment_type, real_duration in rows.iterator(chunk_size=5000):
+        doctors.append(doctor_id)
+        types.append(TYPE_CODES.get(appointment_type, -1))
+        minutes.append(real_duration.total_seconds() / 60)
+
+    doctors = np.array(doctors, dtype=np.int64)
+    types = np.array(types, dtype=np.int64)
+    minutes = np.array(minutes, dtype=np.float64)
+    valid = (types >= 0) & (minutes >= MIN_DURATION_MINUTES) & (minutes <= MAX_DURATION_MINUTES)
+    return doctors[valid], types[valid], minutes[valid]
+
+
+def grouped_quantile(keys, values, quantile):
+    """
+    Quantil (interpolação linear) de ``values`` para cada chave distinta.
+    Retorna (chaves, quantis, tamanhos dos grupos).
+    """
+    if not len(keys):
+        return keys, values, np.zeros(0, dtype=np.int64)
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    position = quantile * (counts - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    fraction = position - low
+    result = values[starts + low] + fraction * (values[starts + high] - values[starts + low])
+    return groups, result, counts
+
+
+def _round_duration(minutes):
+    rounded = math.ceil(minutes / ROUND_TO_MINUTES) * ROUND_TO_MINUTES
+    return int(min(max(rounded, MIN_DURATION_MINUTES), MAX_DURATION_MINUTES))
+
+
+def train(quantile=0.8, min_samples=20):
+    """
+    Recalcula as estimativas por (médico, tipo) e por tipo e substitui as
+    gravadas. Retorna a lista de estimativas criadas.
+    """
+    doctors, types, minutes = training_samples()
+    type_count = len(TYPE_CODES)
+    estimates = []
+
+    keys, values, counts = grouped_quantile(doctors * type_count + types, minutes, quantile)
+    for key, value, count in zip(keys.tolist(), values.tolist(), counts.tolist()):
+        if count >= min_samples:
+            doctor_id, type_code = divmod(key, type_count)
+            estimates.append(ConsultDurationEstimate(
+                doctor_id=doctor_id,
+                appointment_type=TYPE_VALUES[type_code],
+                duration_minutes=_round_duration(value),
+                quantile=quantile,
+                sample_size=count,
+            ))
+
+    keys, values, counts = grouped_quantile(types, minutes, quantile)
+    for type_code, value, count in zip(keys.tolist(), values.tolist(), counts.tolist()):
+        if count >= min_samples:
+            estimates.append(ConsultDurationEstimate(
+                doctor=None,
+                appointment_type=TYPE_VALUES[type_code],
+                duration_minutes=_round_duration(value),
+                quantile=quantile,
+                sample_size=count,
+            ))
+
+    with transaction.atomic():
+        ConsultDurationEstimate.objects.all().delete()
+        ConsultDurationEstimate.objects.bulk_create(estimates)
+    cache.delete(CACHE_KEY)
+    return estimates
+
+
+def get_estimates():
+    """Mapa {(id do médico ou None, tipo): minutos}, mantido em cache."""
+    estimates = cache.get(CACHE_KEY)
+    if estimates is None:
+        estimates = {
+            (doctor_id, appointment_type): duration
+            for doctor_id, appointment_type, duration in ConsultDurationEstimate.objects.values_list(
+                'doctor_id', 'appointment_type', 'duration_minutes'
+            )
+        }
+        cache.set(CACHE_KEY, estimates, CACHE_TIMEOUT)
+    return estimates
+
+
+def estimate_duration(doctor_id, appointment_type):
+    """
+    Duração padrão para uma nova consulta: estimativa do médico, do tipo de
+    consulta ou, na falta de dados, APPOINTMENT_DURATION_MINUTES.
+    """
+    estimates = get_estimates()
+    return (
+        estimates.get((doctor_id, appointment_type))
+        or estimates.get((None, appointment_type))
+        or settings.APPOINTMENT_DURATION_MINUTES
+    )
+
+
+def projected_capacity():
+    """
+    Projeção da capacidade por médico: consultas por turno de 8h com a duração
+    fixa atual e com as durações estimadas, ponderadas pelo perfil de tipos de
+    consulta de cada médico.
+    """
+    mix = (
+        Appointment.objects
+        .exclude(status='cancelled')
+        .values('doctor_id', 'doctor__user__first_name', 'doctor__user__last_name', 'appointment_type')
+        .annotate(total=Count('id'))
+    )
+    doctors = {}
+    for row in mix:
+        doctor = doctors.setdefault(row['doctor_id'], {
+            'doctor_name': f"{row['doctor__user__first_name']} {row['doctor__user__last_name']}",
+            'appointments': 0,
+            'weighted_minutes': 0,
+        })
+        doctor['appointments'] += row['total']
+        doctor['weighted_minutes'] += row['total'] * estimate_duration(row['doctor_id'], row['appointment_type'])
+
+    current_duration = settings.APPOINTMENT_DURATION_MINUTES
+    current_capacity = CAPACITY_WINDOW_MINUTES / current_duration
+    projection = []
+    for doctor_id, doctor in doctors.items():
+        average = doctor['weighted_minutes'] / doctor['appointments']
+        capacity = CAPACITY_WINDOW_MINUTES / average
+        projection.append({
+            'doctor_id': doctor_id,
+            'doctor_name': doctor['doctor_name'],
+            'appointments': doctor['appointments'],
+            'current_duration': current_duration,
+            'estimated_duration': round(average, 1),
+            'current_capacity': round(current_capacity, 1),
+            'projected_capacity': round(capacity, 1),
+            'capacity_change': round((capacity - current_capacity) / current_capacity * 100, 1),
+        })
+    return sorted(projection, key=lambda row: row['doctor_name'])
@@ -4,8 +4,11 @@ Formulários para o app appointments.
 
 from django import forms
 from .models import Appointment
+from .durations import estimate_duration
 from accounts.models import DoctorProfile
+from accounts.widgets import AutocompleteSelect
 from patients.models import Patient
+from django.urls import reverse_lazy
 from django.utils import timezone
 from datetime import timedelta
 
@@ -16,11 +19,12 @@ class PatientAppointmentForm(forms.ModelForm):
     Permite escolher médico, data e hora.
     """
     
+    # Apenas o médico escolhido é carregado; a busca é feita via autocomplete
     doctor = forms.ModelChoiceField(
-        queryset=DoctorProfile.objects.all(),
+        queryset=DoctorProfile.objects.select_related('user'),
         label='Médico',
         empty_label='Selecione um médico',
-        widget=forms.Select(attrs={'class': 'form-control'})
+        widget=AutocompleteSelect(url=reverse_lazy('accounts:doctor_autocomplete'))
     )
     
     scheduled_date = forms.DateField(
@@ -37,6 +41,13 @@ class PatientAppointmentForm(forms.ModelForm):
         widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'})
     )
     
+    appointment_type = forms.ChoiceField(
+        label='Tipo de Consulta',
+        choices=Appointment.APPOINTMENT_TYPE_CHOICES,
+        initial='first_visit',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    
     reason = forms.CharField(
         label='Motivo da Consulta',
         widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3})
@@ -44,7 +55,7 @@ class PatientAppointmentForm(forms.ModelForm):
 
     class Meta:
         model = Appointment
-        fields = ['doctor', 'scheduled_date', 'scheduled_time', 'reason']
+        fields = ['doctor', 'scheduled_date', 'scheduled_time', 'appointment_type', 'reason']
 
     def clean(self):
         cleaned_data = super().clean()
@@ -59,16 +70,27 @@ class PatientAppointmentForm(forms.ModelForm):
             if scheduled_time.hour < 8 or scheduled_time.hour >= 18:
                 raise forms.ValidationError("O horário selecionado está fora do horário comercial (8h às 18h).")
 
-            # 2. Verificar se o médico já tem uma consulta agendada neste horário
-            is_booked = Appointment.objects.filter(
-                doctor=doctor,
-                scheduled_date=scheduled_date,
-                scheduled_time=scheduled_time,
-                status__in=['scheduled', 'confirmed']
-            ).exists()
-
-            if is_booked:
-                raise forms.ValidationError("O médico já possui uma consulta agendada neste horário. Por favor, escolha outro horário.")
+            # 2. Verificar se a consulta, com a duração estimada para o tipo, se sobrepõe
+            # a outra consulta do médico no dia (cada uma com a sua duração gravada)
+            if self.instance.pk is None:
+                duration = estimate_duration(doctor.pk, cleaned_data.get('appointment_type') or 'first_visit')
+            else:
+                duration = self.instance.duration_minutes
+            start = scheduled_time.hour * 60 + scheduled_time.minute
+            booked = (
+                Appointment.objects
+                .filter(doctor=doctor, scheduled_date=scheduled_date, status__in=['scheduled', 'confirmed'])
+                .exclude(pk=self.instance.pk)
+                .values_list('scheduled_time', 'duration_minutes')
+            )
+            for booked_time, booked_duration in booked:
+                booked_start = booked_time.hour * 60 + booked_time.minute
+                if start < booked_start + booked_duration and booked_start < start + duration:
+                    raise forms.ValidationError(
+                        f"O médico já possui uma consulta das {booked_time:%H:%M} às "
+                        f"{(booked_start + booked_duration) // 60:02d}:{(booked_start + booked_duration) % 60:02d}. "
+                        "Por favor, escolha outro horário."
+                    )
 
             # 3. Verificar se o agendamento é para o futuro (já feito no widget, mas bom ter no backend)
             scheduled_datetime = timezone.make_aware(timezone.datetime.combine(scheduled_date, scheduled_time))
@@ -82,6 +104,9 @@ class PatientAppointmentForm(forms.ModelForm):
         if patient:
             appointment.patient = patient
         appointment.status = 'scheduled'
+        if appointment.pk is None:
+            # Duração padrão estimada a partir das consultas reais do médico
+            appointment.duration_minutes = estimate_duration(appointment.doctor_id, appointment.appointment_type)
         
         if commit:
             appointment.save()
@@ -95,12 +120,12 @@ class AttendantAppointmentForm(PatientAppointmentForm):
     """
     
     patient = forms.ModelChoiceField(
-        queryset=Patient.objects.all(),
+        queryset=Patient.objects.select_related('user'),
         label='Paciente',
         empty_label='Selecione um paciente',
-        widget=forms.Select(attrs={'class': 'form-control'})
+        widget=AutocompleteSelect(url=reverse_lazy('patients:patient_autocomplete'))
     )
     
     class Meta:
         model = Appointment
-        fields = ['patient', 'doctor', 'scheduled_date', 'scheduled_time', 'reason']
+        fields = ['patient', 'doctor', 'scheduled_date', 'scheduled_time', 'appointment_type', 'reason']
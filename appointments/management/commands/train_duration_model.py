@@ -0,0 +1,35 @@
+"""
+Comando para recalcular as durações estimadas de consulta.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.durations import projected_capacity, train
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a duração estimada das consultas por médico e tipo de consulta'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quantile', type=float, default=0.8,
+                            help='Quantil das durações reais usado como estimativa (padrão: 0.8)')
+        parser.add_argument('--min-samples', type=int, default=20,
+                            help='Mínimo de consultas por grupo para gerar estimativa (padrão: 20)')
+
+    def handle(self, *args, **options):
+        if not 0 < options['quantile'] < 1:
+            raise CommandError('O quantil deve estar entre 0 e 1.')
+
+        started = time.perf_counter()
+        estimates = train(quantile=options['quantile'], min_samples=options['min_samples'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(estimates)} estimativas calculadas em {elapsed:.2f}s'))
+
+        for row in projected_capacity():
+            self.stdout.write(
+                f"{row['doctor_name']}: {row['estimated_duration']} min em média, "
+                f"{row['current_capacity']} → {row['projected_capacity']} consultas/8h "
+                f"({row['capacity_change']:+.1f}%)"
+            )
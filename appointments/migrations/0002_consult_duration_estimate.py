@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_oncallrequirement'),
+        ('appointments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='checked_in_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Check-in em'),
+        ),
+        migrations.CreateModel(
+            name='ConsultDurationEstimate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_type', models.CharField(choices=[('first_visit', 'Primeira Consulta'), ('return', 'Retorno'), ('emergency', 'Emergência'), ('routine', 'Rotina')], max_length=20, verbose_name='Tipo de Consulta')),
+                ('duration_minutes', models.PositiveIntegerField(verbose_name='Duração Estimada (minutos)')),
+                ('quantile', models.DecimalField(decimal_places=2, max_digits=3, verbose_name='Quantil')),
+                ('sample_size', models.PositiveIntegerField(verbose_name='Amostras')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='duration_estimates', to='accounts.doctorprofile', verbose_name='Médico')),
+            ],
+            options={
+                'verbose_name': 'Estimativa de Duração de Consulta',
+                'verbose_name_plural': 'Estimativas de Duração de Consulta',
+                'ordering': ['doctor', 'appointment_type'],
+                'unique_together': {('doctor', 'appointment_type')},
+            },
+        ),
+    ]
@@ -104,6 +104,12 @@ class Appointment(models.Model):
         blank=True
     )
     
+    checked_in_at = models.DateTimeField(
+        'Check-in em',
+        null=True,
+        blank=True
+    )
+    
     cancellation_reason = models.TextField(
         'Motivo do Cancelamento',
         blank=True
@@ -283,3 +289,56 @@ class ReturnRequest(models.Model):
     
     def __str__(self):
         return f"Retorno - {self.patient.user.get_full_name()} ({self.get_status_display()})"
+
+
+class ConsultDurationEstimate(models.Model):
+    """
+    Duração estimada de consulta por médico e tipo de consulta.
+    Calculada a partir das durações reais (check-in até o fechamento do prontuário)
+    pelo comando train_duration_model. Estimativas sem médico valem para o tipo
+    de consulta como um todo.
+    """
+    
+    doctor = models.ForeignKey(
+        'accounts.DoctorProfile',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='duration_estimates',
+        verbose_name='Médico'
+    )
+    
+    appointment_type = models.CharField(
+        'Tipo de Consulta',
+        max_length=20,
+        choices=Appointment.APPOINTMENT_TYPE_CHOICES
+    )
+    
+    duration_minutes = models.PositiveIntegerField(
+        'Duração Estimada (minutos)'
+    )
+    
+    quantile = models.DecimalField(
+        'Quantil',
+        max_digits=3,
+        decimal_places=2
+    )
+    
+    sample_size = models.PositiveIntegerField(
+        'Amostras'
+    )
+    
+    updated_at = models.DateTimeField(
+        'Atualizado em',
+        auto_now=True
+    )
+    
+    class Meta:
+        verbose_name = 'Estimativa de Duração de Consulta'
+        verbose_name_plural = 'Estimativas de Duração de Consulta'
+        ordering = ['doctor', 'appointment_type']
+        unique_together = ['doctor', 'appointment_type']
+    
+    def __str__(self):
+        doctor = self.doctor.user.get_full_name() if self.doctor else 'Geral'
+        return f"{doctor} - {self.get_appointment_type_display()}: {self.duration_minutes} min"
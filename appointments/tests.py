@@ -1,3 +1,136 @@
-from django.test import TestCase
+"""
+Testes para o app appointments.
+"""
 
-# Create your tests here.
+from datetime import date, time, timedelta
+
+import numpy as np
+import pytest
+from django import forms
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from accounts.models import DoctorProfile
+from accounts.widgets import AutocompleteSelect
+from appointments.durations import estimate_duration, grouped_quantile, projected_capacity, train
+from appointments.forms import PatientAppointmentForm
+from appointments.models import Appointment, ConsultDurationEstimate
+from medical_records.models import MedicalRecord
+from patients.models import Patient
+
+User = get_user_model()
+
+
+@pytest.mark.django_db
+class TestAutocompleteSelect:
+    """Testes para o widget de autocomplete usado nos agendamentos."""
+
+    def test_renders_only_selected_option(self):
+        """Testa que apenas a opção escolhida é renderizada."""
+        patients = []
+        for i in range(3):
+            user = User.objects.create_user(
+                username=f'p{i}', password='x', cpf=f'00{i}.000.000-00',
+                first_name=f'Paciente{i}', user_type='patient'
+            )
+            patients.append(Patient.objects.create(user=user))
+
+        class Form(forms.Form):
+            patient = forms.ModelChoiceField(
+                queryset=Patient.objects.select_related('user'),
+                widget=AutocompleteSelect(url='/patients/autocomplete/')
+            )
+
+        html = str(Form(initial={'patient': patients[1].pk})['patient'])
+        assert 'data-autocomplete-url="/patients/autocomplete/"' in html
+        assert 'Paciente1' in html
+        assert 'Paciente0' not in html and 'Paciente2' not in html
+
+        form = Form(data={'patient': patients[2].pk})
+        assert form.is_valid()
+        assert form.cleaned_data['patient'] == patients[2]
+
+
+@pytest.mark.django_db
+class TestConsultDurationModel:
+    """Testes para o modelo de duração de consultas."""
+
+    def test_grouped_quantile(self):
+        """Testa o quantil vetorizado por grupo."""
+        keys = np.array([2, 1, 1, 2, 1])
+        values = np.array([10.0, 30.0, 10.0, 20.0, 20.0])
+        groups, result, counts = grouped_quantile(keys, values, 0.5)
+        assert groups.tolist() == [1, 2]
+        assert result.tolist() == [20.0, 15.0]
+        assert counts.tolist() == [3, 2]
+
+    def test_train_and_estimate(self):
+        """Testa o treino a partir de check-in e fechamento do prontuário."""
+        doctor_user = User.objects.create_user(
+            username='doc', password='x', cpf='100.000.000-00', user_type='doctor'
+        )
+        doctor = DoctorProfile.objects.create(user=doctor_user, crm='D1', specialty='Clínica')
+        patient_user = User.objects.create_user(
+            username='pac', password='x', cpf='200.000.000-00', user_type='patient'
+        )
+        patient = Patient.objects.create(user=patient_user)
+        checked_in = timezone.now() - timedelta(days=1)
+        for i, minutes in enumerate([12, 14, 16, 18, 20]):
+            appointment = Appointment.objects.create(
+                patient=patient, doctor=doctor, appointment_type='return',
+                scheduled_date=date(2026, 1, 1), scheduled_time=time(8, i),
+                checked_in_at=checked_in,
+            )
+            MedicalRecord.objects.create(
+                appointment=appointment, patient=patient, doctor=doctor,
+                chief_complaint='x', diagnosis='y', is_closed=True,
+                closed_at=checked_in + timedelta(minutes=minutes),
+            )
+
+        estimates = train(quantile=0.8, min_samples=5)
+
+        assert len(estimates) == 2
+        assert estimate_duration(doctor.pk, 'return') == 20
+        assert estimate_duration(doctor.pk, 'first_visit') == settings.APPOINTMENT_DURATION_MINUTES
+        capacity = projected_capacity()[0]
+        assert capacity['projected_capacity'] == 24.0
+        assert capacity['capacity_change'] == 50.0
+
+    def test_booking_uses_type_duration_for_overlaps(self):
+        """Testa que o tipo escolhido define a duração e que horários sobrepostos são recusados."""
+        from django.core.cache import cache
+
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doc', password='x', cpf='100.000.000-00', user_type='doctor'),
+            crm='D1', specialty='Clínica',
+        )
+        patient = Patient.objects.create(user=User.objects.create_user(
+            username='pac', password='x', cpf='200.000.000-00', user_type='patient'
+        ))
+        ConsultDurationEstimate.objects.create(
+            doctor=doctor, appointment_type='return', duration_minutes=15, quantile=0.8, sample_size=20
+        )
+        ConsultDurationEstimate.objects.create(
+            doctor=doctor, appointment_type='first_visit', duration_minutes=45, quantile=0.8, sample_size=20
+        )
+        cache.clear()
+        day = timezone.localdate() + timedelta(days=7)
+
+        def book(hour, minute, appointment_type):
+            form = PatientAppointmentForm(data={
+                'doctor': doctor.pk, 'scheduled_date': day.isoformat(), 'scheduled_time': f'{hour:02d}:{minute:02d}',
+                'appointment_type': appointment_type, 'reason': 'Consulta',
+            })
+            if form.is_valid():
+                return form.save(patient=patient)
+            return form
+
+        first = book(9, 0, 'first_visit')
+        assert (first.appointment_type, first.duration_minutes) == ('first_visit', 45)
+        # 09:30 cai dentro da primeira consulta (09:00-09:45) mesmo não sendo o mesmo horário
+        assert 'das 09:00 às 09:45' in book(9, 30, 'return').non_field_errors()[0]
+        # Um retorno de 15 min às 08:45 termina quando a primeira começa
+        assert book(8, 45, 'return').duration_minutes == 15
+        # Uma primeira consulta às 08:30 (45 min) invadiria as duas já marcadas
+        assert book(8, 30, 'first_visit').non_field_errors()
+        assert book(9, 45, 'return').duration_minutes == 15
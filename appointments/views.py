@@ -6,6 +6,7 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.utils import timezone
 from .models import Appointment
+from accounts.idempotency import IdempotentPostMixin
 
 class AppointmentListView(LoginRequiredMixin, ListView):
     model = Appointment
@@ -14,7 +15,7 @@ class AppointmentListView(LoginRequiredMixin, ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('patient__user', 'doctor__user')
+        queryset = super().get_queryset().select_related('patient__user', 'doctor__user').defer('patient__medical_notes')
         user = self.request.user
         
         if user.is_doctor():
@@ -36,7 +37,7 @@ class AppointmentDetailView(LoginRequiredMixin, DetailView):
 from .forms import PatientAppointmentForm, AttendantAppointmentForm
 from patients.models import Patient
 
-class AppointmentCreateView(LoginRequiredMixin, CreateView):
+class AppointmentCreateView(LoginRequiredMixin, IdempotentPostMixin, CreateView):
     """View para criar um novo agendamento."""
     model = Appointment
     template_name = 'appointments/appointment_form.html'
@@ -167,6 +168,7 @@ class AppointmentCheckInView(LoginRequiredMixin, UserPassesTestMixin, View):
             
         if appointment.status == 'scheduled':
             appointment.status = 'checked_in'
+            appointment.checked_in_at = timezone.now()
             appointment.save()
             messages.success(request, f'Check-in do paciente {appointment.patient.user.get_full_name()} realizado com sucesso! Status atualizado para "Confirmada".')
         else:
@@ -208,7 +210,7 @@ class AppointmentCalendarView(LoginRequiredMixin, ListView):
     paginate_by = 20 # Para o caso de não usar o calendário FullCalendar
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('patient__user', 'doctor__user')
+        queryset = super().get_queryset().select_related('patient__user', 'doctor__user').defer('patient__medical_notes')
         user = self.request.user
         
         # Filtra agendamentos futuros
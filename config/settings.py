@@ -91,6 +91,10 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default='sqlite:///db.sqlite3')
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Classes de operadores nos índices de prefixo (accounts.models.PrefixIndex)
+    INSTALLED_APPS.append('django.contrib.postgres')
+
 
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
@@ -146,6 +150,30 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Arquivos clínicos são servidos por views com controle de acesso. Com o nginx
+# na frente, a view responde apenas com X-Accel-Redirect para este prefixo
+# (location internal); vazio, o próprio Django envia o arquivo.
+PROTECTED_MEDIA_ACCEL_PREFIX = env('PROTECTED_MEDIA_ACCEL_PREFIX', default='')
+
+# Envio de resultados de exames em partes (cada parte abaixo do client_max_body_size do nginx)
+EXAM_UPLOAD_CHUNK_SIZE = env.int('EXAM_UPLOAD_CHUNK_SIZE', default=8 * 1024 * 1024)
+EXAM_UPLOAD_MAX_SIZE = env.int('EXAM_UPLOAD_MAX_SIZE', default=4 * 1024 * 1024 * 1024)
+# Processos que geram as pré-visualizações (0 gera no próprio processo)
+EXAM_PREVIEW_WORKERS = env.int('EXAM_PREVIEW_WORKERS', default=2)
+# Pasta onde o laboratório deixa os arquivos HL7 ORU^R01 (comando import_hl7)
+HL7_DROP_DIR = env('HL7_DROP_DIR', default=str(BASE_DIR / 'hl7'))
+# Dias em que a exportação de dados do paciente (LGPD) fica disponível para download
+DATA_EXPORT_RETENTION_DAYS = env.int('DATA_EXPORT_RETENTION_DAYS', default=7)
+# Chaves AES-256 dos campos clínicos cifrados, "id:chave em base64" separadas por
+# vírgula. A primeira cifra os valores novos; as demais só leem valores antigos
+# até o comando rotate_encryption_keys regravá-los com a principal. A busca
+# textual guarda marcas HMAC das palavras dos prontuários (não o texto), que
+# ainda revelam quais prontuários compartilham uma palavra e sua frequência;
+# sem chaves, o índice guarda as palavras em texto puro.
+FIELD_ENCRYPTION_KEYS = env.list('FIELD_ENCRYPTION_KEYS', default=[])
+# Sem chaves, recusa gravar os campos cifrados em texto puro (padrão: fora do DEBUG)
+FIELD_ENCRYPTION_REQUIRED = env.bool('FIELD_ENCRYPTION_REQUIRED', default=not DEBUG)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -218,5 +246,11 @@ SITE_URL = env('SITE_URL', default='http://localhost:8000')
 APPOINTMENT_CANCELLATION_HOURS = 24  # Horas mínimas para cancelamento
 APPOINTMENT_DURATION_MINUTES = 30  # Duração padrão de consulta
 
+# Idempotency Settings
+IDEMPOTENCY_KEY_TTL_HOURS = 24  # Tempo em que reenvios de POST recebem a resposta original
+
+# On-call Roster Settings
+ON_CALL_MIN_REST_HOURS = 11  # Descanso mínimo entre plantões de um mesmo médico
+
 # Backup Settings
 BACKUP_INTERVAL_DAYS = 7  # Backup a cada 7 dias
@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import MedicalRecord, MedicalRecordComment, Prescription, Exam, MedicalRecordHistory
+from .models import Cid10Code, MedicalRecord, MedicalRecordComment, Prescription, Exam, ExamResultPreview, ExamResultValue, ExamUpload, MedicalRecordHistory, PrescriptionTemplate
+
+@admin.register(Cid10Code)
+class Cid10CodeAdmin(admin.ModelAdmin):
+    list_display = ['code', 'description']
+    search_fields = ['code', 'description']
 
 @admin.register(MedicalRecord)
 class MedicalRecordAdmin(admin.ModelAdmin):
@@ -7,6 +12,7 @@ class MedicalRecordAdmin(admin.ModelAdmin):
     list_filter = ['is_closed', 'created_at']
     search_fields = ['patient__user__first_name', 'patient__user__last_name']
     raw_id_fields = ['appointment', 'patient', 'doctor']
+    autocomplete_fields = ['diagnosis_codes']
 
 @admin.register(MedicalRecordComment)
 class MedicalRecordCommentAdmin(admin.ModelAdmin):
@@ -19,14 +25,37 @@ class PrescriptionAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     raw_id_fields = ['medical_record', 'patient', 'doctor']
 
+@admin.register(PrescriptionTemplate)
+class PrescriptionTemplateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'doctor', 'usage_count', 'last_used_at']
+    search_fields = ['name', 'medications']
+    raw_id_fields = ['doctor']
+
 @admin.register(Exam)
 class ExamAdmin(admin.ModelAdmin):
     list_display = ['patient', 'exam_name', 'status', 'requested_date']
     list_filter = ['status', 'exam_type']
     raw_id_fields = ['medical_record', 'patient', 'doctor']
 
+@admin.register(ExamResultValue)
+class ExamResultValueAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'analyte', 'value', 'unit', 'collected_at']
+    list_filter = ['analyte']
+    raw_id_fields = ['exam', 'patient']
+
+@admin.register(ExamUpload)
+class ExamUploadAdmin(admin.ModelAdmin):
+    list_display = ['exam', 'filename', 'status', 'received_bytes', 'total_size', 'created_at']
+    list_filter = ['status']
+    raw_id_fields = ['exam', 'uploaded_by']
+
+@admin.register(ExamResultPreview)
+class ExamResultPreviewAdmin(admin.ModelAdmin):
+    list_display = ['exam', 'page', 'is_thumbnail', 'width', 'height']
+    raw_id_fields = ['exam']
+
 @admin.register(MedicalRecordHistory)
 class MedicalRecordHistoryAdmin(admin.ModelAdmin):
-    list_display = ['medical_record', 'user', 'action', 'timestamp']
+    list_display = ['medical_record', 'version', 'user', 'action', 'timestamp']
     list_filter = ['action', 'timestamp']
     raw_id_fields = ['medical_record', 'user']
@@ -0,0 +1,190 @@
+"""
+Valores numéricos de analitos dos exames e séries temporais por paciente.
+
+Os valores são gravados em lote (``ingest_values``): reenviar o mesmo exame
+atualiza os valores já existentes em vez de duplicá-los. A série de um
+analito é lida por faixa no índice (paciente, analito, data, valor), sem
+acessar a tabela, e reduzida com o algoritmo Largest-Triangle-Three-Buckets,
+que preserva picos e vales do gráfico com poucos pontos.
+"""
+
+import math
+from datetime import date, datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ExamResultValue
+
+MAX_VALUES_PER_REQUEST = 1000
+DEFAULT_POINTS = 500
+MAX_POINTS = 2000
+
+UPDATE_FIELDS = ['patient', 'value', 'unit', 'reference_low', 'reference_high', 'collected_at']
+
+
+def normalize_analyte(code):
+    return (code or '').strip().upper()
+
+
+def parse_moment(value):
+    """Data ou data/hora ISO 8601 como datetime com fuso (datas à meia-noite local)."""
+    if isinstance(value, datetime):
+        moment = value
+    elif isinstance(value, date):
+        moment = datetime.combine(value, time.min)
+    else:
+        text = str(value or '')
+        moment = parse_datetime(text)
+        if moment is None:
+            day = parse_date(text)
+            if day is None:
+                raise ValueError(f'Data inválida: {value!r}.')
+            moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _number(value, optional=False):
+    if value in (None, '') and optional:
+        return None
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError
+    return number
+
+
+def build_value(exam, row, default_moment):
+    """Converte um item recebido ({analyte, value, unit, reference_low, reference_high, collected_at})."""
+    analyte = normalize_analyte(row.get('analyte'))
+    if not analyte or len(analyte) > 20:
+        raise ValueError('Código de analito inválido.')
+    try:
+        value = _number(row.get('value'))
+        low = _number(row.get('reference_low'), optional=True)
+        high = _number(row.get('reference_high'), optional=True)
+    except (TypeError, ValueError):
+        raise ValueError(f'Valor numérico inválido para {analyte}.')
+    unit = str(row.get('unit') or '').strip()
+    if len(unit) > 20:
+        raise ValueError(f'Unidade inválida para {analyte}.')
+    collected_at = row.get('collected_at')
+    return ExamResultValue(
+        exam=exam,
+        patient_id=exam.patient_id,
+        analyte=analyte,
+        value=value,
+        unit=unit,
+        reference_low=low,
+        reference_high=high,
+        collected_at=parse_moment(collected_at) if collected_at else default_moment,
+    )
+
+
+def ingest_values(exam, rows):
+    """
+    Grava (ou atualiza) os valores do exame em lote. Sem ``collected_at``, a
+    data é a de realização do exame (ou a da solicitação). Retorna a
+    quantidade gravada; ValueError se algum item for inválido (nada é gravado).
+    """
+    rows = list(rows)
+    if len(rows) > MAX_VALUES_PER_REQUEST:
+        raise ValueError(f'Envie no máximo {MAX_VALUES_PER_REQUEST} valores por vez.')
+    default_moment = parse_moment(exam.completed_date or exam.requested_date)
+    values = {}
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise ValueError(f'Item {index}: formato inválido.')
+        try:
+            value = build_value(exam, row, default_moment)
+        except ValueError as error:
+            raise ValueError(f'Item {index}: {error}')
+        # O último valor de um analito repetido no mesmo envio prevalece
+        values[value.analyte] = value
+    save_values(values.values())
+    return len(values)
+
+
+def save_values(values, batch_size=500):
+    """Grava os valores em lote; um analito já existente no exame é atualizado."""
+    ExamResultValue.objects.bulk_create(
+        values,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['exam', 'analyte'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def downsample(times, values, points):
+    """
+    Reduz a série a ``points`` pontos com Largest-Triangle-Three-Buckets:
+    mantém o primeiro e o último e, em cada faixa intermediária, o ponto que
+    forma o maior triângulo com o ponto escolhido antes e a média da faixa seguinte.
+    """
+    total = len(times)
+    if points >= total or points < 3:
+        return times, values
+    bucket = (total - 2) / (points - 2)
+    sampled_times = [times[0]]
+    sampled_values = [values[0]]
+    chosen = 0
+    for index in range(points - 2):
+        start = int(index * bucket) + 1
+        end = int((index + 1) * bucket) + 1
+        next_end = min(int((index + 2) * bucket) + 1, total)
+        next_count = next_end - end
+        average_time = sum(times[end:next_end]) / next_count
+        average_value = sum(values[end:next_end]) / next_count
+
+        anchor_time, anchor_value = times[chosen], values[chosen]
+        best_area = -1.0
+        for candidate in range(start, end):
+            area = abs(
+                (anchor_time - average_time) * (values[candidate] - anchor_value)
+                - (anchor_time - times[candidate]) * (average_value - anchor_value)
+            )
+            if area > best_area:
+                best_area, chosen = area, candidate
+        sampled_times.append(times[chosen])
+        sampled_values.append(values[chosen])
+    sampled_times.append(times[-1])
+    sampled_values.append(values[-1])
+    return sampled_times, sampled_values
+
+
+def analyte_trend(patient, analyte, start=None, end=None, points=DEFAULT_POINTS):
+    """
+    Série do analito do paciente, em ordem cronológica, como vetores compactos:
+    ``t`` (segundos desde 1970) e ``v``, além da unidade e da faixa de
+    referência do valor mais recente e do total de pontos antes da redução.
+    """
+    analyte = normalize_analyte(analyte)
+    queryset = ExamResultValue.objects.filter(patient=patient, analyte=analyte)
+    if start is not None:
+        queryset = queryset.filter(collected_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(collected_at__lt=end)
+
+    times = []
+    values = []
+    for collected_at, value in queryset.order_by('collected_at').values_list('collected_at', 'value').iterator():
+        times.append(int(collected_at.timestamp()))
+        values.append(value)
+    total = len(times)
+    times, values = downsample(times, values, points)
+
+    latest = (
+        queryset.order_by('-collected_at')
+        .values('unit', 'reference_low', 'reference_high')
+        .first()
+    ) if total else None
+    return {
+        'analyte': analyte,
+        'unit': latest['unit'] if latest else '',
+        'reference': [latest['reference_low'], latest['reference_high']] if latest else [None, None],
+        'total': total,
+        't': times,
+        'v': values,
+    }
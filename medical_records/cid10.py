@@ -0,0 +1,152 @@
+"""
+Catálogo CID-10: leitura do arquivo do DATASUS e índice de busca por prefixo.
+
+O índice é uma árvore de prefixos (trie) em memória, montada uma vez por
+processo, com o código (com e sem ponto) e cada palavra da descrição
+normalizada (minúsculas, sem acentos). O autocomplete percorre apenas os
+caracteres digitados, sem consultar o banco. Cada processo confere
+periodicamente se o catálogo mudou (quantidade, maior ID e última
+atualização) e remonta o índice.
+"""
+
+import csv
+import re
+import threading
+import time
+import unicodedata
+
+from django.db.models import Count, Max
+
+from .models import Cid10Code
+
+INDEX_CHECK_SECONDS = 300
+
+_WORD_RE = re.compile(r'[a-z0-9.]+')
+
+
+def normalize(text):
+    """Minúsculas e sem acentos, para comparar "Hipertensão" com "hipertensao"."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def format_code(raw):
+    """Formata o código no padrão com ponto ("A000" -> "A00.0")."""
+    code = (raw or '').strip().upper().replace('.', '')
+    return f'{code[:3]}.{code[3:]}' if len(code) > 3 else code
+
+
+def read_catalog(path, encoding='utf-8'):
+    """
+    Lê o CSV do DATASUS (CID-10-SUBCATEGORIAS.CSV, CID-10-CATEGORIAS.CSV ou o
+    arquivo de exemplo do projeto), separado por ";". Retorna pares (código, descrição).
+    """
+    with open(path, newline='', encoding=encoding) as catalog_file:
+        reader = csv.DictReader(catalog_file, delimiter=';')
+        code_column = 'SUBCAT' if 'SUBCAT' in (reader.fieldnames or ()) else 'CAT'
+        for row in reader:
+            code = format_code(row.get(code_column))
+            description = (row.get('DESCRICAO') or '').strip()
+            if code and description:
+                yield code, description
+
+
+class PrefixTrie:
+    """Árvore de prefixos: cada chave inserida aponta para um ou mais IDs."""
+
+    __slots__ = ('root',)
+
+    def __init__(self):
+        # Nó: [filhos por caractere, IDs das chaves que terminam no nó]
+        self.root = [{}, []]
+
+    def insert(self, key, item_id):
+        node = self.root
+        for char in key:
+            node = node[0].setdefault(char, [{}, []])
+        node[1].append(item_id)
+
+    def find(self, prefix):
+        """IDs de todas as chaves que começam com o prefixo."""
+        node = self.root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return set()
+        found = set()
+        stack = [node]
+        while stack:
+            children, ids = stack.pop()
+            found.update(ids)
+            stack.extend(children.values())
+        return found
+
+
+class Cid10Index:
+    """Índice em memória do catálogo para o autocomplete."""
+
+    def __init__(self, rows):
+        self.trie = PrefixTrie()
+        self.codes = {}
+        for pk, code, description in rows:
+            self.codes[pk] = (code, description)
+            keys = {code.lower(), code.lower().replace('.', '')}
+            keys.update(_WORD_RE.findall(normalize(description)))
+            for key in keys:
+                self.trie.insert(key, pk)
+
+    def search(self, term, limit=20):
+        """
+        Códigos cujo código ou descrição contém palavras começando com cada
+        termo digitado, em ordem de código. Retorna tuplas (id, código, descrição).
+        """
+        words = _WORD_RE.findall(normalize(term))
+        if not words:
+            return []
+        matches = None
+        for word in sorted(words, key=len, reverse=True):
+            found = self.trie.find(word)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        ordered = sorted(matches, key=lambda pk: self.codes[pk][0])[:limit]
+        return [(pk, *self.codes[pk]) for pk in ordered]
+
+
+def catalog_signature():
+    """
+    Identifica a versão do catálogo carregado: quantidade, maior ID e última
+    atualização (descrições alteradas por load_cid10 sem novos códigos).
+    """
+    signature = Cid10Code.objects.aggregate(Count('pk'), Max('pk'), Max('updated_at'))
+    return tuple(signature.values())
+
+
+_index = None
+_index_signature = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Índice compartilhado pelo processo, remontado se o catálogo mudar."""
+    global _index, _index_signature, _index_checked_at
+    now = time.monotonic()
+    if _index is not None and now - _index_checked_at < INDEX_CHECK_SECONDS:
+        return _index
+    with _index_lock:
+        if _index is None or now - _index_checked_at >= INDEX_CHECK_SECONDS:
+            signature = catalog_signature()
+            if _index is None or signature != _index_signature:
+                _index = Cid10Index(Cid10Code.objects.values_list('pk', 'code', 'description').iterator())
+                _index_signature = signature
+            _index_checked_at = now
+    return _index
+
+
+def reset_index():
+    """Descarta o índice do processo (usado após recarregar o catálogo)."""
+    global _index, _index_signature
+    with _index_lock:
+        _index = None
+        _index_signature = None
@@ -1,16 +1,23 @@
 from django import forms
-from .models import MedicalRecord, Prescription, Exam
+from django.urls import reverse_lazy
+
+from accounts.widgets import AutocompleteSelect, AutocompleteSelectMultiple
+from patients.models import Patient
+from .models import MedicalRecord, Prescription, PrescriptionTemplate, Exam
+from .prescription_checks import check_prescription
 
 class MedicalRecordForm(forms.ModelForm):
     """
     Formulário para criação e edição de Prontuário Médico.
     """
+    version = forms.IntegerField(widget=forms.HiddenInput(), required=False, min_value=1)
+    
     class Meta:
         model = MedicalRecord
         fields = [
             'appointment', 'patient', 'doctor', 
             'chief_complaint', 'symptoms', 'physical_examination', 
-            'diagnosis', 'treatment_plan', 'observations'
+            'diagnosis', 'diagnosis_codes', 'treatment_plan', 'observations'
         ]
         widgets = {
             'appointment': forms.Select(attrs={'class': 'form-control'}),
@@ -20,6 +27,7 @@ class MedicalRecordForm(forms.ModelForm):
             'symptoms': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'physical_examination': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'diagnosis': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
+            'diagnosis_codes': AutocompleteSelectMultiple(url=reverse_lazy('medical_records:cid10_autocomplete')),
             'treatment_plan': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'observations': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
@@ -32,12 +40,25 @@ class MedicalRecordForm(forms.ModelForm):
         self.fields['appointment'].widget = forms.HiddenInput()
         self.fields['patient'].widget = forms.HiddenInput()
         self.fields['doctor'].widget = forms.HiddenInput()
+        # Versão carregada pelo usuário, conferida ao gravar (edições simultâneas)
+        self.fields['version'].initial = self.instance.version
 
 
 class PrescriptionForm(forms.ModelForm):
     """
     Formulário para criação de Receita Médica.
     """
+    template = forms.ModelChoiceField(
+        queryset=PrescriptionTemplate.objects.none(),
+        required=False,
+        widget=forms.HiddenInput(),
+    )
+    confirm_warnings = forms.BooleanField(
+        label='Estou ciente dos alertas e desejo emitir a receita',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
     class Meta:
         model = Prescription
         fields = ['medications', 'instructions', 'valid_until']
@@ -47,6 +68,51 @@ class PrescriptionForm(forms.ModelForm):
             'valid_until': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
         }
 
+    def __init__(self, *args, patient=None, doctor=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.patient = patient
+        if doctor is not None:
+            # Receita favorita usada como ponto de partida (conta o uso ao salvar)
+            self.fields['template'].queryset = PrescriptionTemplate.objects.filter(doctor=doctor)
+        self.warnings = []
+
+    def clean(self):
+        """Alertas de alergia e de medicamento em uso impedem a emissão até serem confirmados."""
+        cleaned_data = super().clean()
+        medications = cleaned_data.get('medications')
+        if self.patient is not None and medications:
+            self.warnings = check_prescription(self.patient, medications)
+            if self.warnings and not cleaned_data.get('confirm_warnings'):
+                raise forms.ValidationError([warning['message'] for warning in self.warnings])
+        return cleaned_data
+
+
+class PrescriptionTemplateForm(forms.ModelForm):
+    """
+    Formulário de Receita Favorita do médico.
+    """
+    class Meta:
+        model = PrescriptionTemplate
+        fields = ['name', 'medications', 'instructions']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'form-control'}),
+            'medications': forms.Textarea(attrs={'class': 'form-control', 'rows': 5}),
+            'instructions': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
+        }
+
+    def __init__(self, *args, doctor=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.doctor = doctor
+
+    def clean_name(self):
+        name = self.cleaned_data['name'].strip()
+        duplicates = PrescriptionTemplate.objects.filter(doctor=self.doctor, name__iexact=name)
+        if self.instance.pk:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise forms.ValidationError('Você já tem uma receita favorita com este nome.')
+        return name
+
 
 class ExamForm(forms.ModelForm):
     """
@@ -61,3 +127,38 @@ class ExamForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'scheduled_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
         }
+
+
+class MedicalRecordFilterForm(forms.Form):
+    """
+    Filtros da lista de prontuários (período, paciente e situação).
+    """
+    STATUS_CHOICES = (
+        ('', 'Todos'),
+        ('open', 'Abertos'),
+        ('closed', 'Fechados'),
+    )
+
+    date_from = forms.DateField(
+        label='De', required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        label='Até', required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    patient = forms.ModelChoiceField(
+        label='Paciente', required=False,
+        queryset=Patient.objects.select_related('user'),
+        widget=AutocompleteSelect(reverse_lazy('patients:patient_autocomplete')),
+    )
+    status = forms.ChoiceField(
+        label='Situação', required=False, choices=STATUS_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # O paciente só vê os próprios prontuários
+        if user is not None and user.is_patient():
+            del self.fields['patient']
@@ -0,0 +1,208 @@
+"""
+Leitura de mensagens HL7 v2 ORU^R01 (resultados de exames laboratoriais).
+
+O arquivo é lido segmento a segmento (os segmentos HL7 terminam em ``\\r``,
+que o modo texto do Python trata como fim de linha), sem carregá-lo inteiro.
+Cada OBR da mensagem gera um resultado com o CPF do paciente (PID-3 com tipo
+CPF ou PID-19), o ID do exame no Promptuário (número do pedido, OBR-2), a
+situação do resultado (OBR-25) e as observações (OBX).
+
+Este módulo não importa modelos: é usado pelos workers do comando import_hl7.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+MLLP_CHARS = '\x0b\x1c'
+FINAL_STATUSES = ('F', 'C')
+
+_TS_RE = re.compile(r'^(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?(?:\.\d+)?([+-]\d{4})?$')
+_RANGE_RE = re.compile(r'^\s*(-?\d+(?:[.,]\d+)?)?\s*-\s*(-?\d+(?:[.,]\d+)?)?\s*$')
+
+
+class Hl7Error(ValueError):
+    """Mensagem HL7 malformada ou de tipo não suportado."""
+
+
+class Delimiters:
+    """Separadores declarados no MSH (campo, componente, repetição, escape, subcomponente)."""
+
+    def __init__(self, msh):
+        if len(msh) < 8:
+            raise Hl7Error('Segmento MSH incompleto.')
+        self.field = msh[3]
+        self.component, self.repetition, self.escape, self.subcomponent = msh[4:8]
+
+    def unescape(self, text):
+        if self.escape not in text:
+            return text
+        escape = self.escape
+        replacements = {
+            'F': self.field, 'S': self.component, 'R': self.repetition,
+            'E': escape, 'T': self.subcomponent, '.br': '\n',
+        }
+        return re.sub(
+            re.escape(escape) + r'(F|S|R|E|T|\.br)' + re.escape(escape),
+            lambda match: replacements[match.group(1)], text,
+        )
+
+
+def iter_segments(lines):
+    for line in lines:
+        segment = line.strip(MLLP_CHARS + '\r\n')
+        if segment.strip():
+            yield segment
+
+
+def iter_messages(lines):
+    """Agrupa os segmentos em mensagens (cada uma começa em MSH)."""
+    message = []
+    for segment in iter_segments(lines):
+        if segment.startswith('MSH') and message:
+            yield message
+            message = []
+        message.append(segment)
+    if message:
+        yield message
+
+
+def parse_timestamp(value):
+    """Converte um TS do HL7 (AAAAMMDD[HHMM[SS]][+ZZZZ]) em datetime; None se vazio."""
+    if not value:
+        return None
+    match = _TS_RE.match(value.strip())
+    if match is None:
+        raise Hl7Error(f'Data HL7 inválida: {value!r}.')
+    year, month, day, hour, minute, second, offset = match.groups()
+    try:
+        moment = datetime(int(year), int(month or 1), int(day or 1), int(hour or 0), int(minute or 0), int(second or 0))
+        if offset:
+            minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+            moment = moment.replace(tzinfo=dt_timezone(timedelta(minutes=minutes if offset[0] == '+' else -minutes)))
+    except ValueError:
+        # Formato certo, valores impossíveis (ex.: mês 13, 25h, fuso de 24h)
+        raise Hl7Error(f'Data HL7 inválida: {value!r}.')
+    return moment
+
+
+def parse_range(text):
+    """Faixa de referência "70-99" em (mínimo, máximo); (None, None) se não for numérica."""
+    match = _RANGE_RE.match(text or '')
+    if match is None:
+        return None, None
+    return tuple(float(part.replace(',', '.')) if part else None for part in match.groups())
+
+
+def cpf_digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def parse_message(segments):
+    """Resultados (um por OBR) de uma mensagem ORU^R01 já separada em segmentos."""
+    if not segments[0].startswith('MSH'):
+        raise Hl7Error('A mensagem não começa com o segmento MSH.')
+    delimiters = Delimiters(segments[0])
+
+    def split(segment):
+        return segment.split(delimiters.field)
+
+    def component(field, index=0):
+        parts = field.split(delimiters.component)
+        return delimiters.unescape(parts[index]) if index < len(parts) else ''
+
+    def field_at(fields, index):
+        return fields[index] if index < len(fields) else ''
+
+    # No MSH o próprio separador é o campo MSH-1: os índices ficam deslocados
+    msh = split(segments[0])
+    control_id = field_at(msh, 9)
+    message_type = field_at(msh, 8).split(delimiters.component)
+    if message_type[:2] != ['ORU', 'R01']:
+        raise Hl7Error(f'Mensagem {control_id}: tipo {field_at(msh, 8)!r} não suportado (esperado ORU^R01).')
+
+    cpf = ''
+    results = []
+    current = None
+    for segment in segments[1:]:
+        fields = split(segment)
+        kind = fields[0]
+        if kind == 'PID':
+            for identifier in field_at(fields, 3).split(delimiters.repetition):
+                if component(identifier, 4).upper() == 'CPF':
+                    cpf = cpf_digits(component(identifier))
+            cpf = cpf or cpf_digits(field_at(fields, 19))
+        elif kind == 'OBR':
+            order = component(field_at(fields, 2))
+            if not (order.isascii() and order.isdigit()):
+                raise Hl7Error(f'Mensagem {control_id}: número do pedido (OBR-2) inválido: {order!r}.')
+            current = {
+                'control_id': control_id,
+                'cpf': cpf,
+                'exam_id': int(order),
+                'status': field_at(fields, 25).strip().upper() or 'F',
+                'observed_at': parse_timestamp(component(field_at(fields, 7))),
+                'observations': [],
+            }
+            results.append(current)
+        elif kind == 'OBX':
+            if current is None:
+                raise Hl7Error(f'Mensagem {control_id}: segmento OBX antes do OBR.')
+            values = [delimiters.unescape(value) for value in field_at(fields, 5).split(delimiters.repetition)]
+            current['observations'].append({
+                'type': field_at(fields, 2).strip().upper(),
+                'code': component(field_at(fields, 3)).strip(),
+                'name': component(field_at(fields, 3), 1).strip(),
+                'value': '\n'.join(values).strip(),
+                'unit': component(field_at(fields, 6)).strip(),
+                'range': delimiters.unescape(field_at(fields, 7)).strip(),
+                'flags': field_at(fields, 8).strip(),
+                'observed_at': parse_timestamp(component(field_at(fields, 14))),
+            })
+
+    if not results:
+        raise Hl7Error(f'Mensagem {control_id}: nenhum segmento OBR.')
+    if not cpf:
+        raise Hl7Error(f'Mensagem {control_id}: CPF do paciente ausente (PID-3 ou PID-19).')
+    return results
+
+
+def parse_file(path, encoding='utf-8'):
+    """Lê todas as mensagens do arquivo; Hl7Error na primeira mensagem inválida."""
+    with open(path, encoding=encoding, newline=None) as hl7_file:
+        return [result for message in iter_messages(hl7_file) for result in parse_message(message)]
+
+
+def format_result(observations):
+    """Texto do resultado para o campo Exame.result, uma observação por linha."""
+    lines = []
+    for observation in observations:
+        label = observation['name'] or observation['code']
+        if observation['name'] and observation['code']:
+            label = f"{observation['name']} ({observation['code']})"
+        line = f"{label}: {observation['value']}"
+        if observation['unit']:
+            line += f" {observation['unit']}"
+        if observation['range']:
+            line += f" [ref. {observation['range']}]"
+        if observation['flags'] and observation['flags'] != 'N':
+            line += f" ({observation['flags']})"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def numeric_values(result):
+    """Observações numéricas (NM) como itens para ExamResultValue."""
+    rows = []
+    for observation in result['observations']:
+        if observation['type'] != 'NM' or not observation['code']:
+            continue
+        low, high = parse_range(observation['range'])
+        rows.append({
+            'analyte': observation['code'],
+            'value': observation['value'].replace(',', '.'),
+            'unit': observation['unit'],
+            'reference_low': low,
+            'reference_high': high,
+            'collected_at': observation['observed_at'] or result['observed_at'],
+        })
+    return rows
@@ -0,0 +1,203 @@
+"""
+Comando para importar resultados laboratoriais em HL7 v2 (ORU^R01).
+
+O laboratório deixa os arquivos na pasta HL7_DROP_DIR. Cada arquivo é
+reservado com um rename para ``processing/`` (seguro com mais de uma
+instância do comando), lido em paralelo por um ProcessPoolExecutor e os
+resultados são aplicados em lote: uma consulta traz os exames do lote,
+``bulk_update`` grava situação, data de realização e resultado, e os valores
+numéricos vão para ExamResultValue. Arquivos lidos vão para ``processed/``;
+arquivos inválidos, ou com resultados sem exame correspondente (ID do pedido
++ CPF do paciente), vão para ``quarantine/`` com um ``.error.txt`` explicando.
+Arquivos esquecidos em ``processing/`` por uma execução interrompida voltam
+para a pasta de entrada depois de ``--stale-after`` segundos e são lidos de
+novo (a gravação dos resultados é idempotente).
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from medical_records.analytes import build_value, parse_moment, save_values
+from medical_records.hl7 import FINAL_STATUSES, cpf_digits, format_result, numeric_values
+from medical_records.models import Exam
+from medical_records.workers import init_render_worker, parse_hl7_item
+
+HL7_EXTENSIONS = ('.hl7', '.txt')
+
+
+class Command(BaseCommand):
+    help = 'Importa resultados de exames de arquivos HL7 ORU^R01 da pasta do laboratório'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', help='Pasta de entrada (padrão: HL7_DROP_DIR)')
+        parser.add_argument('--encoding', default='utf-8',
+                            help='Codificação dos arquivos (padrão: utf-8; muitos laboratórios usam latin-1)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processos de leitura (0 lê no próprio processo)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Resultados por lote gravado (padrão: 500)')
+        parser.add_argument('--watch', action='store_true', help='Continua observando a pasta')
+        parser.add_argument('--poll-interval', type=float, default=10.0,
+                            help='Intervalo em segundos entre verificações no modo --watch (padrão: 10)')
+        parser.add_argument('--stale-after', type=float, default=3600.0,
+                            help='Segundos em processing/ após os quais um arquivo é retomado (padrão: 3600)')
+
+    def handle(self, *args, **options):
+        self.directory = options['directory'] or settings.HL7_DROP_DIR
+        if not os.path.isdir(self.directory):
+            raise CommandError(f'Pasta não encontrada: {self.directory}')
+        for name in ('processing', 'processed', 'quarantine'):
+            os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+
+        executor = None
+        if options['workers'] > 0:
+            executor = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_render_worker,
+            )
+        try:
+            while True:
+                self.import_pending(executor, options)
+                if not options['watch']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Importação interrompida')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def recover_stale_files(self, stale_after):
+        """
+        Devolve à pasta de entrada os arquivos parados em processing/ há mais de
+        ``stale_after`` segundos (execução interrompida). O rename atualiza o
+        ctime, então só uma instância devolve cada arquivo.
+        """
+        recovered = 0
+        limit = time.time() - stale_after
+        for entry in os.scandir(os.path.join(self.directory, 'processing')):
+            try:
+                if not entry.is_file() or entry.stat().st_ctime > limit:
+                    continue
+                os.rename(entry.path, os.path.join(self.directory, entry.name))
+            except FileNotFoundError:
+                continue
+            recovered += 1
+        if recovered:
+            self.stdout.write(self.style.WARNING(f'✗ {recovered} arquivos retomados de processing/'))
+        return recovered
+
+    def claim_files(self):
+        """Move os arquivos novos para processing/; outra instância que chegar antes fica com o arquivo."""
+        claimed = []
+        for entry in sorted(os.scandir(self.directory), key=lambda entry: entry.name):
+            if not entry.is_file() or not entry.name.lower().endswith(HL7_EXTENSIONS):
+                continue
+            target = os.path.join(self.directory, 'processing', entry.name)
+            try:
+                os.rename(entry.path, target)
+            except FileNotFoundError:
+                continue
+            claimed.append(target)
+        return claimed
+
+    def import_pending(self, executor, options):
+        self.recover_stale_files(options['stale_after'])
+        paths = self.claim_files()
+        if not paths:
+            return
+        started = time.perf_counter()
+        stats = {'files': 0, 'results': 0, 'quarantined': 0}
+        items = [(path, options['encoding']) for path in paths]
+        if executor is not None:
+            parsed = (future.result() for future in as_completed([executor.submit(parse_hl7_item, item) for item in items]))
+        else:
+            parsed = map(parse_hl7_item, items)
+
+        batch = []
+        size = 0
+        for path, results, error in parsed:
+            if error:
+                self.quarantine(path, error, stats)
+                continue
+            batch.append((path, results))
+            size += len(results)
+            if size >= options['batch_size']:
+                self.apply_batch(batch, stats)
+                batch, size = [], 0
+        if batch:
+            self.apply_batch(batch, stats)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {stats['results']} resultados importados de {stats['files']} arquivos em {elapsed:.1f}s"
+        ))
+        if stats['quarantined']:
+            self.stdout.write(self.style.WARNING(f"✗ {stats['quarantined']} arquivos em quarentena"))
+
+    def apply_batch(self, batch, stats):
+        """Grava os resultados de vários arquivos com uma consulta e atualizações em lote."""
+        exam_ids = {result['exam_id'] for _, results in batch for result in results}
+        exams = (
+            Exam.objects
+            .filter(pk__in=exam_ids)
+            .exclude(status='cancelled')
+            .annotate(patient_cpf=F('patient__user__cpf'))
+            .in_bulk()
+        )
+        today = timezone.localdate()
+        updated = {}
+        values = {}
+        unmatched = {}
+        for path, results in batch:
+            for result in results:
+                exam = exams.get(result['exam_id'])
+                if exam is None or cpf_digits(exam.patient_cpf) != result['cpf']:
+                    unmatched.setdefault(path, []).append(
+                        f"Mensagem {result['control_id']}: exame {result['exam_id']} não encontrado para o CPF informado."
+                    )
+                    continue
+                exam.result = format_result(result['observations'])
+                if result['status'] in FINAL_STATUSES:
+                    exam.status = 'completed'
+                    observed_at = result['observed_at']
+                    exam.completed_date = timezone.localtime(parse_moment(observed_at)).date() if observed_at else today
+                updated[exam.pk] = exam
+                default_moment = parse_moment(exam.completed_date or exam.requested_date)
+                for row in numeric_values(result):
+                    try:
+                        value = build_value(exam, row, default_moment)
+                    except ValueError:
+                        # Valor não numérico apesar do tipo NM: fica só no texto do resultado
+                        continue
+                    values[exam.pk, value.analyte] = value
+
+        with transaction.atomic():
+            Exam.objects.bulk_update(updated.values(), ['status', 'completed_date', 'result'], batch_size=500)
+            save_values(values.values())
+
+        for path, results in batch:
+            stats['files'] += 1
+            stats['results'] += len(results) - len(unmatched.get(path, ()))
+            if path in unmatched:
+                imported = len(results) - len(unmatched[path])
+                note = f'\n{imported} resultados deste arquivo foram importados.' if imported else ''
+                self.quarantine(path, '\n'.join(unmatched[path]) + note, stats)
+            else:
+                os.replace(path, os.path.join(self.directory, 'processed', os.path.basename(path)))
+
+    def quarantine(self, path, error, stats):
+        stats['quarantined'] += 1
+        target = os.path.join(self.directory, 'quarantine', os.path.basename(path))
+        os.replace(path, target)
+        with open(f'{target}.error.txt', 'w', encoding='utf-8') as error_file:
+            error_file.write(error + '\n')
+        self.stderr.write(f'{os.path.basename(path)}: {error}')
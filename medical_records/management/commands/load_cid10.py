@@ -0,0 +1,61 @@
+"""
+Comando para carregar o catálogo CID-10 a partir de um arquivo local.
+"""
+
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from medical_records.cid10 import read_catalog, reset_index
+from medical_records.models import Cid10Code
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'cid10.csv')
+
+
+class Command(BaseCommand):
+    help = 'Carrega (ou atualiza) o catálogo CID-10 a partir do CSV do DATASUS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_CATALOG,
+                            help='CSV separado por ";" (padrão: catálogo resumido do projeto)')
+        parser.add_argument('--encoding', default='utf-8',
+                            help='Codificação do arquivo (os arquivos do DATASUS usam latin-1)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Registros por lote (padrão: 1000)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            catalog = dict(read_catalog(options['path'], options['encoding']))
+        except (OSError, UnicodeDecodeError, csv.Error) as error:
+            raise CommandError(f'Não foi possível ler o catálogo: {error}')
+        if not catalog:
+            raise CommandError('Nenhum código encontrado. O arquivo deve ter as colunas SUBCAT (ou CAT) e DESCRICAO.')
+
+        existing = {code.code: code for code in Cid10Code.objects.all()}
+        new = [
+            Cid10Code(code=code, description=description)
+            for code, description in catalog.items() if code not in existing
+        ]
+        changed = []
+        now = timezone.now()
+        for code, description in catalog.items():
+            current = existing.get(code)
+            if current is not None and current.description != description:
+                current.description = description
+                current.updated_at = now
+                changed.append(current)
+
+        # Códigos ausentes do arquivo são mantidos: podem estar em prontuários antigos
+        with transaction.atomic():
+            Cid10Code.objects.bulk_create(new, batch_size=options['batch_size'])
+            Cid10Code.objects.bulk_update(changed, ['description', 'updated_at'], batch_size=options['batch_size'])
+        reset_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(new)} códigos incluídos e {len(changed)} atualizados '
+            f'em {time.perf_counter() - started:.1f}s'
+        ))
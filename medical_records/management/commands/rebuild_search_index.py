@@ -0,0 +1,29 @@
+"""
+Comando que recria a estrutura de busca textual dos prontuários e reindexa todos os registros.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from medical_records.search import install_search_index, reindex_all, uninstall_search_index
+
+
+class Command(BaseCommand):
+    help = 'Recria o índice de busca textual dos prontuários (tsvector/GIN ou FTS5) e reindexa'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Prontuários por lote (padrão: 1000)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with connection.schema_editor() as schema_editor:
+            uninstall_search_index(schema_editor)
+            install_search_index(schema_editor)
+        # Os campos são cifrados: o texto é decifrado e indexado pela aplicação
+        total = reindex_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Índice de busca recriado ({connection.vendor}): {total} prontuários '
+            f'em {time.perf_counter() - started:.1f}s'
+        ))
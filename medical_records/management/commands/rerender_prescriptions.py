@@ -0,0 +1,172 @@
+"""
+Comando para regenerar em lote os PDFs das receitas.
+
+Usado quando o timbre ou os dados de CRM mudam, ou quando arquivos se perdem.
+As receitas são lidas em ordem de ID com ``iterator()`` e renderizadas em
+paralelo por um ProcessPoolExecutor em arquivos temporários; o processo
+principal os move para o armazenamento de arquivos clínicos, grava os nomes no
+banco e um checkpoint a cada lote, permitindo retomar com ``--resume``.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from medical_records.models import Prescription
+from accounts.storage import TEMP_DIR, clinical_file_storage
+from medical_records.workers import init_render_worker, render_prescription_item
+
+CHECKPOINT_FILE = '.rerender_checkpoint.json'
+
+
+class Command(BaseCommand):
+    help = 'Regenera os PDFs das receitas por período ou médico, em paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Data inicial de emissão (AAAA-MM-DD)')
+        parser.add_argument('--end', help='Data final de emissão (AAAA-MM-DD)')
+        parser.add_argument('--doctor', type=int, action='append', help='ID do médico (pode repetir)')
+        parser.add_argument('--missing-only', action='store_true',
+                            help='Regenera apenas receitas sem arquivo ou com o arquivo ausente no disco')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processos de renderização (0 renderiza no próprio processo)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Receitas por lote/checkpoint (padrão: 200)')
+        parser.add_argument('--resume', action='store_true', help='Continua a partir do último checkpoint')
+
+    def handle(self, *args, **options):
+        filters = self.get_filters(options)
+        # Identifica a execução no checkpoint: filtros da consulta + modo de seleção
+        run = dict(filters, missing_only=options['missing_only'])
+        checkpoint_path = os.path.join(settings.MEDIA_ROOT, TEMP_DIR, CHECKPOINT_FILE)
+        last_pk = self.load_checkpoint(checkpoint_path, run) if options['resume'] else 0
+
+        queryset = (
+            Prescription.objects
+            .filter(pk__gt=last_pk, **filters)
+            .select_related('doctor__user', 'patient__user')
+            .order_by('pk')
+        )
+        total = queryset.count()
+        if last_pk:
+            self.stdout.write(f'Retomando após a receita {last_pk} ({total} restantes)')
+
+        executor = None
+        if options['workers'] > 0:
+            executor = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_render_worker,
+            )
+
+        stats = {'rendered': 0, 'skipped': 0, 'failed': 0}
+        started = time.perf_counter()
+        try:
+            batch = []
+            for prescription in queryset.iterator(chunk_size=options['batch_size']):
+                batch.append(prescription)
+                if len(batch) >= options['batch_size']:
+                    self.process_batch(batch, executor, options, stats)
+                    self.save_checkpoint(checkpoint_path, run, batch[-1].pk)
+                    self.report(stats, total, started)
+                    batch = []
+            if batch:
+                self.process_batch(batch, executor, options, stats)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.perf_counter() - started
+        rate = stats['rendered'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {stats['rendered']} PDFs regenerados em {elapsed:.1f}s ({rate:.1f} PDFs/s)"
+        ))
+        if stats['skipped']:
+            self.stdout.write(f"{stats['skipped']} receitas ignoradas (arquivo presente)")
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(f"✗ {stats['failed']} receitas com falha na geração"))
+
+    def get_filters(self, options):
+        filters = {}
+        try:
+            if options['start']:
+                filters['created_at__date__gte'] = date.fromisoformat(options['start']).isoformat()
+            if options['end']:
+                filters['created_at__date__lte'] = date.fromisoformat(options['end']).isoformat()
+        except ValueError:
+            raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
+        if options['doctor']:
+            filters['doctor_id__in'] = sorted(options['doctor'])
+        return filters
+
+    def process_batch(self, batch, executor, options, stats):
+        storage = clinical_file_storage()
+        items = []
+        for prescription in batch:
+            name = prescription.prescription_file.name
+            if options['missing_only'] and name and storage.exists(name):
+                stats['skipped'] += 1
+                continue
+            items.append((prescription, settings.MEDIA_ROOT))
+
+        if executor is not None:
+            results = executor.map(render_prescription_item, items, chunksize=max(1, len(items) // (options['workers'] * 4)))
+        else:
+            results = map(render_prescription_item, items)
+
+        by_pk = {prescription.pk: prescription for prescription in batch}
+        updated = []
+        replaced = []
+        for pk, temp_path, error in results:
+            prescription = by_pk[pk]
+            if error:
+                stats['failed'] += 1
+                self.stderr.write(f'Receita {pk}: {error}')
+                prescription.pdf_status = 'failed'
+            else:
+                # PDFs idênticos ao atual resultam no mesmo blob e não ocupam espaço
+                # novo, mas adopt registra outra referência: a anterior é sempre liberada
+                stats['rendered'] += 1
+                old_name = prescription.prescription_file.name
+                prescription.prescription_file.name = storage.adopt(temp_path, '.pdf')
+                if old_name:
+                    replaced.append(old_name)
+                prescription.pdf_status = 'ready'
+            updated.append(prescription)
+        with transaction.atomic():
+            Prescription.objects.bulk_update(updated, ['prescription_file', 'pdf_status'])
+            # Os arquivos antigos só são liberados depois que nenhuma receita aponta para eles
+            for name in replaced:
+                transaction.on_commit(partial(storage.delete, name))
+
+    def load_checkpoint(self, path, run):
+        try:
+            with open(path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return 0
+        if checkpoint.get('run') != run:
+            raise CommandError('O checkpoint existente foi gerado com outros filtros. Remova-o ou use os mesmos filtros.')
+        return checkpoint['last_pk']
+
+    def save_checkpoint(self, path, run, last_pk):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump({'run': run, 'last_pk': last_pk}, checkpoint_file)
+        os.replace(temp_path, path)
+
+    def report(self, stats, total, started):
+        done = stats['rendered'] + stats['skipped'] + stats['failed']
+        rate = stats['rendered'] / (time.perf_counter() - started)
+        self.stdout.write(f"{done}/{total} receitas processadas ({rate:.1f} PDFs/s)")
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:07
+
+from django.db import migrations, models
+
+
+def mark_existing_pdfs_ready(apps, schema_editor):
+    Prescription = apps.get_model('medical_records', 'Prescription')
+    Prescription.objects.exclude(prescription_file='').update(pdf_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescription',
+            name='pdf_status',
+            field=models.CharField(choices=[('pending', 'Em Geração'), ('ready', 'Disponível'), ('failed', 'Falhou')], default='pending', max_length=10, verbose_name='Status do PDF'),
+        ),
+        migrations.RunPython(mark_existing_pdfs_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:14
+
+import accounts.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0002_prescription_pdf_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exam',
+            name='result_file',
+            field=models.FileField(blank=True, storage=accounts.storage.clinical_file_storage, upload_to='exams/%Y/%m/', verbose_name='Arquivo do Resultado'),
+        ),
+        migrations.AlterField(
+            model_name='prescription',
+            name='prescription_file',
+            field=models.FileField(blank=True, help_text='Receita em formato PDF', storage=accounts.storage.clinical_file_storage, upload_to='prescriptions/%Y/%m/', verbose_name='Arquivo da Receita'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:20
+
+from django.db import migrations
+
+# SQL da busca desta versão, copiado aqui para que a migração não dependa do
+# código atual de medical_records.search (ver 0017, que troca o índice)
+TABLE = 'medical_records_medicalrecord'
+FTS_TABLE = 'medical_records_search'
+FIELDS = ('chief_complaint', 'symptoms', 'diagnosis', 'treatment_plan')
+PG_WEIGHTS = {'chief_complaint': 'A', 'diagnosis': 'A', 'symptoms': 'B', 'treatment_plan': 'C'}
+
+_PG_VECTOR = ' || '.join(
+    f"setweight(to_tsvector('portuguese', coalesce({{row}}.{field}, '')), '{weight}')"
+    for field, weight in PG_WEIGHTS.items()
+)
+
+PG_INSTALL = [
+    f'ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    f'CREATE INDEX IF NOT EXISTS medicalrecord_search_gin ON {TABLE} USING gin (search_vector)',
+    f"""
+    CREATE OR REPLACE FUNCTION medical_records_search_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {_PG_VECTOR.format(row='NEW')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f'DROP TRIGGER IF EXISTS medical_records_search_update ON {TABLE}',
+    f"""
+    CREATE TRIGGER medical_records_search_update
+    BEFORE INSERT OR UPDATE OF {', '.join(FIELDS)} ON {TABLE}
+    FOR EACH ROW EXECUTE FUNCTION medical_records_search_update()
+    """,
+    f'UPDATE {TABLE} SET search_vector = {_PG_VECTOR.format(row=TABLE)}',
+]
+
+PG_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS medical_records_search_update ON {TABLE}',
+    'DROP FUNCTION IF EXISTS medical_records_search_update()',
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+]
+
+_FTS_COLUMNS = ', '.join(FIELDS)
+_FTS_NEW = ', '.join(f'new.{field}' for field in FIELDS)
+_FTS_OLD = ', '.join(f'old.{field}' for field in FIELDS)
+
+SQLITE_INSTALL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_FTS_COLUMNS}, content='{TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD});
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW});
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def install(apps, schema_editor):
+    for statement in {'postgresql': PG_INSTALL, 'sqlite': SQLITE_INSTALL}.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def uninstall(apps, schema_editor):
+    for statement in {'postgresql': PG_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0003_content_addressed_files'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
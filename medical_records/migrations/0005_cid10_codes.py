@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cid10Code',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=8, unique=True, verbose_name='Código')),
+                ('description', models.CharField(max_length=255, verbose_name='Descrição')),
+            ],
+            options={
+                'verbose_name': 'Código CID-10',
+                'verbose_name_plural': 'Códigos CID-10',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.AddField(
+            model_name='medicalrecord',
+            name='diagnosis_codes',
+            field=models.ManyToManyField(blank=True, related_name='medical_records', to='medical_records.cid10code', verbose_name='Diagnósticos (CID-10)'),
+        ),
+    ]
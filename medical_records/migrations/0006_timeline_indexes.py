@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0005_cid10_codes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['patient', 'requested_date'], name='exam_patient_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['patient', 'created_at'], name='record_patient_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', 'created_at'], name='prescription_patient_idx'),
+        ),
+    ]
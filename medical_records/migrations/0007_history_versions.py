@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0006_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalrecordhistory',
+            name='changes',
+            field=models.JSONField(blank=True, default=dict, help_text='Novos valores apenas dos campos alterados', verbose_name='Alterações'),
+        ),
+        migrations.AddField(
+            model_name='medicalrecordhistory',
+            name='snapshot',
+            field=models.JSONField(blank=True, help_text='Estado completo do prontuário, gravado periodicamente', null=True, verbose_name='Cópia Completa'),
+        ),
+        migrations.AddField(
+            model_name='medicalrecordhistory',
+            name='version',
+            field=models.PositiveIntegerField(blank=True, help_text='Versão do prontuário gerada por esta alteração (vazio em registros antigos)', null=True, verbose_name='Versão'),
+        ),
+        migrations.AddConstraint(
+            model_name='medicalrecordhistory',
+            constraint=models.UniqueConstraint(condition=models.Q(('version__isnull', False)), fields=('medical_record', 'version'), name='unique_record_history_version'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:35
+
+import accounts.storage
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('medical_records', '0008_medicalrecord_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Nome do Arquivo')),
+                ('total_size', models.BigIntegerField(verbose_name='Tamanho Total')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='Tamanho das Partes')),
+                ('received_bytes', models.BigIntegerField(default=0, verbose_name='Bytes Recebidos')),
+                ('expected_sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256 Informado')),
+                ('temp_name', models.CharField(max_length=255, verbose_name='Arquivo Temporário')),
+                ('status', models.CharField(choices=[('uploading', 'Enviando'), ('processing', 'Processando'), ('done', 'Concluído'), ('failed', 'Falhou')], default='uploading', max_length=20, verbose_name='Status')),
+                ('error', models.TextField(blank=True, verbose_name='Erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='medical_records.exam', verbose_name='Exame')),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_uploads', to=settings.AUTH_USER_MODEL, verbose_name='Enviado por')),
+            ],
+            options={
+                'verbose_name': 'Envio de Resultado de Exame',
+                'verbose_name_plural': 'Envios de Resultados de Exames',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExamResultPreview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.PositiveIntegerField(verbose_name='Página')),
+                ('is_thumbnail', models.BooleanField(default=False, verbose_name='Miniatura')),
+                ('image', models.FileField(storage=accounts.storage.clinical_file_storage, upload_to='exam_previews/', verbose_name='Imagem')),
+                ('width', models.PositiveIntegerField(verbose_name='Largura')),
+                ('height', models.PositiveIntegerField(verbose_name='Altura')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='previews', to='medical_records.exam', verbose_name='Exame')),
+            ],
+            options={
+                'verbose_name': 'Pré-visualização de Exame',
+                'verbose_name_plural': 'Pré-visualizações de Exames',
+                'ordering': ['exam', 'is_thumbnail', 'page'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='examresultpreview',
+            constraint=models.UniqueConstraint(fields=('exam', 'page', 'is_thumbnail'), name='unique_exam_preview_page'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0002_timeline_indexes'),
+        ('medical_records', '0009_exam_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamResultValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('analyte', models.CharField(help_text='Código do analito (ex.: GLI, CREA, HBA1C ou o código LOINC)', max_length=20, verbose_name='Analito')),
+                ('value', models.FloatField(verbose_name='Valor')),
+                ('unit', models.CharField(blank=True, max_length=20, verbose_name='Unidade')),
+                ('reference_low', models.FloatField(blank=True, null=True, verbose_name='Referência Mínima')),
+                ('reference_high', models.FloatField(blank=True, null=True, verbose_name='Referência Máxima')),
+                ('collected_at', models.DateTimeField(verbose_name='Data da Coleta')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='values', to='medical_records.exam', verbose_name='Exame')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_values', to='patients.patient', verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Valor de Resultado de Exame',
+                'verbose_name_plural': 'Valores de Resultados de Exames',
+                'ordering': ['patient', 'analyte', 'collected_at'],
+                'indexes': [models.Index(fields=['patient', 'analyte', 'collected_at', 'value'], name='exam_value_trend_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='examresultvalue',
+            constraint=models.UniqueConstraint(fields=('exam', 'analyte'), name='unique_exam_analyte'),
+        ),
+    ]
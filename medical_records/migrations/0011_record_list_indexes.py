@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0010_exam_result_values'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['doctor', 'created_at'], name='record_doctor_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['created_at'], name='record_created_idx'),
+        ),
+    ]
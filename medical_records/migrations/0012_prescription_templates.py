@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_data_exports'),
+        ('medical_records', '0011_record_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrescriptionTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Ex.: Amigdalite bacteriana - adulto', max_length=100, verbose_name='Nome')),
+                ('medications', models.TextField(help_text='Medicamentos e posologia, um por linha', verbose_name='Medicamentos')),
+                ('instructions', models.TextField(blank=True, verbose_name='Instruções')),
+                ('usage_count', models.PositiveIntegerField(default=0, verbose_name='Vezes Usada')),
+                ('last_used_at', models.DateTimeField(blank=True, null=True, verbose_name='Último Uso')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prescription_templates', to='accounts.doctorprofile', verbose_name='Médico')),
+            ],
+            options={
+                'verbose_name': 'Receita Favorita',
+                'verbose_name_plural': 'Receitas Favoritas',
+                'ordering': ['-usage_count', 'name'],
+                'indexes': [models.Index(fields=['doctor', '-usage_count', 'name'], name='prescription_template_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='prescriptiontemplate',
+            constraint=models.UniqueConstraint(fields=('doctor', 'name'), name='unique_prescription_template_name'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:56
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0012_prescription_templates'),
+    ]
+
+    # A coluna continua do tipo texto: só o estado do modelo muda (sem recriar
+    # a tabela). Os valores existentes são cifrados por rotate_encryption_keys.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='medicalrecord',
+                    name='observations',
+                    field=accounts.fields.EncryptedTextField(blank=True, verbose_name='Observações'),
+                ),
+                migrations.AlterField(
+                    model_name='medicalrecord',
+                    name='physical_examination',
+                    field=accounts.fields.EncryptedTextField(blank=True, verbose_name='Exame Físico'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+# Triggers da busca no SQLite nesta versão (ver 0004), copiadas aqui para que a
+# migração não dependa do código atual de medical_records.search
+TABLE = 'medical_records_medicalrecord'
+FTS_TABLE = 'medical_records_search'
+_FTS_COLUMNS = 'chief_complaint, symptoms, diagnosis, treatment_plan'
+_FTS_NEW = 'new.chief_complaint, new.symptoms, new.diagnosis, new.treatment_plan'
+_FTS_OLD = 'old.chief_complaint, old.symptoms, old.diagnosis, old.treatment_plan'
+
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD});
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW});
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def reinstall_search_index(apps, schema_editor):
+    # No SQLite o AddField recria a tabela de prontuários e descarta as triggers da busca
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+def count_comments(apps, schema_editor):
+    MedicalRecord = apps.get_model('medical_records', 'MedicalRecord')
+    MedicalRecordComment = apps.get_model('medical_records', 'MedicalRecordComment')
+    counts = (
+        MedicalRecordComment.objects
+        .filter(medical_record=OuterRef('pk'))
+        .order_by()
+        .values('medical_record')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    MedicalRecord.objects.filter(
+        pk__in=MedicalRecordComment.objects.values('medical_record')
+    ).update(comment_count=Subquery(counts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0013_encrypted_clinical_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalrecord',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Mantido pelos sinais de criação e exclusão de comentários', verbose_name='Comentários'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalrecordcomment',
+            index=models.Index(fields=['medical_record', 'created_at', 'id'], name='record_comment_thread_idx'),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
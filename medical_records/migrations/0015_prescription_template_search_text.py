@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:11
+
+from django.db import migrations, models
+
+from medical_records.cid10 import normalize
+
+
+def fill_search_text(apps, schema_editor):
+    PrescriptionTemplate = apps.get_model('medical_records', 'PrescriptionTemplate')
+    templates = list(PrescriptionTemplate.objects.only('name', 'medications'))
+    for template in templates:
+        template.search_text = normalize(f'{template.name} {template.medications}')
+    PrescriptionTemplate.objects.bulk_update(templates, ['search_text'], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0014_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescriptiontemplate',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False, help_text='Nome e medicamentos em minúsculas e sem acentos', verbose_name='Texto de Busca'),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0015_prescription_template_search_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examupload',
+            name='stored_name',
+            field=models.CharField(blank=True, help_text='Blob do arquivo completo, registrado antes de movê-lo (permite retomar o processamento)', max_length=255, verbose_name='Arquivo Armazenado'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:21
+
+import re
+import unicodedata
+
+import accounts.fields
+from accounts.encryption import blind_token
+from django.db import migrations
+
+# Índice de busca desta versão, copiado aqui para que a migração não dependa do
+# código atual de medical_records.search. As colunas passam a ser cifradas:
+# as triggers que indexavam o texto das colunas saem e o índice guarda só as
+# marcas HMAC das palavras (blind_token), gravadas pela aplicação.
+TABLE = 'medical_records_medicalrecord'
+FTS_TABLE = 'medical_records_search'
+FIELDS = ('chief_complaint', 'symptoms', 'diagnosis', 'treatment_plan')
+PG_WEIGHTS = {'chief_complaint': 'A', 'diagnosis': 'A', 'symptoms': 'B', 'treatment_plan': 'C'}
+BATCH_SIZE = 1000
+
+PG_REBUILD = [
+    f'DROP TRIGGER IF EXISTS medical_records_search_update ON {TABLE}',
+    'DROP FUNCTION IF EXISTS medical_records_search_update()',
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+    f'ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector',
+    f'CREATE INDEX medicalrecord_search_gin ON {TABLE} USING gin (search_vector)',
+]
+PG_INDEX = (
+    f'UPDATE {TABLE} SET search_vector = '
+    + ' || '.join(f"setweight(to_tsvector('simple', %s), '{weight}')" for weight in PG_WEIGHTS.values())
+    + ' WHERE id = %s'
+)
+
+SQLITE_REBUILD = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+    f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({", ".join(FIELDS)})',
+]
+SQLITE_INDEX = f'INSERT INTO {FTS_TABLE}(rowid, {", ".join(FIELDS)}) VALUES (%s, %s, %s, %s, %s)'
+
+
+def index_text(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    plain = ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+    return ' '.join(blind_token(word) for word in re.findall(r'[^\W_]+', plain))
+
+
+def rebuild_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        statements, insert, order = PG_REBUILD, PG_INDEX, tuple(PG_WEIGHTS)
+    elif connection.vendor == 'sqlite':
+        statements, insert, order = SQLITE_REBUILD, SQLITE_INDEX, FIELDS
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+    # Os campos do modelo histórico são EncryptedTextField: valores já decifrados
+    MedicalRecord = apps.get_model('medical_records', 'MedicalRecord')
+    queryset = MedicalRecord.objects.using(connection.alias).only('pk', *FIELDS).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        rows = []
+        for record in batch:
+            texts = [index_text(getattr(record, field)) for field in order]
+            rows.append([*texts, record.pk] if connection.vendor == 'postgresql' else [record.pk, *texts])
+        with connection.cursor() as cursor:
+            cursor.executemany(insert, rows)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0016_exam_upload_stored_name'),
+    ]
+
+    # Como em 0013, a coluna continua do tipo texto: só o estado do modelo muda.
+    # Os valores existentes são cifrados por rotate_encryption_keys.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='medicalrecord',
+                    name='chief_complaint',
+                    field=accounts.fields.EncryptedTextField(help_text='Motivo da consulta relatado pelo paciente', verbose_name='Queixa Principal'),
+                ),
+                migrations.AlterField(
+                    model_name='medicalrecord',
+                    name='diagnosis',
+                    field=accounts.fields.EncryptedTextField(verbose_name='Diagnóstico'),
+                ),
+                migrations.AlterField(
+                    model_name='medicalrecord',
+                    name='symptoms',
+                    field=accounts.fields.EncryptedTextField(blank=True, verbose_name='Sintomas'),
+                ),
+                migrations.AlterField(
+                    model_name='medicalrecord',
+                    name='treatment_plan',
+                    field=accounts.fields.EncryptedTextField(blank=True, verbose_name='Plano de Tratamento'),
+                ),
+            ],
+        ),
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+    ]
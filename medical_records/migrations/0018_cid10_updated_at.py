@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_records', '0017_encrypt_record_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cid10code',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Atualizado em'),
+        ),
+    ]
@@ -2,9 +2,47 @@
 Modelos para o app de prontuários médicos.
 """
 
+import uuid
+
 from django.db import models
 from django.conf import settings
 
+from accounts.fields import EncryptedTextField
+from accounts.storage import clinical_file_storage
+
+
+class Cid10Code(models.Model):
+    """
+    Código da Classificação Internacional de Doenças (CID-10).
+    Catálogo carregado pelo comando load_cid10.
+    """
+    
+    code = models.CharField(
+        'Código',
+        max_length=8,
+        unique=True
+    )
+    
+    description = models.CharField(
+        'Descrição',
+        max_length=255
+    )
+    
+    # Faz parte da assinatura do catálogo (cid10.catalog_signature)
+    updated_at = models.DateTimeField(
+        'Atualizado em',
+        auto_now=True,
+        db_index=True
+    )
+    
+    class Meta:
+        verbose_name = 'Código CID-10'
+        verbose_name_plural = 'Códigos CID-10'
+        ordering = ['code']
+    
+    def __str__(self):
+        return f"{self.code} - {self.description}"
+
 
 class MedicalRecord(models.Model):
     """
@@ -32,31 +70,38 @@ class MedicalRecord(models.Model):
         verbose_name='Médico'
     )
     
-    chief_complaint = models.TextField(
+    chief_complaint = EncryptedTextField(
         'Queixa Principal',
         help_text='Motivo da consulta relatado pelo paciente'
     )
     
-    symptoms = models.TextField(
+    symptoms = EncryptedTextField(
         'Sintomas',
         blank=True
     )
     
-    physical_examination = models.TextField(
+    physical_examination = EncryptedTextField(
         'Exame Físico',
         blank=True
     )
     
-    diagnosis = models.TextField(
+    diagnosis = EncryptedTextField(
         'Diagnóstico'
     )
     
-    treatment_plan = models.TextField(
+    diagnosis_codes = models.ManyToManyField(
+        Cid10Code,
+        blank=True,
+        related_name='medical_records',
+        verbose_name='Diagnósticos (CID-10)'
+    )
+    
+    treatment_plan = EncryptedTextField(
         'Plano de Tratamento',
         blank=True
     )
     
-    observations = models.TextField(
+    observations = EncryptedTextField(
         'Observações',
         blank=True
     )
@@ -73,6 +118,20 @@ class MedicalRecord(models.Model):
         blank=True
     )
     
+    version = models.PositiveIntegerField(
+        'Versão',
+        default=1,
+        editable=False,
+        help_text='Incrementada a cada gravação; usada para detectar edições simultâneas'
+    )
+    
+    comment_count = models.PositiveIntegerField(
+        'Comentários',
+        default=0,
+        editable=False,
+        help_text='Mantido pelos sinais de criação e exclusão de comentários'
+    )
+    
     created_at = models.DateTimeField(
         'Criado em',
         auto_now_add=True
@@ -87,10 +146,65 @@ class MedicalRecord(models.Model):
         verbose_name = 'Prontuário Médico'
         verbose_name_plural = 'Prontuários Médicos'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='record_patient_created_idx'),
+            models.Index(fields=['doctor', 'created_at'], name='record_doctor_created_idx'),
+            models.Index(fields=['created_at'], name='record_created_idx'),
+        ]
     
     def __str__(self):
         return f"Prontuário - {self.patient.user.get_full_name()} ({self.appointment.scheduled_date.strftime('%d/%m/%Y')})"
     
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is None:
+                # O contador de comentários só muda por UPDATE atômico: uma
+                # gravação completa não pode voltar a um valor lido antes
+                deferred = self.get_deferred_fields()
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name != 'comment_count' and field.attname not in deferred
+                ]
+        super().save(*args, **kwargs)
+    
+    def update_if_current(self, expected_version, fields):
+        """
+        Grava os campos informados somente se o prontuário ainda estiver na
+        versão esperada (UPDATE ... WHERE version = n), sem bloqueios.
+        Retorna False se outra edição foi gravada antes.
+        """
+        from django.utils import timezone
+        from .search import SEARCH_FIELDS, index_record
+        values = {field: getattr(self, field) for field in fields}
+        updated = MedicalRecord.objects.filter(pk=self.pk, version=expected_version).update(
+            version=expected_version + 1, updated_at=timezone.now(), **values
+        )
+        if updated:
+            self.version = expected_version + 1
+            if any(field in SEARCH_FIELDS for field in fields):
+                # O UPDATE não passa pelo save(): o índice de busca é refeito aqui
+                index_record(self)
+        return bool(updated)
+    
+    def add_comment(self, author, comment):
+        """
+        Adiciona um comentário (adendo), inclusive em prontuário fechado: grava
+        o comentário, o contador e a entrada no histórico na mesma transação.
+        """
+        from django.db import transaction
+        with transaction.atomic():
+            # O contador é incrementado pelo sinal post_save do comentário
+            created = MedicalRecordComment.objects.create(medical_record=self, author=author, comment=comment)
+            MedicalRecordHistory.objects.create(
+                medical_record=self,
+                user=author,
+                action='comment_added',
+                description=f'Comentário #{created.pk} adicionado.',
+            )
+        self.comment_count += 1
+        return created
+    
     def close_record(self):
         """Fecha o prontuário, impedindo edições futuras."""
         from django.utils import timezone
@@ -133,6 +247,9 @@ class MedicalRecordComment(models.Model):
         verbose_name = 'Comentário de Prontuário'
         verbose_name_plural = 'Comentários de Prontuários'
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['medical_record', 'created_at', 'id'], name='record_comment_thread_idx'),
+        ]
     
     def __str__(self):
         return f"Comentário por {self.author.get_full_name()} em {self.created_at.strftime('%d/%m/%Y %H:%M')}"
@@ -143,6 +260,12 @@ class Prescription(models.Model):
     Modelo de Receita Médica.
     """
     
+    PDF_STATUS_CHOICES = (
+        ('pending', 'Em Geração'),
+        ('ready', 'Disponível'),
+        ('failed', 'Falhou'),
+    )
+    
     medical_record = models.ForeignKey(
         MedicalRecord,
         on_delete=models.CASCADE,
@@ -183,10 +306,18 @@ class Prescription(models.Model):
     prescription_file = models.FileField(
         'Arquivo da Receita',
         upload_to='prescriptions/%Y/%m/',
+        storage=clinical_file_storage,
         blank=True,
         help_text='Receita em formato PDF'
     )
     
+    pdf_status = models.CharField(
+        'Status do PDF',
+        max_length=10,
+        choices=PDF_STATUS_CHOICES,
+        default='pending'
+    )
+    
     created_at = models.DateTimeField(
         'Criado em',
         auto_now_add=True
@@ -196,11 +327,95 @@ class Prescription(models.Model):
         verbose_name = 'Receita Médica'
         verbose_name_plural = 'Receitas Médicas'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='prescription_patient_idx'),
+        ]
     
     def __str__(self):
         return f"Receita - {self.patient.user.get_full_name()} ({self.created_at.strftime('%d/%m/%Y')})"
 
 
+class PrescriptionTemplate(models.Model):
+    """
+    Modelo de Receita Favorita do médico (modelo reaproveitado ao emitir receitas).
+    """
+    
+    doctor = models.ForeignKey(
+        'accounts.DoctorProfile',
+        on_delete=models.CASCADE,
+        related_name='prescription_templates',
+        verbose_name='Médico'
+    )
+    
+    name = models.CharField(
+        'Nome',
+        max_length=100,
+        help_text='Ex.: Amigdalite bacteriana - adulto'
+    )
+    
+    medications = models.TextField(
+        'Medicamentos',
+        help_text='Medicamentos e posologia, um por linha'
+    )
+    
+    instructions = models.TextField(
+        'Instruções',
+        blank=True
+    )
+    
+    usage_count = models.PositiveIntegerField(
+        'Vezes Usada',
+        default=0
+    )
+    
+    last_used_at = models.DateTimeField(
+        'Último Uso',
+        null=True,
+        blank=True
+    )
+    
+    search_text = models.TextField(
+        'Texto de Busca',
+        blank=True,
+        editable=False,
+        help_text='Nome e medicamentos em minúsculas e sem acentos'
+    )
+    
+    created_at = models.DateTimeField(
+        'Criado em',
+        auto_now_add=True
+    )
+    
+    updated_at = models.DateTimeField(
+        'Atualizado em',
+        auto_now=True
+    )
+    
+    class Meta:
+        verbose_name = 'Receita Favorita'
+        verbose_name_plural = 'Receitas Favoritas'
+        ordering = ['-usage_count', 'name']
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'name'], name='unique_prescription_template_name'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', '-usage_count', 'name'], name='prescription_template_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} - Dr(a). {self.doctor.user.get_full_name()}"
+    
+    def save(self, *args, **kwargs):
+        from .cid10 import normalize
+        
+        # Busca sem acentos também no banco, igual à busca na lista em cache
+        self.search_text = normalize(f'{self.name} {self.medications}')
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'name', 'medications'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+
+
 class Exam(models.Model):
     """
     Modelo de Exame Médico.
@@ -292,6 +507,7 @@ class Exam(models.Model):
     result_file = models.FileField(
         'Arquivo do Resultado',
         upload_to='exams/%Y/%m/',
+        storage=clinical_file_storage,
         blank=True
     )
     
@@ -309,11 +525,236 @@ class Exam(models.Model):
         verbose_name = 'Exame'
         verbose_name_plural = 'Exames'
         ordering = ['-requested_date']
+        indexes = [
+            models.Index(fields=['patient', 'requested_date'], name='exam_patient_requested_idx'),
+        ]
     
     def __str__(self):
         return f"{self.exam_name} - {self.patient.user.get_full_name()} ({self.get_status_display()})"
 
 
+class ExamUpload(models.Model):
+    """
+    Envio em partes (chunks) do arquivo de resultado de um exame.
+    As partes são gravadas em sequência num arquivo temporário do armazenamento
+    de arquivos clínicos; ``received_bytes`` é o ponto de retomada.
+    """
+    
+    STATUS_CHOICES = (
+        ('uploading', 'Enviando'),
+        ('processing', 'Processando'),
+        ('done', 'Concluído'),
+        ('failed', 'Falhou'),
+    )
+    
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    
+    exam = models.ForeignKey(
+        Exam,
+        on_delete=models.CASCADE,
+        related_name='uploads',
+        verbose_name='Exame'
+    )
+    
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='exam_uploads',
+        verbose_name='Enviado por'
+    )
+    
+    filename = models.CharField(
+        'Nome do Arquivo',
+        max_length=255
+    )
+    
+    total_size = models.BigIntegerField(
+        'Tamanho Total'
+    )
+    
+    chunk_size = models.PositiveIntegerField(
+        'Tamanho das Partes'
+    )
+    
+    received_bytes = models.BigIntegerField(
+        'Bytes Recebidos',
+        default=0
+    )
+    
+    expected_sha256 = models.CharField(
+        'SHA-256 Informado',
+        max_length=64,
+        blank=True
+    )
+    
+    temp_name = models.CharField(
+        'Arquivo Temporário',
+        max_length=255
+    )
+    
+    stored_name = models.CharField(
+        'Arquivo Armazenado',
+        max_length=255,
+        blank=True,
+        help_text='Blob do arquivo completo, registrado antes de movê-lo (permite retomar o processamento)'
+    )
+    
+    status = models.CharField(
+        'Status',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='uploading'
+    )
+    
+    error = models.TextField(
+        'Erro',
+        blank=True
+    )
+    
+    created_at = models.DateTimeField(
+        'Criado em',
+        auto_now_add=True
+    )
+    
+    updated_at = models.DateTimeField(
+        'Atualizado em',
+        auto_now=True
+    )
+    
+    class Meta:
+        verbose_name = 'Envio de Resultado de Exame'
+        verbose_name_plural = 'Envios de Resultados de Exames'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received_bytes}/{self.total_size} bytes)"
+
+
+class ExamResultPreview(models.Model):
+    """
+    Imagem de pré-visualização do resultado de um exame: uma por página
+    (ou quadro, em TIFF com várias páginas) e uma miniatura da primeira.
+    """
+    
+    exam = models.ForeignKey(
+        Exam,
+        on_delete=models.CASCADE,
+        related_name='previews',
+        verbose_name='Exame'
+    )
+    
+    page = models.PositiveIntegerField(
+        'Página'
+    )
+    
+    is_thumbnail = models.BooleanField(
+        'Miniatura',
+        default=False
+    )
+    
+    image = models.FileField(
+        'Imagem',
+        upload_to='exam_previews/',
+        storage=clinical_file_storage
+    )
+    
+    width = models.PositiveIntegerField('Largura')
+    
+    height = models.PositiveIntegerField('Altura')
+    
+    class Meta:
+        verbose_name = 'Pré-visualização de Exame'
+        verbose_name_plural = 'Pré-visualizações de Exames'
+        ordering = ['exam', 'is_thumbnail', 'page']
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'page', 'is_thumbnail'], name='unique_exam_preview_page'),
+        ]
+    
+    def __str__(self):
+        return f"{self.exam} - página {self.page}"
+    
+    @property
+    def patient(self):
+        return self.exam.patient
+    
+    @property
+    def patient_id(self):
+        return self.exam.patient_id
+    
+    @property
+    def doctor_id(self):
+        return self.exam.doctor_id
+
+
+class ExamResultValue(models.Model):
+    """
+    Valor numérico de um analito no resultado de um exame (glicose, creatinina,
+    HbA1c...). O paciente é repetido aqui para que a série de um analito seja
+    lida pelo índice (paciente, analito, data) sem junção com Exame.
+    """
+    
+    exam = models.ForeignKey(
+        Exam,
+        on_delete=models.CASCADE,
+        related_name='values',
+        verbose_name='Exame'
+    )
+    
+    patient = models.ForeignKey(
+        'patients.Patient',
+        on_delete=models.CASCADE,
+        related_name='exam_values',
+        verbose_name='Paciente'
+    )
+    
+    analyte = models.CharField(
+        'Analito',
+        max_length=20,
+        help_text='Código do analito (ex.: GLI, CREA, HBA1C ou o código LOINC)'
+    )
+    
+    value = models.FloatField('Valor')
+    
+    unit = models.CharField(
+        'Unidade',
+        max_length=20,
+        blank=True
+    )
+    
+    reference_low = models.FloatField(
+        'Referência Mínima',
+        null=True,
+        blank=True
+    )
+    
+    reference_high = models.FloatField(
+        'Referência Máxima',
+        null=True,
+        blank=True
+    )
+    
+    collected_at = models.DateTimeField('Data da Coleta')
+    
+    class Meta:
+        verbose_name = 'Valor de Resultado de Exame'
+        verbose_name_plural = 'Valores de Resultados de Exames'
+        ordering = ['patient', 'analyte', 'collected_at']
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'analyte'], name='unique_exam_analyte'),
+        ]
+        indexes = [
+            # O valor no fim do índice permite ler a série sem acessar a tabela
+            models.Index(fields=['patient', 'analyte', 'collected_at', 'value'], name='exam_value_trend_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.analyte}: {self.value:g} {self.unit}".strip()
+
+
 class MedicalRecordHistory(models.Model):
     """
     Modelo de Histórico de Alterações em Prontuário.
@@ -352,6 +793,27 @@ class MedicalRecordHistory(models.Model):
         blank=True
     )
     
+    version = models.PositiveIntegerField(
+        'Versão',
+        null=True,
+        blank=True,
+        help_text='Versão do prontuário gerada por esta alteração (vazio em registros antigos)'
+    )
+    
+    changes = models.JSONField(
+        'Alterações',
+        default=dict,
+        blank=True,
+        help_text='Novos valores apenas dos campos alterados'
+    )
+    
+    snapshot = models.JSONField(
+        'Cópia Completa',
+        null=True,
+        blank=True,
+        help_text='Estado completo do prontuário, gravado periodicamente'
+    )
+    
     timestamp = models.DateTimeField(
         'Data/Hora',
         auto_now_add=True
@@ -361,6 +823,13 @@ class MedicalRecordHistory(models.Model):
         verbose_name = 'Histórico de Prontuário'
         verbose_name_plural = 'Históricos de Prontuários'
         ordering = ['-timestamp']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['medical_record', 'version'],
+                condition=models.Q(version__isnull=False),
+                name='unique_record_history_version'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.get_action_display()} por {self.user.get_full_name()} em {self.timestamp.strftime('%d/%m/%Y %H:%M')}"
@@ -0,0 +1,138 @@
+"""
+Motor de renderização de receitas em PDF (reportlab).
+
+Folha de estilos, blocos fixos e o cabeçalho/assinatura de cada médico são
+montados uma única vez por processo e reaproveitados entre receitas; apenas
+os dados do paciente e dos medicamentos são renderizados a cada PDF.
+
+O cabeçalho é guardado por médico e invalidado pelo ``updated_at`` do perfil e
+do usuário (nome e telefone aparecem no cabeçalho). Os flowables em cache são
+copiados superficialmente antes do uso: a cópia mantém o texto já processado
+pelo parser do Paragraph, e o layout calculado no ``wrap`` fica só na cópia.
+"""
+
+import copy
+import os
+from collections import OrderedDict
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+MAX_CACHED_DOCTORS = 512
+
+
+class PrescriptionPdfEngine:
+    """Renderizador de receitas com estilos e cabeçalhos pré-montados."""
+
+    def __init__(self, max_cached_doctors=MAX_CACHED_DOCTORS):
+        self.styles = getSampleStyleSheet()
+        self.max_cached_doctors = max_cached_doctors
+        self._doctor_blocks = OrderedDict()
+
+        styles = self.styles
+        self._title = [
+            Paragraph("<b>RECEITUÁRIO MÉDICO</b>", styles['h1']),
+            Spacer(1, 0.5*cm),
+        ]
+        self._medications_heading = Paragraph("<b>MEDICAMENTOS PRESCRITOS:</b>", styles['h3'])
+        self._instructions_heading = Paragraph("<b>INSTRUÇÕES DE USO:</b>", styles['h3'])
+        self._no_validity = Paragraph("<b>Validade:</b> Indeterminada", styles['Normal'])
+        self._signature_line = Paragraph("___________________________________________________", styles['Normal'])
+
+    @staticmethod
+    def doctor_cache_key(doctor):
+        return (doctor.pk, doctor.updated_at, doctor.user.updated_at)
+
+    def doctor_blocks(self, doctor):
+        """Cabeçalho e assinatura do médico, montados uma vez por versão do perfil."""
+        key = self.doctor_cache_key(doctor)
+        blocks = self._doctor_blocks.get(doctor.pk)
+        if blocks is not None and blocks[0] == key:
+            self._doctor_blocks.move_to_end(doctor.pk)
+            return blocks[1], blocks[2]
+
+        styles = self.styles
+        name = doctor.user.get_full_name()
+        header = [
+            Paragraph(f"<b>Dr(a). {name}</b>", styles['h2']),
+            Paragraph(f"CRM: {doctor.crm}", styles['Normal']),
+            Paragraph(f"Especialidade: {doctor.specialty}", styles['Normal']),
+            Paragraph(f"Telefone: {doctor.user.phone or 'N/A'}", styles['Normal']),
+            Spacer(1, 0.5*cm),
+        ]
+        signature = [
+            self._signature_line,
+            Paragraph(f"Assinatura e Carimbo do Dr(a). {name}", styles['Normal']),
+        ]
+
+        self._doctor_blocks[doctor.pk] = (key, header, signature)
+        self._doctor_blocks.move_to_end(doctor.pk)
+        while len(self._doctor_blocks) > self.max_cached_doctors:
+            self._doctor_blocks.popitem(last=False)
+        return header, signature
+
+    def build_story(self, prescription):
+        """Monta a lista de flowables da receita."""
+        styles = self.styles
+        header, signature = self.doctor_blocks(prescription.doctor)
+        story = [copy.copy(flowable) for flowable in header + self._title]
+
+        # --- Dados do Paciente ---
+        patient_user = prescription.patient.user
+        birth_date = patient_user.birth_date.strftime('%d/%m/%Y') if patient_user.birth_date else 'N/A'
+        story += [
+            Paragraph(f"<b>Paciente:</b> {patient_user.get_full_name()}", styles['Normal']),
+            Paragraph(f"<b>Data de Nascimento:</b> {birth_date}", styles['Normal']),
+            Paragraph(f"<b>CPF:</b> {patient_user.cpf}", styles['Normal']),
+            Spacer(1, 0.5*cm),
+        ]
+
+        # --- Medicamentos ---
+        story.append(copy.copy(self._medications_heading))
+        story.append(Paragraph(prescription.medications.replace('\n', '<br/>'), styles['Normal']))
+        story.append(Spacer(1, 0.5*cm))
+
+        # --- Instruções ---
+        if prescription.instructions:
+            story.append(copy.copy(self._instructions_heading))
+            story.append(Paragraph(prescription.instructions.replace('\n', '<br/>'), styles['Normal']))
+            story.append(Spacer(1, 0.5*cm))
+
+        # --- Data e Validade ---
+        story.append(Paragraph(f"<b>Data da Emissão:</b> {prescription.created_at.strftime('%d/%m/%Y')}", styles['Normal']))
+        if prescription.valid_until:
+            story.append(Paragraph(f"<b>Válida até:</b> {prescription.valid_until.strftime('%d/%m/%Y')}", styles['Normal']))
+        else:
+            story.append(copy.copy(self._no_validity))
+        story.append(Spacer(1, 2*cm))
+
+        # --- Assinatura (Espaço) ---
+        story += [copy.copy(flowable) for flowable in signature]
+        return story
+
+    def render(self, prescription, file_path):
+        """Gera o PDF da receita em ``file_path``."""
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        doc = SimpleDocTemplate(
+            file_path,
+            pagesize=A4,
+            leftMargin=2.5*cm,
+            rightMargin=2.5*cm,
+            topMargin=2.5*cm,
+            bottomMargin=2.5*cm
+        )
+        doc.build(self.build_story(prescription))
+        return file_path
+
+
+_engine = None
+
+
+def get_engine():
+    """Motor compartilhado pelo processo (cada worker monta o seu)."""
+    global _engine
+    if _engine is None:
+        _engine = PrescriptionPdfEngine()
+    return _engine
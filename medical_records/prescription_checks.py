@@ -0,0 +1,236 @@
+"""
+Alertas de alergia e de medicamento duplicado na emissão de receitas.
+
+O dicionário local de medicamentos (``data/medicamentos.csv``: princípio
+ativo, sinônimos e nomes comerciais, classe) é carregado uma vez por
+processo. Para cada paciente, os alérgenos e os medicamentos em uso são
+convertidos em princípios ativos e classes, e um autômato Aho-Corasick com
+todos os termos do dicionário e os nomes cadastrados para o paciente é
+compilado e guardado em cache (pela lista de termos, que muda pouco). O
+texto da receita é então percorrido uma única vez, em tempo linear.
+
+Assim, alergia a "penicilina" alerta para "Amoxil 500mg" e "Novalgina" é
+reconhecida como a dipirona já em uso.
+"""
+
+import csv
+import os
+from collections import deque
+from functools import lru_cache
+
+from .cid10 import normalize
+
+DICTIONARY_PATH = os.path.join(os.path.dirname(__file__), 'data', 'medicamentos.csv')
+
+DRUG = 'drug'
+CLASS = 'class'
+ALLERGEN = 'allergen'
+MEDICATION = 'medication'
+
+
+class AhoCorasick:
+    """Autômato de busca simultânea de vários termos (em texto já normalizado)."""
+
+    __slots__ = ('goto', 'fail', 'output')
+
+    def __init__(self, patterns):
+        """``patterns``: pares (termo, dado associado)."""
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for term, payload in patterns:
+            state = 0
+            for char in term:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append((len(term), payload))
+
+        # Ligações de falha em largura; cada estado herda as saídas do seu sufixo
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def search(self, text):
+        """Ocorrências de palavras inteiras: tuplas (início, fim, dado associado)."""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in output[state]:
+                start = index - length + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (
+                    index + 1 == len(text) or not text[index + 1].isalnum()
+                ):
+                    yield start, index + 1, payload
+
+
+def _class_aliases(drug_class):
+    """Nome da classe e, se for uma só palavra no plural, o singular ("penicilinas" -> "penicilina")."""
+    aliases = {drug_class}
+    if ' ' not in drug_class and drug_class.endswith('s'):
+        aliases.add(drug_class[:-1])
+    return aliases
+
+
+class DrugDictionary:
+    """Dicionário local: termo normalizado -> princípio ativo ou classe."""
+
+    def __init__(self, rows):
+        self.terms = {}
+        self.drug_class = {}
+        for name, synonyms, drug_class in rows:
+            drug = normalize(name).strip()
+            drug_class = normalize(drug_class).strip()
+            self.drug_class[drug] = drug_class
+            for term in [name, *synonyms.split('|')]:
+                term = normalize(term).strip()
+                if term:
+                    self.terms[term] = (DRUG, drug)
+            if drug_class:
+                for alias in _class_aliases(drug_class):
+                    self.terms.setdefault(alias, (CLASS, drug_class))
+        self.matcher = AhoCorasick(self.terms.items())
+
+    def concepts(self, text):
+        """Princípios ativos e classes citados no texto: conjuntos (ativos, classes)."""
+        drugs, classes = set(), set()
+        for _, _, (kind, value) in self.matcher.search(normalize(text)):
+            if kind == DRUG:
+                drugs.add(value)
+                if self.drug_class.get(value):
+                    classes.add(self.drug_class[value])
+            else:
+                classes.add(value)
+        return drugs, classes
+
+
+def read_dictionary(path=DICTIONARY_PATH):
+    with open(path, newline='', encoding='utf-8') as dictionary_file:
+        reader = csv.DictReader(dictionary_file, delimiter=';')
+        return [(row['nome'], row.get('sinonimos') or '', row.get('classe') or '') for row in reader]
+
+
+@lru_cache(maxsize=1)
+def get_dictionary():
+    """Dicionário compartilhado pelo processo."""
+    return DrugDictionary(read_dictionary())
+
+
+def normalize_with_offsets(text):
+    """
+    Texto normalizado e, para cada caractere dele, a posição de origem no texto
+    original: a decomposição NFKD muda o comprimento ("½" vira "1⁄2", ligaduras
+    viram duas letras), então as posições do texto normalizado não servem para
+    recortar o original.
+    """
+    if text.isascii():
+        return text.lower(), range(len(text))
+    chars, offsets = [], []
+    for index, char in enumerate(text):
+        normalized = normalize(char)
+        chars.append(normalized)
+        offsets.extend([index] * len(normalized))
+    return ''.join(chars), offsets
+
+
+class PrescriptionChecker:
+    """Verificador compilado para um conjunto de alergias e medicamentos em uso."""
+
+    def __init__(self, allergies, medications, dictionary):
+        self.dictionary = dictionary
+        # Alérgeno -> (princípios ativos, classes); a classe só é ampliada para
+        # todos os seus membros quando o próprio alérgeno é a classe
+        self.allergies = [(allergen, severity, *dictionary.concepts(allergen)) for allergen, severity in allergies]
+        self.medications = [(name, dictionary.concepts(name)[0]) for name in medications]
+        patterns = list(dictionary.terms.items())
+        patterns += [(normalize(allergy[0]).strip(), (ALLERGEN, allergy)) for allergy in allergies]
+        patterns += [(normalize(name).strip(), (MEDICATION, name)) for name in medications]
+        self.matcher = AhoCorasick([(term, payload) for term, payload in patterns if term])
+
+    def _allergy_hits(self, kind, value):
+        drug_class = self.dictionary.drug_class.get(value) if kind == DRUG else value
+        for allergen, severity, drugs, classes in self.allergies:
+            if kind == DRUG and (value in drugs or (drug_class and drug_class in classes and not drugs)):
+                yield allergen, severity
+            elif kind == CLASS and (value in classes or any(self.dictionary.drug_class.get(drug) == value for drug in drugs)):
+                yield allergen, severity
+
+    def check(self, text):
+        """
+        Percorre o texto da receita uma vez e retorna os alertas:
+        dicionários com kind ("allergy" ou "duplicate"), term (trecho da receita) e message.
+        """
+        warnings = {}
+        normalized, offsets = normalize_with_offsets(text)
+        for start, end, (kind, value) in self.matcher.search(normalized):
+            term = text[offsets[start]:offsets[end - 1] + 1]
+            if kind == ALLERGEN:
+                hits = [value]
+            elif kind in (DRUG, CLASS):
+                hits = list(self._allergy_hits(kind, value))
+            else:
+                hits = []
+            for allergen, severity in hits:
+                message = f'Paciente com alergia a {allergen}'
+                if severity:
+                    message += f' ({severity})'
+                warnings.setdefault(('allergy', allergen), {
+                    'kind': 'allergy', 'term': term, 'message': f'{message}: "{term}" na receita.',
+                })
+
+            if kind == MEDICATION:
+                in_use = [value]
+            elif kind == DRUG:
+                in_use = [name for name, drugs in self.medications if value in drugs]
+            else:
+                in_use = []
+            for name in in_use:
+                warnings.setdefault(('duplicate', name), {
+                    'kind': 'duplicate', 'term': term,
+                    'message': f'"{term}" duplica o medicamento em uso {name}.',
+                })
+        return list(warnings.values())
+
+
+@lru_cache(maxsize=512)
+def compile_checker(allergies, medications):
+    """Verificador em cache por (alergias, medicamentos em uso), ambos tuplas ordenadas."""
+    return PrescriptionChecker(allergies, medications, get_dictionary())
+
+
+def get_checker(patient):
+    """Verificador para as alergias ativas e os medicamentos em uso do paciente (instância ou ID)."""
+    from patients.models import Allergy, Medication
+
+    severities = dict(Allergy.SEVERITY_CHOICES)
+    allergies = tuple(sorted(
+        (allergen, severities.get(severity, severity))
+        for allergen, severity in Allergy.objects.filter(patient=patient, is_active=True).values_list('allergen', 'severity')
+    ))
+    medications = tuple(sorted(
+        Medication.objects.filter(patient=patient, is_active=True).values_list('name', flat=True)
+    ))
+    return compile_checker(allergies, medications)
+
+
+def check_prescription(patient, text):
+    """Alertas de alergia e duplicidade para o texto da receita do paciente."""
+    if not text or not text.strip():
+        return []
+    return get_checker(patient).check(text)
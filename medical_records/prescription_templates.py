@@ -0,0 +1,116 @@
+"""
+Receitas favoritas dos médicos.
+
+As receitas favoritas de cada médico ficam em cache, ordenadas pelas mais
+usadas, e a busca é feita nessa lista em memória (sem acentos, no nome e nos
+medicamentos). Somente médicos com mais receitas do que o limite do cache
+buscam as demais no banco, no texto de busca já normalizado da receita. O
+cache do médico é invalidado quando uma receita favorita é criada, editada
+ou excluída; o uso apenas atualiza o contador na entrada em cache, sem
+renovar sua validade, e a ordem exata volta do banco quando ela expira.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cid10 import normalize
+from .models import PrescriptionTemplate
+
+CACHE_TIMEOUT = 60 * 60 * 24
+MAX_CACHED_TEMPLATES = 200
+FAVORITES_LIMIT = 10
+
+TEMPLATE_FIELDS = ('id', 'name', 'medications', 'instructions', 'usage_count')
+
+
+def cache_key(doctor_id):
+    return f'prescription_templates:{doctor_id}'
+
+
+def invalidate_templates(doctor_id):
+    """Descarta o cache do médico quando a transação atual for confirmada."""
+    transaction.on_commit(lambda: cache.delete(cache_key(doctor_id)))
+
+
+def _load_templates(doctor_id):
+    rows = list(
+        PrescriptionTemplate.objects.filter(doctor_id=doctor_id)
+        .order_by('-usage_count', 'name')
+        .values(*TEMPLATE_FIELDS)[:MAX_CACHED_TEMPLATES + 1]
+    )
+    return {
+        'templates': rows[:MAX_CACHED_TEMPLATES],
+        'complete': len(rows) <= MAX_CACHED_TEMPLATES,
+        'expires_at': time.time() + CACHE_TIMEOUT,
+    }
+
+
+def _cached(doctor_id):
+    entry = cache.get(cache_key(doctor_id))
+    if entry is None:
+        entry = _load_templates(doctor_id)
+        cache.set(cache_key(doctor_id), entry, CACHE_TIMEOUT)
+    return entry
+
+
+def favorite_templates(doctor_id, limit=FAVORITES_LIMIT):
+    """Receitas favoritas mais usadas do médico (dicionários com TEMPLATE_FIELDS)."""
+    return _cached(doctor_id)['templates'][:limit]
+
+
+def search_templates(doctor_id, term, limit=FAVORITES_LIMIT):
+    """Receitas do médico cujo nome ou medicamentos contêm todas as palavras do termo."""
+    words = normalize(term).split()
+    if not words:
+        return favorite_templates(doctor_id, limit)
+    entry = _cached(doctor_id)
+    results = []
+    for template in entry['templates']:
+        text = normalize(f"{template['name']} {template['medications']}")
+        if all(word in text for word in words):
+            results.append(template)
+            if len(results) == limit:
+                return results
+    if entry['complete']:
+        return results
+
+    # Médicos com muitas receitas: as menos usadas ficam fora do cache
+    queryset = PrescriptionTemplate.objects.filter(doctor_id=doctor_id).exclude(
+        pk__in=[template['id'] for template in entry['templates']]
+    )
+    for word in words:
+        queryset = queryset.filter(search_text__contains=word)
+    results += queryset.order_by('-usage_count', 'name').values(*TEMPLATE_FIELDS)[:limit - len(results)]
+    return results
+
+
+def _count_cached_use(doctor_id, template_id):
+    entry = cache.get(cache_key(doctor_id))
+    if entry is None:
+        return
+    for template in entry['templates']:
+        if template['id'] == template_id:
+            template['usage_count'] += 1
+            break
+    else:
+        # Receita fora do cache: entra na lista quando ela for recarregada
+        return
+    entry['templates'].sort(key=lambda template: (-template['usage_count'], template['name']))
+    remaining = entry['expires_at'] - time.time()
+    if remaining > 0:
+        cache.set(cache_key(doctor_id), entry, remaining)
+
+
+def record_template_use(template):
+    """
+    Incrementa o contador de uso da receita favorita no banco e, após a
+    transação, na entrada em cache do médico (sem recarregar a lista).
+    """
+    PrescriptionTemplate.objects.filter(pk=template.pk).update(
+        usage_count=F('usage_count') + 1, last_used_at=timezone.now()
+    )
+    transaction.on_commit(lambda: _count_cached_use(template.doctor_id, template.pk))
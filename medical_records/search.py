@@ -0,0 +1,257 @@
+"""
+Busca textual nos prontuários (queixa principal, sintomas, diagnóstico e plano de tratamento).
+
+Os quatro campos são cifrados no banco e o índice não guarda o texto: cada
+palavra (minúscula e sem acentos) é gravada como uma marca HMAC
+(``accounts.encryption.blind_token``), na ordem do texto, o que preserva a
+relevância por campo e a busca por frases. A consulta passa pela mesma
+transformação. Não há radicalização: plural e singular são termos diferentes.
+
+O que o índice ainda revela: quais prontuários têm uma mesma palavra, com que
+frequência e em que posição (a marca é determinística), mas não a palavra.
+Sem FIELD_ENCRYPTION_KEYS (desenvolvimento) as palavras ficam em texto puro.
+As marcas dependem da chave principal: ``rotate_encryption_keys`` reindexa
+os prontuários depois da troca de chave.
+
+A aplicação indexa o texto decifrado a cada gravação (sinal post_save e
+``update_if_current``); escritas por ``QuerySet.update``/``bulk_update``
+nesses campos devem chamar ``reindex_records``. Os trechos destacados são
+montados a partir dos prontuários decifrados da página retornada.
+
+PostgreSQL: coluna ``search_vector`` (tsvector, configuração ``simple``) com
+índice GIN, fora do ORM para que o modelo continue portável.
+SQLite (desenvolvimento): tabela virtual FTS5 ``medical_records_search``.
+"""
+
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.utils.html import escape
+
+from accounts.encryption import blind_token
+
+from .cid10 import normalize
+from .models import MedicalRecord
+from .prescription_checks import normalize_with_offsets
+from .utils import RECORD_LIST_DEFERRED, records_visible_to
+
+TABLE = 'medical_records_medicalrecord'
+FTS_TABLE = 'medical_records_search'
+SEARCH_FIELDS = ('chief_complaint', 'symptoms', 'diagnosis', 'treatment_plan')
+
+# Pesos por campo: queixa e diagnóstico valem mais que sintomas e plano
+PG_WEIGHTS = {'chief_complaint': 'A', 'diagnosis': 'A', 'symptoms': 'B', 'treatment_plan': 'C'}
+FTS_WEIGHTS = {'chief_complaint': 10.0, 'diagnosis': 10.0, 'symptoms': 5.0, 'treatment_plan': 2.0}
+
+# Marcadores do trecho destacado, trocados por <mark> depois do escape do HTML
+MARK_START, MARK_END = '\x02', '\x03'
+SNIPPET_WORDS = 16
+
+MAX_RESULTS = 50
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+PG_INSTALL = [
+    f'ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    f'CREATE INDEX IF NOT EXISTS medicalrecord_search_gin ON {TABLE} USING gin (search_vector)',
+]
+
+PG_UNINSTALL = [
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+]
+
+# Marcas dos campos na ordem de PG_WEIGHTS, seguidas do ID
+_PG_VECTOR = ' || '.join(f"setweight(to_tsvector('simple', %s), '{weight}')" for weight in PG_WEIGHTS.values())
+PG_INDEX = f'UPDATE {TABLE} SET search_vector = {_PG_VECTOR} WHERE id = %s'
+
+_FTS_COLUMNS = ', '.join(SEARCH_FIELDS)
+
+SQLITE_INSTALL = [
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({_FTS_COLUMNS})',
+]
+
+SQLITE_UNINSTALL = [
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+SQLITE_UNINDEX = f'DELETE FROM {FTS_TABLE} WHERE rowid = %s'
+SQLITE_INDEX = f'INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) VALUES (%s, {", ".join(["%s"] * len(SEARCH_FIELDS))})'
+
+
+def install_search_index(schema_editor):
+    """
+    Cria a estrutura de busca, se ainda não existir. Os prontuários são
+    indexados pela aplicação: depois de recriar a estrutura, use ``reindex_all``.
+    """
+    statements = {'postgresql': PG_INSTALL, 'sqlite': SQLITE_INSTALL}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def uninstall_search_index(schema_editor):
+    statements = {'postgresql': PG_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def search_words(text):
+    """Palavras do texto, minúsculas e sem acentos."""
+    return WORD_RE.findall(normalize(text))
+
+
+def index_text(text):
+    """Texto gravado no índice: as marcas das palavras, na ordem do texto."""
+    return ' '.join(blind_token(word) for word in search_words(text))
+
+
+def reindex_records(records, using=DEFAULT_DB_ALIAS):
+    """Indexa os prontuários a partir do texto decifrado dos campos de busca."""
+    db = connections[using]
+    if db.vendor not in ('postgresql', 'sqlite'):
+        return
+    rows = [(record.pk, {field: index_text(getattr(record, field)) for field in SEARCH_FIELDS}) for record in records]
+    if not rows:
+        return
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.executemany(PG_INDEX, [[*(text[field] for field in PG_WEIGHTS), pk] for pk, text in rows])
+        else:
+            cursor.executemany(SQLITE_UNINDEX, [[pk] for pk, _ in rows])
+            cursor.executemany(SQLITE_INDEX, [[pk, *(text[field] for field in SEARCH_FIELDS)] for pk, text in rows])
+
+
+def index_record(record, using=DEFAULT_DB_ALIAS):
+    reindex_records([record], using)
+
+
+def unindex_record(pk, using=DEFAULT_DB_ALIAS):
+    """Remove o prontuário excluído do índice (no PostgreSQL a coluna sai com a linha)."""
+    db = connections[using]
+    if db.vendor == 'sqlite':
+        with db.cursor() as cursor:
+            cursor.execute(SQLITE_UNINDEX, [pk])
+
+
+def reindex_all(using=DEFAULT_DB_ALIAS, batch_size=1000):
+    """Reindexa todos os prontuários em lotes por ordem de ID (sem OFFSET). Retorna o total indexado."""
+    queryset = MedicalRecord._base_manager.using(using).only('pk', *SEARCH_FIELDS).order_by('pk')
+    total = last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return total
+        reindex_records(batch, using)
+        total += len(batch)
+        last_pk = batch[-1].pk
+
+
+def parse_query(text):
+    """
+    Converte o texto digitado em grupos de marcas: frases entre aspas e cada
+    palavra solta formam um grupo; todos os grupos são obrigatórios.
+    """
+    groups = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', text):
+        tokens = [blind_token(term) for term in search_words(phrase or word)]
+        if tokens:
+            groups.append(tokens)
+    return groups
+
+
+def highlight(snippet):
+    """Escapa o trecho e troca os marcadores por <mark>."""
+    return escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def make_snippet(record, words):
+    """
+    Trecho do primeiro campo de busca que contém alguma das palavras, com até
+    SNIPPET_WORDS palavras em volta da primeira ocorrência e as ocorrências marcadas.
+    """
+    pattern = re.compile(r'(?<![^\W_])(?:%s)(?![^\W_])' % '|'.join(map(re.escape, words)))
+    for field in SEARCH_FIELDS:
+        text = getattr(record, field) or ''
+        normalized, offsets = normalize_with_offsets(text)
+        hits = [(offsets[match.start()], offsets[match.end() - 1] + 1) for match in pattern.finditer(normalized)]
+        if not hits:
+            continue
+        spans = [match.span() for match in re.finditer(r'\S+', text)]
+        first = next(index for index, (_, end) in enumerate(spans) if end > hits[0][0])
+        low = max(0, first - SNIPPET_WORDS // 2)
+        high = min(len(spans), low + SNIPPET_WORDS)
+        start, end = spans[low][0], spans[high - 1][1]
+        parts, position = [], start
+        for hit_start, hit_end in hits:
+            if start <= hit_start and hit_end <= end:
+                parts += [text[position:hit_start], MARK_START, text[hit_start:hit_end], MARK_END]
+                position = hit_end
+        parts.append(text[position:end])
+        return ('…' if low else '') + ''.join(parts) + ('…' if high < len(spans) else '')
+    return ''
+
+
+def _search_postgresql(groups, scope_sql, scope_params, limit):
+    tsquery = ' & '.join(f"({' <-> '.join(tokens)})" for tokens in groups)
+    sql = f"""
+        SELECT r.id, ts_rank_cd(r.search_vector, q.query) AS rank
+        FROM {TABLE} r, to_tsquery('simple', %s) AS q(query)
+        WHERE r.search_vector @@ q.query AND r.id IN ({scope_sql})
+        ORDER BY rank DESC, r.id DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tsquery, *scope_params, limit])
+        return cursor.fetchall()
+
+
+def _search_sqlite(groups, scope_sql, scope_params, limit):
+    match = ' '.join(f'"{" ".join(tokens)}"' for tokens in groups)
+    weights = ', '.join(str(FTS_WEIGHTS[field]) for field in SEARCH_FIELDS)
+    # O FTS5 é consultado primeiro (CTE materializada) e o escopo é aplicado
+    # sobre os ids encontrados: "rowid IN (subconsulta)" direto na tabela
+    # virtual é avaliado linha a linha. bm25 é menor para os mais relevantes,
+    # por isso o sinal é invertido ("maior = melhor").
+    ranked_sql = f"""
+        WITH hits AS MATERIALIZED (
+            SELECT rowid AS id, -bm25({FTS_TABLE}, {weights}) AS rank
+            FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+        )
+        SELECT id, rank FROM hits
+        WHERE id IN ({scope_sql})
+        ORDER BY rank DESC, id DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(ranked_sql, [match, *scope_params, limit])
+        return cursor.fetchall()
+
+
+def search_records(user, query, limit=MAX_RESULTS):
+    """
+    Busca nos prontuários visíveis ao usuário.
+    Retorna uma lista de (prontuário, relevância, trecho destacado em HTML).
+    """
+    groups = parse_query((query or '').strip())
+    if not groups:
+        return []
+
+    scope_sql, scope_params = records_visible_to(user).order_by().values('pk').query.sql_with_params()
+    if connection.vendor == 'postgresql':
+        ranked = _search_postgresql(groups, scope_sql, scope_params, limit)
+    elif connection.vendor == 'sqlite':
+        ranked = _search_sqlite(groups, scope_sql, scope_params, limit)
+    else:
+        return []
+
+    records = (
+        MedicalRecord.objects
+        .select_related('patient__user', 'doctor__user')
+        .defer(*RECORD_LIST_DEFERRED)
+        .in_bulk([pk for pk, _ in ranked])
+    )
+    # Trechos destacados só para a página retornada, a partir do texto decifrado
+    words = search_words(query)
+    return [
+        (records[pk], rank, highlight(make_snippet(records[pk], words)))
+        for pk, rank in ranked if pk in records
+    ]
@@ -0,0 +1,44 @@
+"""
+Sinais do app medical_records.
+"""
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import MedicalRecord, MedicalRecordComment, PrescriptionTemplate
+from .prescription_templates import invalidate_templates
+from .search import SEARCH_FIELDS, index_record, unindex_record
+
+
+@receiver(post_save, sender=PrescriptionTemplate, dispatch_uid='invalidate_templates_on_save')
+@receiver(post_delete, sender=PrescriptionTemplate, dispatch_uid='invalidate_templates_on_delete')
+def invalidate_prescription_templates(sender, instance, **kwargs):
+    """Descarta o cache de receitas favoritas do médico ao criar, editar ou excluir uma delas."""
+    invalidate_templates(instance.doctor_id)
+
+
+@receiver(post_save, sender=MedicalRecordComment, dispatch_uid='count_added_comment')
+def count_added_comment(sender, instance, created, raw=False, **kwargs):
+    """Incrementa o contador de comentários do prontuário (UPDATE atômico, na transação da gravação)."""
+    if created and not raw:
+        MedicalRecord.objects.filter(pk=instance.medical_record_id).update(comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=MedicalRecordComment, dispatch_uid='count_deleted_comment')
+def count_deleted_comment(sender, instance, **kwargs):
+    MedicalRecord.objects.filter(pk=instance.medical_record_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1
+    )
+
+
+@receiver(post_save, sender=MedicalRecord, dispatch_uid='index_saved_record')
+def index_saved_record(sender, instance, update_fields=None, using=None, **kwargs):
+    """Reindexa o prontuário para a busca textual a partir do texto decifrado (os campos são cifrados no banco)."""
+    if update_fields is None or any(field in SEARCH_FIELDS for field in update_fields):
+        index_record(instance, using)
+
+
+@receiver(post_delete, sender=MedicalRecord, dispatch_uid='unindex_deleted_record')
+def unindex_deleted_record(sender, instance, using=None, **kwargs):
+    unindex_record(instance.pk, using)
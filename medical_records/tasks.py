@@ -0,0 +1,51 @@
+"""
+Tarefas em segundo plano do app medical_records (executadas pelo comando run_jobs).
+"""
+
+from django.db import transaction
+
+from accounts.jobs import on_final_failure
+
+from .models import ExamUpload, Prescription
+from .uploads import finish_upload
+from .utils import store_prescription_pdf
+
+
+def mark_prescription_pdf_failed(error, prescription_id):
+    Prescription.objects.filter(pk=prescription_id).update(pdf_status='failed')
+
+
+@on_final_failure(mark_prescription_pdf_failed)
+def render_prescription_pdf(prescription_id):
+    """
+    Gera o PDF da receita e grava o caminho do arquivo sem reescrever a receita inteira.
+    Enquanto houver novas tentativas a receita continua pendente.
+    """
+    prescription = Prescription.objects.select_related(
+        'doctor__user', 'patient__user'
+    ).get(pk=prescription_id)
+
+    # A referência do novo PDF e a gravação do nome são confirmadas juntas; o
+    # arquivo anterior só é liberado depois (ver store_prescription_pdf)
+    with transaction.atomic():
+        name = store_prescription_pdf(prescription)
+        Prescription.objects.filter(pk=prescription_id).update(
+            prescription_file=name,
+            pdf_status='ready',
+        )
+
+
+def mark_exam_upload_failed(error, upload_id):
+    ExamUpload.objects.filter(pk=upload_id).update(status='failed', error=f'{type(error).__name__}: {error}')
+
+
+@on_final_failure(mark_exam_upload_failed)
+def process_exam_upload(upload_id):
+    """
+    Conclui o envio em partes: hash, gravação no armazenamento e pré-visualizações.
+    O envio continua em processamento até a última tentativa.
+    """
+    upload = ExamUpload.objects.get(pk=upload_id)
+    if upload.status != 'processing':
+        return
+    finish_upload(upload)
@@ -1,3 +1,1159 @@
-from django.test import TestCase
+"""
+Testes para o app medical_records.
+"""
 
-# Create your tests here.
+import base64
+import hashlib
+import json
+import os
+from datetime import date, time
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.http import Http404
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.test import RequestFactory
+
+from accounts.jobs import enqueue, run_pending_jobs
+from accounts.models import AccessLog, BackgroundJob, DoctorProfile, StoredBlob
+from accounts.storage import clinical_file_storage
+from appointments.models import Appointment
+from medical_records.analytes import analyte_trend, downsample, ingest_values
+from medical_records.cid10 import Cid10Index, catalog_signature, format_code, reset_index
+from medical_records.models import (
+    Cid10Code, Exam, ExamResultPreview, ExamUpload, MedicalRecord, MedicalRecordComment, MedicalRecordHistory, Prescription,
+    PrescriptionTemplate
+)
+from medical_records.forms import PrescriptionForm
+from medical_records.pdf_engine import PrescriptionPdfEngine
+from medical_records.prescription_checks import AhoCorasick, check_prescription, compile_checker
+from medical_records.prescription_templates import favorite_templates, record_template_use, search_templates
+from medical_records.search import search_records
+from medical_records.tasks import render_prescription_pdf
+from medical_records.uploads import start_upload
+from medical_records.utils import top_diagnoses
+from medical_records.versioning import SNAPSHOT_INTERVAL, reconstruct_version, record_version, version_diffs
+from medical_records.views import (
+    Cid10AutocompleteView, ExamPreviewFileView, ExamResultValuesView, ExamUploadCreateView, ExamUploadView, MedicalRecordCommentsView,
+    MedicalRecordDetailView,
+    MedicalRecordListView,
+    MedicalRecordUpdateView,
+    PrescriptionCheckView, PrescriptionFileView, PrescriptionStatusView, PrescriptionTemplateSearchView
+)
+from patients.models import Allergy, Medication, Patient
+
+User = get_user_model()
+
+
+@pytest.fixture
+def prescription(db):
+    doctor_user = User.objects.create_user(
+        username='doc', password='x', cpf='100.000.000-00',
+        first_name='Ana', last_name='Souza', user_type='doctor'
+    )
+    doctor = DoctorProfile.objects.create(user=doctor_user, crm='12345/SP', specialty='Clínica')
+    patient_user = User.objects.create_user(
+        username='pac', password='x', cpf='200.000.000-00',
+        first_name='João', last_name='Silva', user_type='patient'
+    )
+    patient = Patient.objects.create(user=patient_user)
+    appointment = Appointment.objects.create(
+        patient=patient, doctor=doctor,
+        scheduled_date=date(2026, 1, 1), scheduled_time=time(8, 0),
+    )
+    record = MedicalRecord.objects.create(
+        appointment=appointment, patient=patient, doctor=doctor,
+        chief_complaint='Dor de cabeça', diagnosis='Cefaleia',
+    )
+    return Prescription.objects.create(
+        medical_record=record, patient=patient, doctor=doctor,
+        medications='Dipirona 500mg', instructions='1 comprimido a cada 6 horas',
+    )
+
+
+@pytest.mark.django_db
+class TestPrescriptionPdfJob:
+    """Testes para a geração do PDF da receita em segundo plano."""
+
+    def test_worker_renders_pdf(self, prescription, settings, tmp_path):
+        """Testa que a tarefa enfileirada gera o arquivo e marca a receita como disponível."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        assert prescription.pdf_status == 'pending'
+
+        job = enqueue('medical_records.tasks.render_prescription_pdf', prescription_id=prescription.pk)
+        assert run_pending_jobs() == 1
+
+        job.refresh_from_db()
+        prescription.refresh_from_db()
+        assert job.status == 'done'
+        assert prescription.pdf_status == 'ready'
+        assert os.path.exists(os.path.join(str(tmp_path), prescription.prescription_file.name))
+
+    def test_rendering_keeps_one_reference(self, prescription, settings, tmp_path, monkeypatch,
+                                           django_capture_on_commit_callbacks):
+        """Testa que PDF idêntico e gravação que falha não deixam referências sobrando no blob."""
+        settings.MEDIA_ROOT = str(tmp_path)
+
+        def identical_render(prescription, media_root=None):
+            temp_path = tmp_path / 'render.pdf'
+            temp_path.write_bytes(b'%PDF-1.4 receita')
+            return str(temp_path)
+
+        monkeypatch.setattr('medical_records.utils.render_prescription_to_temp', identical_render)
+        for _ in range(2):
+            with django_capture_on_commit_callbacks(execute=True):
+                render_prescription_pdf(prescription.pk)
+        assert StoredBlob.objects.get().ref_count == 1
+
+        def broken_update(*args, **kwargs):
+            raise OSError('conexão perdida')
+
+        monkeypatch.setattr(Prescription.objects, 'filter', broken_update)
+        with django_capture_on_commit_callbacks(execute=True), pytest.raises(OSError):
+            render_prescription_pdf(prescription.pk)
+        assert StoredBlob.objects.get().ref_count == 1
+
+    def test_status_view(self, prescription):
+        """Testa o endpoint de situação do PDF e a restrição de acesso."""
+        request = RequestFactory().get(f'/medical-records/prescription/{prescription.pk}/status/')
+        request.user = prescription.patient.user
+        response = PrescriptionStatusView.as_view()(request, pk=prescription.pk)
+        assert response.status_code == 200
+        assert json.loads(response.content) == {
+            'id': prescription.pk, 'status': 'pending', 'file_url': None,
+        }
+
+        request.user = User.objects.create_user(
+            username='outro', password='x', cpf='300.000.000-00', user_type='patient'
+        )
+        with pytest.raises(Http404):
+            PrescriptionStatusView.as_view()(request, pk=prescription.pk)
+
+
+@pytest.mark.django_db
+class TestBackgroundJobs:
+    """Testes para a fila de tarefas."""
+
+    def test_failed_job_is_retried_then_marked_failed(self, prescription, monkeypatch):
+        """Testa as novas tentativas e a marcação de falha na receita só na última."""
+        def broken_render(prescription):
+            raise OSError('disco cheio')
+
+        monkeypatch.setattr('medical_records.tasks.store_prescription_pdf', broken_render)
+        job = enqueue('medical_records.tasks.render_prescription_pdf', prescription_id=prescription.pk)
+        job.max_attempts = 2
+        job.save()
+
+        run_pending_jobs()
+        job.refresh_from_db()
+        prescription.refresh_from_db()
+        assert job.status == 'pending' and job.attempts == 1
+        assert prescription.pdf_status == 'pending'
+        assert run_pending_jobs() == 0  # aguardando o intervalo de nova tentativa
+
+        BackgroundJob.objects.filter(pk=job.pk).update(run_after=job.created_at)
+        run_pending_jobs()
+        job.refresh_from_db()
+        prescription.refresh_from_db()
+        assert job.status == 'failed' and 'disco cheio' in job.error
+        assert prescription.pdf_status == 'failed'
+
+
+@pytest.mark.django_db
+class TestPrescriptionPdfEngine:
+    """Testes para o motor de renderização de receitas."""
+
+    def test_doctor_header_cached_until_profile_changes(self, prescription, tmp_path):
+        """Testa o reaproveitamento e a invalidação do cabeçalho do médico."""
+        engine = PrescriptionPdfEngine()
+        header, _ = engine.doctor_blocks(prescription.doctor)
+        assert engine.doctor_blocks(prescription.doctor)[0] is header
+
+        doctor = DoctorProfile.objects.get(pk=prescription.doctor.pk)
+        doctor.specialty = 'Cardiologia'
+        doctor.save()
+        new_header, _ = engine.doctor_blocks(doctor)
+        assert new_header is not header
+        assert 'Cardiologia' in new_header[2].text
+
+        path = engine.render(prescription, str(tmp_path / 'receita.pdf'))
+        with open(path, 'rb') as pdf:
+            assert pdf.read(4) == b'%PDF'
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+class TestPrescriptionPdfBenchmark:
+    """Comparação de ms/PDF: motor recriado a cada receita (como antes) e motor aquecido."""
+
+    @pytest.mark.benchmark(group='prescription_pdf')
+    def test_cold_engine(self, benchmark, prescription, tmp_path):
+        path = str(tmp_path / 'receita.pdf')
+        benchmark.pedantic(lambda: PrescriptionPdfEngine().render(prescription, path), rounds=20)
+
+    @pytest.mark.benchmark(group='prescription_pdf')
+    def test_warm_engine(self, benchmark, prescription, tmp_path):
+        path = str(tmp_path / 'receita.pdf')
+        engine = PrescriptionPdfEngine()
+        engine.render(prescription, path)
+        benchmark.pedantic(lambda: engine.render(prescription, path), rounds=20)
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+class TestEncryptedFieldBenchmark:
+    """Custo por linha da decifragem na página do prontuário: campos em texto puro e cifrados."""
+
+    def _load(self, record):
+        request = RequestFactory().get(f'/medical-records/record/{record.pk}/')
+        request.user = record.doctor.user
+        view = MedicalRecordDetailView()
+        view.setup(request, pk=record.pk)
+        loaded = view.get_object()
+        return loaded.physical_examination, loaded.observations, loaded.patient.medical_notes
+
+    def _fill(self, record):
+        record.physical_examination = 'Bom estado geral, corado, hidratado. ' * 20
+        record.observations = 'Retorno em 30 dias com exames. ' * 20
+        record.save()
+        record.patient.medical_notes = 'Hipertenso, diabético tipo 2. ' * 20
+        record.patient.save()
+
+    @pytest.mark.benchmark(group='record_detail_encryption')
+    def test_plaintext(self, benchmark, prescription, settings):
+        settings.FIELD_ENCRYPTION_KEYS = []
+        self._fill(prescription.medical_record)
+        benchmark.pedantic(lambda: self._load(prescription.medical_record), rounds=200)
+
+    @pytest.mark.benchmark(group='record_detail_encryption')
+    def test_encrypted(self, benchmark, prescription, settings):
+        pytest.importorskip('cryptography')
+        settings.FIELD_ENCRYPTION_KEYS = ['k1:' + base64.b64encode(b'1' * 32).decode()]
+        self._fill(prescription.medical_record)
+        benchmark.pedantic(lambda: self._load(prescription.medical_record), rounds=200)
+
+
+@pytest.mark.django_db
+class TestRerenderPrescriptionsCommand:
+    """Testes para o comando de regeneração em lote dos PDFs."""
+
+    def test_rerender_missing_and_resume(self, prescription, settings, tmp_path):
+        """Testa a regeneração de arquivos ausentes, o checkpoint e a retomada."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        second = Prescription.objects.create(
+            medical_record=prescription.medical_record, patient=prescription.patient,
+            doctor=prescription.doctor, medications='Amoxicilina 500mg',
+        )
+        checkpoint = tmp_path / 'blobs' / 'tmp' / '.rerender_checkpoint.json'
+        checkpoint.parent.mkdir(parents=True)
+        checkpoint.write_text(json.dumps({
+            'run': {'missing_only': True}, 'last_pk': prescription.pk,
+        }))
+
+        call_command('rerender_prescriptions', '--missing-only', '--resume', '--workers', '0', stdout=StringIO())
+
+        prescription.refresh_from_db()
+        second.refresh_from_db()
+        assert not prescription.prescription_file
+        assert second.pdf_status == 'ready'
+        assert os.path.exists(tmp_path / second.prescription_file.name)
+        assert not checkpoint.exists()
+
+        out = StringIO()
+        call_command('rerender_prescriptions', '--missing-only', '--workers', '2', stdout=out)
+        prescription.refresh_from_db()
+        assert prescription.pdf_status == 'ready'
+        assert '1 PDFs regenerados' in out.getvalue()
+        assert '1 receitas ignoradas' in out.getvalue()
+
+    def test_rerender_releases_previous_reference(self, prescription, settings, tmp_path, monkeypatch,
+                                                  django_capture_on_commit_callbacks):
+        """Testa que regenerar o mesmo PDF várias vezes mantém uma única referência ao blob."""
+        settings.MEDIA_ROOT = str(tmp_path)
+
+        def identical_render(item):
+            temp_path = tmp_path / f'render-{item[0].pk}.pdf'
+            temp_path.write_bytes(b'%PDF-1.4 receita')
+            return item[0].pk, str(temp_path), None
+
+        monkeypatch.setattr(
+            'medical_records.management.commands.rerender_prescriptions.render_prescription_item', identical_render
+        )
+        for _ in range(3):
+            with django_capture_on_commit_callbacks(execute=True):
+                call_command('rerender_prescriptions', '--workers', '0', stdout=StringIO())
+        prescription.refresh_from_db()
+        assert prescription.pdf_status == 'ready'
+        assert StoredBlob.objects.get().ref_count == 1
+
+
+@pytest.mark.django_db
+class TestProtectedFileView:
+    """Testes para o download protegido de arquivos clínicos."""
+
+    def _get(self, user, pk, **headers):
+        request = RequestFactory().get(f'/medical-records/prescription/{pk}/file/', **headers)
+        request.user = user
+        return PrescriptionFileView.as_view()(request, pk=pk)
+
+    def test_download_checks_access_and_logs(self, prescription, settings, tmp_path):
+        """Testa o envio pelo Django, a ETag, o 304 e o registro no AccessLog."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        settings.PROTECTED_MEDIA_ACCEL_PREFIX = ''
+        render_prescription_pdf(prescription.pk)
+        prescription.refresh_from_db()
+        patient_user = prescription.patient.user
+
+        response = self._get(patient_user, prescription.pk)
+        assert response.status_code == 200
+        assert b''.join(response.streaming_content).startswith(b'%PDF')
+        assert response['ETag'] == prescription.prescription_file.storage.etag(prescription.prescription_file.name)
+        assert AccessLog.objects.filter(user=patient_user, action='download_file').count() == 1
+
+        response = self._get(patient_user, prescription.pk, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == 304
+
+        other = User.objects.create_user(username='outro', password='x', cpf='300.000.000-00', user_type='patient')
+        with pytest.raises(Http404):
+            self._get(other, prescription.pk)
+
+        other_doctor = User.objects.create_user(username='doc2', password='x', cpf='310.000.000-00', user_type='doctor')
+        DoctorProfile.objects.create(user=other_doctor, crm='88888/SP', specialty='Pediatria')
+        with pytest.raises(Http404):
+            self._get(other_doctor, prescription.pk)
+
+    def test_preview_download_follows_exam_access(self, prescription, settings, tmp_path):
+        """Testa que a pré-visualização usa o paciente e o médico do exame."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        settings.PROTECTED_MEDIA_ACCEL_PREFIX = ''
+        exam = Exam.objects.create(
+            medical_record=prescription.medical_record, patient=prescription.patient,
+            doctor=prescription.doctor, exam_type='imaging', exam_name='Raio-X de tórax',
+        )
+        preview = ExamResultPreview.objects.create(
+            exam=exam, page=1, width=10, height=10, image=ContentFile(b'\xff\xd8jpeg', name='pagina.jpg')
+        )
+
+        def get(user):
+            request = RequestFactory().get(f'/medical-records/exam-preview/{preview.pk}/')
+            request.user = user
+            return ExamPreviewFileView.as_view()(request, pk=preview.pk)
+
+        response = get(prescription.doctor.user)
+        assert response.status_code == 200
+        assert b''.join(response.streaming_content) == b'\xff\xd8jpeg'
+        assert get(prescription.patient.user).status_code == 200
+
+        other_doctor = User.objects.create_user(username='doc2', password='x', cpf='310.000.000-00', user_type='doctor')
+        DoctorProfile.objects.create(user=other_doctor, crm='88888/SP', specialty='Pediatria')
+        with pytest.raises(Http404):
+            get(other_doctor)
+
+    def test_download_hands_off_to_nginx(self, prescription, settings, tmp_path):
+        """Testa a resposta com X-Accel-Redirect, sem conteúdo."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        settings.PROTECTED_MEDIA_ACCEL_PREFIX = '/protected-media/'
+        render_prescription_pdf(prescription.pk)
+        prescription.refresh_from_db()
+
+        response = self._get(prescription.doctor.user, prescription.pk)
+        assert response['X-Accel-Redirect'] == f'/protected-media/{prescription.prescription_file.name}'
+        assert response['Content-Type'] == 'application/pdf'
+        assert response.content == b''
+
+
+@pytest.mark.django_db
+class TestMedicalRecordSearch:
+    """Testes para a busca textual nos prontuários."""
+
+    def test_ranked_highlighted_and_scoped(self, prescription):
+        """Testa relevância, destaque, escopo do médico e atualização pelo índice."""
+        record = prescription.medical_record
+        doctor = record.doctor
+        record.chief_complaint = 'Dor torácica há 2 dias <urgente>'
+        record.save()
+
+        other_user = User.objects.create_user(username='doc2', password='x', cpf='400.000.000-00', user_type='doctor')
+        other_doctor = DoctorProfile.objects.create(user=other_user, crm='99999/SP', specialty='Cardiologia')
+        other_patient = Patient.objects.create(user=User.objects.create_user(
+            username='pac2', password='x', cpf='500.000.000-00', user_type='patient'
+        ))
+        appointment = Appointment.objects.create(
+            patient=other_patient, doctor=other_doctor,
+            scheduled_date=date(2026, 1, 2), scheduled_time=time(9, 0),
+        )
+        hidden = MedicalRecord.objects.create(
+            appointment=appointment, patient=other_patient, doctor=other_doctor,
+            chief_complaint='Cansaço', symptoms='Dor torácica aos esforços', diagnosis='Angina',
+        )
+
+        results = search_records(doctor.user, 'toracica')
+        assert [result[0] for result in results] == [record]
+        assert '<mark>torácica</mark>' in results[0][2]
+        assert '&lt;urgente&gt;' in results[0][2]
+
+        admin = User.objects.create_user(username='adm', password='x', cpf='600.000.000-00', user_type='admin')
+        ranked = [result[0] for result in search_records(admin, '"dor torácica"')]
+        assert ranked == [record, hidden]  # a queixa principal pesa mais que os sintomas
+
+        hidden.symptoms = 'Sem queixas'
+        hidden.save()
+        assert [result[0] for result in search_records(admin, 'toracica')] == [record]
+
+    def test_encrypted_records_are_indexed_from_plaintext(self, prescription, settings):
+        """Testa a indexação no save, no update_if_current e na exclusão, com os campos cifrados."""
+        pytest.importorskip('cryptography')
+        settings.FIELD_ENCRYPTION_KEYS = ['k1:' + base64.b64encode(b'1' * 32).decode()]
+        record = prescription.medical_record
+        user = record.doctor.user
+        record.diagnosis = 'Pneumonia lobar'
+        record.save()
+        assert MedicalRecord.objects.filter(pk=record.pk, diagnosis__contains='Pneumonia').count() == 0
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT diagnosis FROM medical_records_search WHERE rowid = %s', [record.pk])
+                indexed = cursor.fetchone()[0]
+            assert 'pneumonia' not in indexed.lower() and len(indexed.split()) == 2
+
+        results = search_records(user, 'pneumonia')
+        assert [result[0] for result in results] == [record]
+        assert '<mark>Pneumonia</mark>' in results[0][2]
+
+        record.diagnosis = 'Sinusite'
+        assert record.update_if_current(record.version, ['diagnosis'])
+        assert search_records(user, 'pneumonia') == []
+        assert [result[0] for result in search_records(user, 'sinusite')] == [record]
+
+        record.delete()
+        assert search_records(user, 'sinusite') == []
+
+
+@pytest.mark.django_db
+class TestCid10:
+    """Testes para o catálogo CID-10, o autocomplete e o agrupamento por código."""
+
+    def test_prefix_index(self):
+        """Testa a busca por prefixo de código e de palavras sem acento."""
+        index = Cid10Index([
+            (1, 'I10', 'Hipertensão essencial (primária)'),
+            (2, 'I11.9', 'Doença cardíaca hipertensiva sem insuficiência cardíaca'),
+            (3, 'R51', 'Cefaléia'),
+        ])
+        assert [row[0] for row in index.search('hipert')] == [1, 2]
+        assert [row[0] for row in index.search('HIPERTENSAO ess')] == [1]
+        assert [row[0] for row in index.search('i119')] == [2]
+        assert [row[0] for row in index.search('cefaleia')] == [3]
+        assert index.search('xyz') == []
+        assert format_code('A000') == 'A00.0'
+
+    def test_load_and_autocomplete(self, prescription):
+        """Testa a carga do catálogo do projeto e o endpoint de autocomplete."""
+        reset_index()
+        call_command('load_cid10', stdout=StringIO())
+        call_command('load_cid10', stdout=StringIO())  # recarga não duplica
+        assert Cid10Code.objects.filter(code='I10').count() == 1
+
+        request = RequestFactory().get('/medical-records/cid10/autocomplete/', {'q': 'hipertensao'})
+        request.user = prescription.doctor.user
+        results = json.loads(Cid10AutocompleteView.as_view()(request).content)['results']
+        assert results[0]['text'] == 'I10 - Hipertensão essencial (primária)'
+
+    def test_description_changes_rebuild_other_indexes(self, db, tmp_path):
+        """Testa que descrições alteradas sem novos códigos mudam a assinatura do catálogo."""
+        call_command('load_cid10', stdout=StringIO())
+        signature = catalog_signature()
+        catalog = tmp_path / 'cid10.csv'
+        catalog.write_text('SUBCAT;DESCRICAO\nI10;Hipertensão arterial sistêmica\n', encoding='utf-8')
+        call_command('load_cid10', str(catalog), stdout=StringIO())
+        assert catalog_signature() != signature
+        assert catalog_signature()[:2] == signature[:2]
+
+    def test_top_diagnoses_grouped_by_code(self, prescription):
+        """Testa que textos diferentes com o mesmo código são contados juntos."""
+        record = prescription.medical_record
+        hypertension = Cid10Code.objects.create(code='I10', description='Hipertensão essencial (primária)')
+        headache = Cid10Code.objects.create(code='R51', description='Cefaléia')
+        record.diagnosis_codes.add(hypertension, headache)
+
+        appointment = Appointment.objects.create(
+            patient=record.patient, doctor=record.doctor,
+            scheduled_date=date(2026, 1, 3), scheduled_time=time(10, 0),
+        )
+        other = MedicalRecord.objects.create(
+            appointment=appointment, patient=record.patient, doctor=record.doctor,
+            chief_complaint='Retorno', diagnosis='hipertensao arterial',
+        )
+        other.diagnosis_codes.add(hypertension)
+
+        result = top_diagnoses(MedicalRecord.objects.filter(doctor=record.doctor))
+        assert result == [
+            {'code': 'I10', 'description': 'Hipertensão essencial (primária)', 'count': 2},
+            {'code': 'R51', 'description': 'Cefaléia', 'count': 1},
+        ]
+
+
+@pytest.mark.django_db
+class TestMedicalRecordVersioning:
+    """Testes para o versionamento por diferenças do prontuário."""
+
+    def test_diffs_snapshots_and_reconstruction(self, prescription, django_assert_max_num_queries):
+        """Testa que só os campos alterados são gravados e que qualquer versão é reconstruída."""
+        record = prescription.medical_record
+        user = record.doctor.user
+        record_version(record, user, 'created')
+        for index in range(1, SNAPSHOT_INTERVAL + 3):
+            record.diagnosis = f'Cefaleia tensional {index}'
+            record.save()
+            record_version(record, user, 'updated')
+
+        history = MedicalRecordHistory.objects.filter(medical_record=record)
+        assert history.get(version=2).changes == {'diagnosis': 'Cefaleia tensional 1'}
+        assert history.get(version=2).snapshot is None
+        assert history.filter(snapshot__isnull=False).count() == 2  # versões 1 e 11
+
+        assert reconstruct_version(record, 1)['diagnosis'] == 'Cefaleia'
+        assert reconstruct_version(record, 5)['diagnosis'] == 'Cefaleia tensional 4'
+        with django_assert_max_num_queries(2):
+            state = reconstruct_version(record, 13)
+        assert state['diagnosis'] == 'Cefaleia tensional 12'
+        assert state['chief_complaint'] == 'Dor de cabeça'
+        assert reconstruct_version(record, 99) is None
+
+        history_entry, fields = version_diffs(record)[2]
+        assert history_entry.version == 3
+        assert fields == [('Diagnóstico', 'Cefaleia tensional 1', 'Cefaleia tensional 2')]
+
+    def test_encrypted_fields_stay_encrypted_in_history(self, prescription, settings):
+        pytest.importorskip('cryptography')
+        settings.FIELD_ENCRYPTION_KEYS = ['k1:' + base64.b64encode(b'1' * 32).decode()]
+        record = prescription.medical_record
+        user = record.doctor.user
+        record_version(record, user, 'created')
+        record.observations = 'Paciente relata uso de drogas'
+        record.save()
+        record_version(record, user, 'updated')
+
+        changes = MedicalRecordHistory.objects.get(medical_record=record, version=2).changes
+        assert changes['observations'].startswith('enc1:k1:')
+        assert reconstruct_version(record, 2)['observations'] == 'Paciente relata uso de drogas'
+        assert version_diffs(record)[1][1] == [('Observações', '', 'Paciente relata uso de drogas')]
+
+
+@pytest.mark.django_db
+class TestOptimisticConcurrency:
+    """Testes para a detecção de edições simultâneas do prontuário."""
+
+    def _post(self, record, version, diagnosis):
+        request = RequestFactory().post(f'/medical-records/appointment/{record.appointment.pk}/record/update/', {
+            'appointment': record.appointment.pk, 'patient': record.patient.pk, 'doctor': record.doctor.pk,
+            'chief_complaint': record.chief_complaint, 'diagnosis': diagnosis, 'version': version,
+        })
+        request.user = record.doctor.user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        return MedicalRecordUpdateView.as_view()(request, appointment_pk=record.appointment.pk)
+
+    def test_stale_version_is_rejected(self, prescription, monkeypatch):
+        """Testa que a segunda gravação sobre a mesma versão recebe a tela de conflito."""
+        monkeypatch.setattr(MedicalRecordUpdateView, 'get_success_url', lambda self: '/ok/')
+        record = prescription.medical_record
+        assert record.version == 1
+
+        assert self._post(record, 1, 'Enxaqueca').status_code == 302
+        record.refresh_from_db()
+        assert (record.diagnosis, record.version) == ('Enxaqueca', 2)
+
+        response = self._post(record, 1, 'Cefaleia tensional')
+        assert response.status_code == 409
+        assert response.context_data['conflicts'] == [('Diagnóstico', 'Enxaqueca', 'Cefaleia tensional')]
+        assert response.context_data['form']['version'].value() == 2
+        record.refresh_from_db()
+        assert record.diagnosis == 'Enxaqueca'
+
+    def test_save_bumps_version(self, prescription):
+        """Testa que gravações pelo ORM também invalidam formulários abertos."""
+        record = prescription.medical_record
+        record.close_record()
+        assert record.version == 2
+        assert not record.update_if_current(1, ['diagnosis'])
+
+
+@pytest.mark.django_db
+class TestExamUpload:
+    """Testes para o envio em partes do resultado de exames."""
+
+    def _put(self, upload, user, start, data, checksum=None):
+        request = RequestFactory().generic(
+            'PUT', f'/medical-records/upload/{upload.pk}/', data,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(data) - 1}/{upload.total_size}',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(data).hexdigest(),
+        )
+        request.user = user
+        return ExamUploadView.as_view()(request, upload_id=upload.pk)
+
+    def test_resumable_upload_and_previews(self, prescription, settings, tmp_path, django_capture_on_commit_callbacks):
+        """Testa partes fora de ordem ou corrompidas, a retomada e o processamento final."""
+        from PIL import Image
+
+        settings.MEDIA_ROOT = str(tmp_path)
+        settings.EXAM_UPLOAD_CHUNK_SIZE = 8192
+        settings.EXAM_PREVIEW_WORKERS = 0
+        image_path = tmp_path / 'raio-x.png'
+        Image.effect_noise((400, 300), 64).save(image_path)
+        content = image_path.read_bytes()
+        exam = Exam.objects.create(
+            medical_record=prescription.medical_record, patient=prescription.patient,
+            doctor=prescription.doctor, exam_type='imaging', exam_name='Raio-X de tórax',
+        )
+        doctor_user = prescription.doctor.user
+
+        request = RequestFactory().post(
+            f'/medical-records/exam/{exam.pk}/upload/',
+            json.dumps({'filename': 'raio-x.png', 'size': len(content), 'sha256': hashlib.sha256(content).hexdigest()}),
+            content_type='application/json',
+        )
+        request.user = doctor_user
+        response = ExamUploadCreateView.as_view()(request, pk=exam.pk)
+        assert response.status_code == 201
+        upload = ExamUpload.objects.get(pk=json.loads(response.content)['id'])
+
+        chunks = [content[offset:offset + 8192] for offset in range(0, len(content), 8192)]
+        assert self._put(upload, doctor_user, 0, chunks[0], checksum='0' * 64).status_code == 422
+        assert self._put(upload, doctor_user, 0, chunks[0]).status_code == 200
+        response = self._put(upload, doctor_user, 16384, chunks[2])
+        assert response.status_code == 409
+        assert json.loads(response.content)['offset'] == 8192
+
+        # Outro médico não enxerga o envio
+        other_doctor = User.objects.create_user(username='doc2', password='x', cpf='300.000.000-00', user_type='doctor')
+        with pytest.raises(Http404):
+            self._put(upload, other_doctor, 8192, chunks[1])
+
+        with django_capture_on_commit_callbacks(execute=True):
+            for index, chunk in enumerate(chunks[1:], start=1):
+                upload.refresh_from_db()
+                assert self._put(upload, doctor_user, index * 8192, chunk).status_code == 200
+        upload.refresh_from_db()
+        assert upload.status == 'processing'
+        assert run_pending_jobs() == 1
+
+        upload.refresh_from_db()
+        exam.refresh_from_db()
+        assert upload.status == 'done'
+        assert exam.result_file.name.startswith('blobs/')
+        assert exam.result_file.read() == content
+        previews = {(preview.page, preview.is_thumbnail): preview for preview in exam.previews.all()}
+        assert set(previews) == {(1, False), (1, True)}
+        assert max(previews[1, True].width, previews[1, True].height) == 320
+
+    def test_upload_requires_access_to_exam(self, prescription, settings, tmp_path):
+        """Testa que só médicos com acesso ao prontuário iniciam o envio."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        exam = Exam.objects.create(
+            medical_record=prescription.medical_record, patient=prescription.patient,
+            doctor=prescription.doctor, exam_type='imaging', exam_name='Raio-X de tórax',
+        )
+        loose_exam = Exam.objects.create(
+            patient=prescription.patient, doctor=prescription.doctor, exam_type='blood', exam_name='Hemograma',
+        )
+        other_doctor = User.objects.create_user(username='doc2', password='x', cpf='310.000.000-00', user_type='doctor')
+        DoctorProfile.objects.create(user=other_doctor, crm='88888/SP', specialty='Pediatria')
+
+        def post(user, exam):
+            request = RequestFactory().post(
+                f'/medical-records/exam/{exam.pk}/upload/', json.dumps({'filename': 'laudo.pdf', 'size': 10}),
+                content_type='application/json',
+            )
+            request.user = user
+            return ExamUploadCreateView.as_view()(request, pk=exam.pk)
+
+        for target in (exam, loose_exam):
+            with pytest.raises(Http404):
+                post(other_doctor, target)
+            assert post(prescription.doctor.user, target).status_code == 201
+
+    def test_processing_is_retried_and_resumed(self, prescription, settings, tmp_path,
+                                               django_capture_on_commit_callbacks):
+        """Testa que o envio segue em processamento até a última tentativa e retoma do blob já gravado."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        settings.EXAM_PREVIEW_WORKERS = 0
+        exam = Exam.objects.create(
+            patient=prescription.patient, doctor=prescription.doctor, exam_type='imaging', exam_name='Laudo',
+        )
+        content = b'%PDF-1.4 laudo'
+
+        def processing_upload():
+            upload = start_upload(exam, prescription.doctor.user, 'laudo.pdf', len(content))
+            (tmp_path / upload.temp_name).write_bytes(content)
+            ExamUpload.objects.filter(pk=upload.pk).update(status='processing', received_bytes=len(content))
+            upload.refresh_from_db()
+            return upload, enqueue('medical_records.tasks.process_exam_upload', upload_id=str(upload.pk))
+
+        # Temporário perdido sem blob registrado: falha em todas as tentativas
+        upload, job = processing_upload()
+        os.remove(tmp_path / upload.temp_name)
+        BackgroundJob.objects.filter(pk=job.pk).update(max_attempts=2)
+        run_pending_jobs()
+        upload.refresh_from_db()
+        assert upload.status == 'processing'
+        BackgroundJob.objects.filter(pk=job.pk).update(run_after=job.created_at)
+        run_pending_jobs()
+        upload.refresh_from_db()
+        assert upload.status == 'failed' and 'FileNotFoundError' in upload.error
+
+        # Tentativa anterior moveu o arquivo para o blob e caiu antes de atualizar o exame
+        upload, job = processing_upload()
+        name = clinical_file_storage().adopt(str(tmp_path / upload.temp_name), '.pdf')
+        ExamUpload.objects.filter(pk=upload.pk).update(stored_name=name)
+        assert run_pending_jobs() == 1
+        upload.refresh_from_db()
+        exam.refresh_from_db()
+        assert upload.status == 'done'
+        assert exam.result_file.name == name
+        assert StoredBlob.objects.get(digest=hashlib.sha256(content).hexdigest()).ref_count == 1
+
+        # Reenviar o mesmo arquivo para o exame libera a referência anterior ao mesmo blob
+        processing_upload()
+        with django_capture_on_commit_callbacks(execute=True):
+            assert run_pending_jobs() == 1
+        assert StoredBlob.objects.get(digest=hashlib.sha256(content).hexdigest()).ref_count == 1
+
+
+@pytest.mark.django_db
+class TestExamResultValues:
+    """Testes para os valores de analitos e as séries por paciente."""
+
+    def _post(self, exam, values):
+        request = RequestFactory().post(
+            f'/medical-records/exam/{exam.pk}/values/', json.dumps({'values': values}),
+            content_type='application/json',
+        )
+        request.user = exam.doctor.user
+        return ExamResultValuesView.as_view()(request, pk=exam.pk)
+
+    def test_bulk_ingestion_is_validated_and_idempotent(self, prescription):
+        """Testa a gravação em lote, a atualização no reenvio e a recusa de itens inválidos."""
+        exam = Exam.objects.create(
+            patient=prescription.patient, doctor=prescription.doctor, exam_type='blood', exam_name='Bioquímica',
+        )
+        values = [
+            {'analyte': 'gli', 'value': 98, 'unit': 'mg/dL', 'reference_low': 70, 'reference_high': 99},
+            {'analyte': 'HBA1C', 'value': '5.9', 'unit': '%', 'collected_at': '2026-03-10T07:30:00'},
+        ]
+        assert self._post(exam, values).status_code == 201
+        values[0]['value'] = 101
+        assert self._post(exam, values).status_code == 201
+        assert sorted(exam.values.values_list('analyte', 'value')) == [('GLI', 101.0), ('HBA1C', 5.9)]
+
+        response = self._post(exam, [{'analyte': 'CREA', 'value': 1.1}, {'analyte': 'K', 'value': 'alto'}])
+        assert response.status_code == 400
+        assert 'Item 2' in json.loads(response.content)['error']
+        assert exam.values.count() == 2
+
+        # Médico sem acesso ao paciente não grava valores
+        other_doctor = User.objects.create_user(username='doc2', password='x', cpf='310.000.000-00', user_type='doctor')
+        DoctorProfile.objects.create(user=other_doctor, crm='88888/SP', specialty='Pediatria')
+        exam.doctor = other_doctor.doctor_profile
+        with pytest.raises(Http404):
+            self._post(exam, values)
+
+    def test_trend_is_downsampled_in_one_range_scan(self, prescription, django_assert_num_queries):
+        """Testa que a série reduzida mantém as extremidades e os picos."""
+        times = list(range(0, 10000, 10))
+        values = [100.0] * len(times)
+        values[500] = 300.0
+        sampled_times, sampled_values = downsample(times, values, 50)
+        assert len(sampled_times) == 50
+        assert (sampled_times[0], sampled_times[-1]) == (times[0], times[-1])
+        assert 300.0 in sampled_values
+
+        patient = prescription.patient
+        for month in range(1, 13):
+            exam = Exam.objects.create(patient=patient, doctor=prescription.doctor, exam_type='blood', exam_name='Glicemia')
+            ingest_values(exam, [{'analyte': 'GLI', 'value': 90 + month, 'unit': 'mg/dL', 'collected_at': f'2025-{month:02d}-01'}])
+
+        with django_assert_num_queries(2):
+            trend = analyte_trend(patient, 'gli', points=6)
+        assert trend['total'] == 12
+        assert trend['unit'] == 'mg/dL'
+        assert len(trend['t']) == len(trend['v']) == 6
+        assert (trend['v'][0], trend['v'][-1]) == (91.0, 102.0)
+        assert trend['t'] == sorted(trend['t'])
+
+
+HL7_MESSAGE = '\r'.join([
+    'MSH|^~\\&|LAB|LABCENTRAL|PROMPTUARIO|CLINICA|20260301083000||ORU^R01|{control}|P|2.5',
+    'PID|1||{cpf}^^^RFB^CPF||SILVA^JOAO',
+    'OBR|1|{exam}|L{exam}|BIOQ^Bioquímica|||20260301071500|||||||||||||||||F',
+    'OBX|1|NM|GLI^Glicose||98|mg/dL|70-99|N|||F',
+    'OBX|2|NM|CREA^Creatinina||1,4|mg/dL|0.7-1.3|H|||F',
+    'OBX|3|TX|OBS^Observação||Amostra levemente hemolisada\\.br\\Repetir se necessário||||||F',
+]) + '\r'
+
+
+@pytest.mark.django_db
+class TestImportHl7:
+    """Testes para a importação de resultados laboratoriais em HL7."""
+
+    def test_import_updates_exams_and_quarantines_bad_files(self, prescription, tmp_path):
+        """Testa a atualização em lote dos exames e a quarentena de arquivos sem correspondência."""
+        exam = Exam.objects.create(
+            patient=prescription.patient, doctor=prescription.doctor, exam_type='blood', exam_name='Bioquímica',
+        )
+        (tmp_path / 'ok.hl7').write_text(HL7_MESSAGE.format(control='1', cpf='20000000000', exam=exam.pk))
+        (tmp_path / 'outro_paciente.hl7').write_text(HL7_MESSAGE.format(control='2', cpf='99999999999', exam=exam.pk))
+        (tmp_path / 'invalido.hl7').write_text('PID|1||123\r')
+
+        out = StringIO()
+        call_command('import_hl7', directory=str(tmp_path), workers=0, stdout=out, stderr=StringIO())
+        assert '1 resultados importados de 2 arquivos' in out.getvalue()
+
+        exam.refresh_from_db()
+        assert exam.status == 'completed'
+        assert exam.completed_date == date(2026, 3, 1)
+        assert exam.result.splitlines() == [
+            'Glicose (GLI): 98 mg/dL [ref. 70-99]',
+            'Creatinina (CREA): 1,4 mg/dL [ref. 0.7-1.3] (H)',
+            'Observação (OBS): Amostra levemente hemolisada',
+            'Repetir se necessário',
+        ]
+        creatinine = exam.values.get(analyte='CREA')
+        assert (creatinine.value, creatinine.reference_high) == (1.4, 1.3)
+
+        assert os.listdir(tmp_path / 'processed') == ['ok.hl7']
+        assert sorted(os.listdir(tmp_path / 'quarantine')) == [
+            'invalido.hl7', 'invalido.hl7.error.txt', 'outro_paciente.hl7', 'outro_paciente.hl7.error.txt',
+        ]
+        assert os.listdir(tmp_path / 'processing') == []
+
+    def test_invalid_values_quarantine_and_stranded_files_are_recovered(self, prescription, tmp_path):
+        """Testa que datas impossíveis vão para a quarentena e que arquivos parados em processing/ são retomados."""
+        exam = Exam.objects.create(
+            patient=prescription.patient, doctor=prescription.doctor, exam_type='blood', exam_name='Bioquímica',
+        )
+        message = HL7_MESSAGE.format(control='1', cpf='20000000000', exam=exam.pk)
+        (tmp_path / 'data_invalida.hl7').write_text(message.replace('20260301071500', '20241345'))
+        (tmp_path / 'processing').mkdir()
+        (tmp_path / 'processing' / 'interrompido.hl7').write_text(message)
+
+        call_command('import_hl7', directory=str(tmp_path), workers=0, stdout=StringIO(), stderr=StringIO())
+        assert os.listdir(tmp_path / 'processing') == ['interrompido.hl7']
+        error = (tmp_path / 'quarantine' / 'data_invalida.hl7.error.txt').read_text()
+        assert 'Data HL7 inválida' in error
+
+        out = StringIO()
+        call_command(
+            'import_hl7', directory=str(tmp_path), workers=0, stale_after=0, stdout=out, stderr=StringIO()
+        )
+        assert '1 arquivos retomados' in out.getvalue()
+        assert os.listdir(tmp_path / 'processing') == []
+        assert os.listdir(tmp_path / 'processed') == ['interrompido.hl7']
+        exam.refresh_from_db()
+        assert exam.status == 'completed'
+
+
+@pytest.mark.django_db
+class TestMedicalRecordList:
+    """Testes para a lista de prontuários filtrada e paginada por cursor."""
+
+    def _get(self, user, params=None):
+        request = RequestFactory().get('/medical-records/', params or {})
+        request.user = user
+        return MedicalRecordListView.as_view()(request).context_data
+
+    def test_scoped_filtered_and_keyset_paginated(self, prescription, django_assert_num_queries):
+        """Testa o escopo por médico, os filtros e que cada página tem custo constante."""
+        first = prescription.medical_record
+        doctor, patient = first.doctor, first.patient
+        other_doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doc2', password='x', cpf='300.000.000-00', user_type='doctor'),
+            crm='2/SP', specialty='Clínica'
+        )
+        for index in range(1, 25):
+            author = other_doctor if index % 6 == 0 else doctor
+            appointment = Appointment.objects.create(
+                patient=patient, doctor=author, scheduled_date=date(2026, 1, 1), scheduled_time=time(8, index)
+            )
+            MedicalRecord.objects.create(
+                appointment=appointment, patient=patient, doctor=author,
+                chief_complaint='Retorno', is_closed=index % 2 == 0,
+            )
+
+        own = list(MedicalRecord.objects.filter(doctor=doctor).order_by('-created_at', '-pk'))
+        seen = []
+        params = {}
+        while True:
+            with django_assert_num_queries(1):
+                context = self._get(doctor.user, params)
+                page = list(context['records'])
+                # Os dados exibidos na lista já vêm na mesma consulta
+                for record in page:
+                    record.patient.user.get_full_name(), record.doctor.user.get_full_name(), record.appointment.scheduled_date
+            seen.extend(page)
+            if not context['next_cursor']:
+                break
+            params = {'cursor': context['next_cursor']}
+        assert seen == own
+
+        closed = self._get(doctor.user, {'status': 'closed'})['records']
+        assert closed and all(record.is_closed for record in closed)
+        # Com o filtro de paciente, o médico vê também os prontuários de outros médicos do paciente
+        assert len(self._get(doctor.user, {'patient': patient.pk})['records']) == 20
+        assert self._get(doctor.user, {'date_to': '2000-01-01'})['records'] == []
+        assert len(self._get(patient.user)['records']) == 20
+
+
+@pytest.mark.django_db
+class TestMedicalRecordDetail:
+    """Testes para a quantidade de consultas da página do prontuário."""
+
+    def _get(self, user, record):
+        request = RequestFactory().get(f'/medical-records/record/{record.pk}/')
+        request.user = user
+        return MedicalRecordDetailView.as_view()(request, pk=record.pk)
+
+    def test_query_count_does_not_grow_with_related_rows(self, prescription, django_assert_num_queries):
+        """Testa que comentários, receitas, exames e histórico não geram consultas por linha."""
+        record = prescription.medical_record
+        commenters = [
+            User.objects.create_user(username=f'user{index}', password='x', cpf=f'40{index}.000.000-00')
+            for index in range(3)
+        ]
+        for author in commenters:
+            MedicalRecordComment.objects.create(medical_record=record, author=author, comment='Revisado')
+            MedicalRecordHistory.objects.create(medical_record=record, user=author, action='comment_added')
+            Exam.objects.create(
+                medical_record=record, patient=record.patient, doctor=record.doctor,
+                exam_type='blood', exam_name='Hemograma',
+            )
+
+        # Prontuário + 4 listas (receitas, exames, comentários, histórico) + registro de acesso
+        with django_assert_num_queries(6):
+            context = self._get(record.doctor.user, record).context_data
+            record = context['record']
+            record.patient.user.get_full_name(), record.doctor.user.get_full_name(), record.appointment.scheduled_date
+            assert [comment.author.get_full_name() for comment in context['comments']] == [
+                author.get_full_name() for author in commenters
+            ]
+            assert len(context['exams']) == 3 and len(context['prescriptions']) == 1
+            assert all(history.user.get_full_name() is not None for history in record.history.all())
+
+        other_patient = User.objects.create_user(username='pac2', password='x', cpf='300.000.000-00', user_type='patient')
+        with pytest.raises(Http404):
+            self._get(other_patient, record)
+
+        other_doctor = User.objects.create_user(username='doc2', password='x', cpf='310.000.000-00', user_type='doctor')
+        DoctorProfile.objects.create(user=other_doctor, crm='88888/SP', specialty='Pediatria')
+        with pytest.raises(Http404):
+            self._get(other_doctor, record)
+
+
+@pytest.mark.django_db
+class TestPrescriptionChecks:
+    """Testes para os alertas de alergia e medicamento duplicado na receita."""
+
+    @pytest.fixture
+    def patient(self, prescription):
+        patient = prescription.patient
+        Allergy.objects.create(patient=patient, allergen='Penicilina', severity='severe')
+        Allergy.objects.create(patient=patient, allergen='Camarão', is_active=False)
+        Medication.objects.create(
+            patient=patient, name='Losartana 50mg', dosage='50mg', frequency='1x ao dia', start_date=date(2025, 1, 1)
+        )
+        return patient
+
+    def test_automaton_matches_whole_words_only(self):
+        matcher = AhoCorasick([('he', 1), ('she', 2), ('hers', 3)])
+        assert [(start, end, payload) for start, end, payload in matcher.search('ushers she')] == [(7, 10, 2)]
+        assert [payload for _, _, payload in matcher.search('he, hers')] == [1, 3]
+
+    def test_allergy_to_class_matches_brand_name(self, patient):
+        warnings = check_prescription(patient, 'AMOXIL 500mg, 1 cápsula de 8/8h\nDipirona 1g se dor')
+        assert [(warning['kind'], warning['term']) for warning in warnings] == [('allergy', 'AMOXIL')]
+        assert 'Penicilina (Grave)' in warnings[0]['message']
+        assert check_prescription(patient, 'Camarão ao alho e óleo; ibuprofeno 600mg') == []
+
+    def test_duplicate_active_medication_by_synonym(self, patient):
+        warnings = check_prescription(patient, 'Cozaar 50mg 1x ao dia')
+        assert [(warning['kind'], warning['term']) for warning in warnings] == [('duplicate', 'Cozaar')]
+        assert 'Losartana 50mg' in warnings[0]['message']
+
+    def test_terms_keep_original_offsets_after_normalization(self, patient):
+        """Testa que "½" e ligaduras, que mudam de tamanho na normalização, não deslocam os trechos."""
+        Medication.objects.create(
+            patient=patient, name='Dipirona 1g', dosage='1g', frequency='se dor', start_date=date(2025, 1, 1)
+        )
+        warnings = check_prescription(patient, 'Tomar ½ comprimido de Amoxil 500mg e Novalgina')
+        assert [(warning['kind'], warning['term']) for warning in warnings] == [
+            ('allergy', 'Amoxil'), ('duplicate', 'Novalgina'),
+        ]
+        assert [warning['term'] for warning in check_prescription(patient, 'ﬁltrado; Cozaar 50mg')] == ['Cozaar']
+
+    def test_checker_is_compiled_once_per_patient_terms(self, patient):
+        compile_checker.cache_clear()
+        for _ in range(3):
+            check_prescription(patient, 'Amoxicilina 500mg')
+        assert compile_checker.cache_info().misses == 1
+
+    def test_form_requires_confirmation(self, patient):
+        data = {'medications': 'Benzetacil 1.200.000 UI', 'instructions': 'Dose única', 'valid_until': ''}
+        form = PrescriptionForm(data=data, patient=patient)
+        assert not form.is_valid()
+        assert 'Penicilina' in form.non_field_errors()[0]
+        assert PrescriptionForm(data={**data, 'confirm_warnings': 'on'}, patient=patient).is_valid()
+
+    def test_check_view(self, patient, prescription):
+        request = RequestFactory().post('/check/', {'medications': 'Amoxil 500mg'})
+        request.user = prescription.doctor.user
+        response = PrescriptionCheckView.as_view()(request, record_pk=prescription.medical_record_id)
+        assert [warning['kind'] for warning in json.loads(response.content)['warnings']] == ['allergy']
+
+        other_doctor = User.objects.create_user(username='doc2', password='x', cpf='310.000.000-00', user_type='doctor')
+        DoctorProfile.objects.create(user=other_doctor, crm='88888/SP', specialty='Pediatria')
+        request.user = other_doctor
+        with pytest.raises(Http404):
+            PrescriptionCheckView.as_view()(request, record_pk=prescription.medical_record_id)
+
+
+@pytest.mark.django_db
+class TestPrescriptionTemplates:
+    """Testes para as receitas favoritas do médico e o cache por médico."""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    @pytest.fixture
+    def templates(self, prescription):
+        doctor = prescription.doctor
+        return [
+            PrescriptionTemplate.objects.create(
+                doctor=doctor, name='Amigdalite', medications='Amoxicilina 500mg de 8/8h por 10 dias', usage_count=5
+            ),
+            PrescriptionTemplate.objects.create(
+                doctor=doctor, name='Cefaleia', medications='Dipirona 1g de 6/6h se dor', usage_count=9
+            ),
+        ]
+
+    def test_favorites_are_cached_and_invalidated_on_edit(
+        self, templates, django_assert_num_queries, django_capture_on_commit_callbacks
+    ):
+        doctor_id = templates[0].doctor_id
+        assert [template['name'] for template in favorite_templates(doctor_id)] == ['Cefaleia', 'Amigdalite']
+        with django_assert_num_queries(0):
+            assert search_templates(doctor_id, 'AMOXICILINA')[0]['name'] == 'Amigdalite'
+
+        with django_capture_on_commit_callbacks(execute=True):
+            templates[0].name = 'Amigdalite bacteriana'
+            templates[0].save()
+        assert favorite_templates(doctor_id)[1]['name'] == 'Amigdalite bacteriana'
+
+    def test_usage_reorders_cached_favorites(
+        self, templates, django_assert_num_queries, django_capture_on_commit_callbacks
+    ):
+        """Testa que o uso atualiza o contador na entrada em cache sem descartá-la."""
+        doctor_id = templates[0].doctor_id
+        favorite_templates(doctor_id)
+        for _ in range(5):
+            with django_capture_on_commit_callbacks(execute=True):
+                record_template_use(templates[0])
+        templates[0].refresh_from_db()
+        assert templates[0].usage_count == 10 and templates[0].last_used_at is not None
+        with django_assert_num_queries(0):
+            favorites = favorite_templates(doctor_id)
+        assert [(template['name'], template['usage_count']) for template in favorites] == [
+            ('Amigdalite', 10), ('Cefaleia', 9),
+        ]
+
+    def test_database_fallback_ignores_accents(self, templates, monkeypatch):
+        """Testa que as receitas fora do cache também são encontradas sem acentos."""
+        from medical_records import prescription_templates
+
+        PrescriptionTemplate.objects.create(
+            doctor=templates[0].doctor, name='Infecção urinária', medications='Nitrofurantoína 100mg de 6/6h'
+        )
+        monkeypatch.setattr(prescription_templates, 'MAX_CACHED_TEMPLATES', 2)
+        results = search_templates(templates[0].doctor_id, 'INFECCAO nitrofurantoina')
+        assert [result['name'] for result in results] == ['Infecção urinária']
+
+    def test_prescription_form_only_accepts_own_templates(self, templates, prescription):
+        other_doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doc2', password='x', cpf='300.000.000-00', user_type='doctor'),
+            crm='54321/SP',
+        )
+        data = {'medications': 'Dipirona 1g', 'instructions': '', 'valid_until': '', 'template': templates[1].pk}
+        assert PrescriptionForm(data=data, doctor=prescription.doctor).is_valid()
+        assert not PrescriptionForm(data=data, doctor=other_doctor).is_valid()
+
+    def test_search_view(self, templates, prescription):
+        request = RequestFactory().get('/prescription-templates/search/', {'q': 'dipirona'})
+        request.user = prescription.doctor.user
+        response = PrescriptionTemplateSearchView.as_view()(request)
+        assert [result['name'] for result in json.loads(response.content)['results']] == ['Cefaleia']
+
+
+@pytest.mark.django_db
+class TestMedicalRecordComments:
+    """Testes para a API de comentários com paginação por cursor e contador no prontuário."""
+
+    def _request(self, method, user, record, **params):
+        factory = RequestFactory()
+        url = f'/medical-records/record/{record.pk}/comments/'
+        if method == 'post':
+            request = factory.post(url, json.dumps(params), content_type='application/json')
+        else:
+            request = factory.get(url, params)
+        request.user = user
+        return MedicalRecordCommentsView.as_view()(request, pk=record.pk)
+
+    def test_add_comment_to_closed_record(self, prescription):
+        record = prescription.medical_record
+        record.close_record()
+        response = self._request('post', record.doctor.user, record, comment='Adendo: resultado do RX normal.')
+        assert response.status_code == 201
+        assert json.loads(response.content)['count'] == 1
+
+        record.refresh_from_db()
+        assert record.comment_count == 1
+        assert record.history.filter(action='comment_added', version__isnull=True).count() == 1
+        # Uma gravação completa com o contador desatualizado não o sobrescreve
+        stale = MedicalRecord.objects.get(pk=record.pk)
+        record.add_comment(record.doctor.user, 'Segundo adendo')
+        stale.save()
+        record.refresh_from_db()
+        assert record.comment_count == 2
+
+        assert self._request('post', record.doctor.user, record, comment='  ').status_code == 400
+        with pytest.raises(PermissionDenied):
+            self._request('post', record.patient.user, record, comment='Posso comentar?')
+
+    def test_keyset_pages_in_chronological_order(self, prescription, django_assert_num_queries):
+        record = prescription.medical_record
+        author = record.doctor.user
+        for index in range(45):
+            MedicalRecordComment.objects.create(medical_record=record, author=author, comment=f'Evolução {index}')
+
+        seen = []
+        cursor = None
+        while True:
+            params = {'cursor': cursor} if cursor else {}
+            with django_assert_num_queries(2):
+                data = json.loads(self._request('get', author, record, **params).content)
+            assert data['count'] == 45
+            seen += [comment['comment'] for comment in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        assert seen == [f'Evolução {index}' for index in range(45)]
+
+        assert self._request('get', author, record, cursor='invalido').status_code == 400
+        MedicalRecordComment.objects.filter(medical_record=record).first().delete()
+        record.refresh_from_db()
+        assert record.comment_count == 44
@@ -0,0 +1,249 @@
+"""
+Envio em partes (chunks) e retomável dos resultados de exames.
+
+O cliente cria o envio informando nome e tamanho e manda as partes em ordem
+com ``PUT`` (cabeçalhos ``Content-Range`` e ``X-Chunk-SHA256``). Cada parte é
+lida do corpo da requisição em blocos e gravada direto no arquivo temporário
+do armazenamento de arquivos clínicos, sem ficar inteira em memória; só é
+confirmada (``received_bytes``) se o SHA-256 conferir. Após uma queda, o
+cliente consulta o envio e continua do ``received_bytes``.
+
+Com a última parte, uma tarefa em segundo plano calcula o hash do arquivo,
+move-o para o armazenamento (rename, sem cópia) e gera as pré-visualizações
+em um pool de processos.
+"""
+
+import fcntl
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.jobs import enqueue
+from accounts.storage import (
+    CHUNK_SIZE, blob_name, clean_extension, clinical_file_storage, file_digest, new_temp_path
+)
+
+from .models import Exam, ExamResultPreview, ExamUpload
+from .workers import render_preview_page
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+PREVIEW_MAX_SIZE = 1600
+THUMBNAIL_SIZE = 320
+MAX_PREVIEW_PAGES = 50
+
+
+class ChunkRejected(Exception):
+    """Parte recusada; ``offset`` informa ao cliente de onde continuar."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def start_upload(exam, user, filename, total_size, expected_sha256=''):
+    """Cria o envio e o arquivo temporário que receberá as partes."""
+    if total_size <= 0 or total_size > settings.EXAM_UPLOAD_MAX_SIZE:
+        raise ValueError('Tamanho de arquivo inválido.')
+    expected_sha256 = (expected_sha256 or '').lower()
+    if expected_sha256 and not SHA256_RE.match(expected_sha256):
+        raise ValueError('SHA-256 inválido.')
+    storage = clinical_file_storage()
+    temp_path = new_temp_path(storage.location, suffix=clean_extension(filename))
+    return ExamUpload.objects.create(
+        exam=exam,
+        uploaded_by=user,
+        filename=os.path.basename(filename)[:255],
+        total_size=total_size,
+        chunk_size=settings.EXAM_UPLOAD_CHUNK_SIZE,
+        expected_sha256=expected_sha256,
+        temp_name=os.path.relpath(temp_path, storage.location),
+    )
+
+
+def parse_content_range(header):
+    match = CONTENT_RANGE_RE.match(header or '')
+    if match is None:
+        raise ChunkRejected('Cabeçalho Content-Range ausente ou inválido.')
+    start, end, total = (int(value) for value in match.groups())
+    if end < start:
+        raise ChunkRejected('Intervalo inválido.')
+    return start, end, total
+
+
+def write_chunk(upload, content_range, checksum, stream):
+    """
+    Grava uma parte a partir de ``stream`` (o corpo da requisição) e retorna o
+    novo ``received_bytes``. A parte só é aceita na posição atual do envio.
+    """
+    start, end, total = parse_content_range(content_range)
+    length = end - start + 1
+    if upload.status != 'uploading':
+        raise ChunkRejected('O envio não aceita mais partes.', status=409, offset=upload.received_bytes)
+    if total != upload.total_size or end >= total or length > upload.chunk_size:
+        raise ChunkRejected('Intervalo incompatível com o envio.', status=416, offset=upload.received_bytes)
+    if start != upload.received_bytes:
+        raise ChunkRejected('Parte fora de ordem.', status=409, offset=upload.received_bytes)
+    checksum = (checksum or '').lower()
+    if not SHA256_RE.match(checksum):
+        raise ChunkRejected('Cabeçalho X-Chunk-SHA256 ausente ou inválido.')
+
+    path = clinical_file_storage().path(upload.temp_name)
+    try:
+        partial = open(path, 'r+b')
+    except FileNotFoundError:
+        raise ChunkRejected('O envio expirou. Inicie um novo envio.', status=410)
+    with partial:
+        try:
+            # Uma parte por vez em cada envio (ex.: reenvio após timeout do cliente)
+            fcntl.flock(partial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ChunkRejected('Outra parte deste envio está sendo gravada.', status=409, offset=start)
+        # Descarta bytes de uma tentativa anterior interrompida nesta posição
+        partial.truncate(start)
+        partial.seek(start)
+        digest = hashlib.sha256()
+        received = 0
+        while received < length:
+            block = stream.read(min(CHUNK_SIZE, length - received))
+            if not block:
+                break
+            digest.update(block)
+            partial.write(block)
+            received += len(block)
+        if received != length or digest.hexdigest() != checksum:
+            partial.truncate(start)
+            raise ChunkRejected('Parte incompleta ou com SHA-256 divergente.', status=422, offset=start)
+        partial.flush()
+        os.fsync(partial.fileno())
+
+        with transaction.atomic():
+            advanced = ExamUpload.objects.filter(
+                pk=upload.pk, status='uploading', received_bytes=start
+            ).update(received_bytes=end + 1, updated_at=timezone.now())
+            if not advanced:
+                raise ChunkRejected('O envio foi alterado por outra requisição.', status=409)
+            upload.received_bytes = end + 1
+            if upload.received_bytes == upload.total_size:
+                ExamUpload.objects.filter(pk=upload.pk).update(status='processing')
+                upload.status = 'processing'
+                transaction.on_commit(lambda: enqueue(
+                    'medical_records.tasks.process_exam_upload', upload_id=str(upload.pk)
+                ))
+    return upload.received_bytes
+
+
+def finish_upload(upload):
+    """
+    Confere o arquivo completo, grava-o como resultado do exame e gera as
+    pré-visualizações. Erros de pré-visualização não invalidam o envio.
+
+    Pode ser repetida após uma falha: o nome do blob é registrado no envio
+    antes de o arquivo temporário ser movido, então uma nova tentativa que não
+    encontra mais o temporário continua do blob já gravado.
+    """
+    storage = clinical_file_storage()
+    path = storage.path(upload.temp_name)
+    if upload.stored_name and not os.path.exists(path):
+        name = upload.stored_name
+    else:
+        digest = file_digest(path)
+        if upload.expected_sha256 and digest != upload.expected_sha256:
+            os.remove(path)
+            ExamUpload.objects.filter(pk=upload.pk).update(
+                status='failed', error='O SHA-256 do arquivo recebido não confere com o informado.'
+            )
+            return None
+        extension = clean_extension(upload.filename)
+        ExamUpload.objects.filter(pk=upload.pk).update(stored_name=blob_name(digest, extension))
+        name = storage.adopt(path, extension, digest=digest)
+
+    with transaction.atomic():
+        exam = Exam.objects.select_for_update().get(pk=upload.exam_id)
+        old_name = exam.result_file.name
+        Exam.objects.filter(pk=exam.pk).update(result_file=name)
+        if old_name:
+            # adopt registra uma referência nova mesmo para o mesmo conteúdo:
+            # a anterior é sempre liberada, depois que o exame aponta para o novo nome
+            transaction.on_commit(lambda: storage.delete(old_name))
+        ExamUpload.objects.filter(pk=upload.pk).update(status='done', error='')
+
+    try:
+        generate_previews(exam, name)
+    except Exception:
+        logger.exception('Falha ao gerar as pré-visualizações do exame %s', exam.pk)
+    return name
+
+
+_preview_pool = None
+
+
+def get_preview_pool():
+    """Pool de processos do worker para as pré-visualizações (None = no próprio processo)."""
+    global _preview_pool
+    if settings.EXAM_PREVIEW_WORKERS <= 0:
+        return None
+    if _preview_pool is None:
+        _preview_pool = ProcessPoolExecutor(
+            max_workers=settings.EXAM_PREVIEW_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _preview_pool
+
+
+def preview_page_count(path):
+    """Quantidade de páginas com pré-visualização (0 se não for imagem legível pelo Pillow)."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as image:
+            return min(getattr(image, 'n_frames', 1), MAX_PREVIEW_PAGES)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return 0
+
+
+def generate_previews(exam, name):
+    """
+    Gera uma imagem por página (e a miniatura da primeira) do arquivo do exame,
+    em paralelo no pool de processos, e substitui as pré-visualizações anteriores.
+    """
+    storage = clinical_file_storage()
+    source = storage.path(name)
+    pages = preview_page_count(source)
+
+    items = [
+        (source, page, size, new_temp_path(storage.location, suffix='.jpg'))
+        for page in range(pages)
+        for size in ([PREVIEW_MAX_SIZE, THUMBNAIL_SIZE] if page == 0 else [PREVIEW_MAX_SIZE])
+    ]
+    pool = get_preview_pool()
+    previews = []
+    try:
+        results = list(pool.map(render_preview_page, items) if pool else map(render_preview_page, items))
+        for (_, page, size, temp_path), (width, height) in zip(items, results):
+            previews.append(ExamResultPreview(
+                exam=exam, page=page + 1, is_thumbnail=size == THUMBNAIL_SIZE,
+                image=storage.adopt(temp_path, '.jpg'), width=width, height=height,
+            ))
+    finally:
+        for _, _, _, temp_path in items:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    with transaction.atomic():
+        # A exclusão libera os blobs das imagens antigas (sinal post_delete)
+        for preview in exam.previews.all():
+            preview.delete()
+        ExamResultPreview.objects.bulk_create(previews)
+    return previews
@@ -6,13 +6,31 @@ app_name = 'medical_records'
 
 urlpatterns = [
     path('record/<int:pk>/', views.MedicalRecordDetailView.as_view(), name='record_detail'),
+    path('record/<int:pk>/comments/', views.MedicalRecordCommentsView.as_view(), name='record_comments'),
+    path('record/<int:pk>/history/', views.MedicalRecordHistoryView.as_view(), name='record_history'),
+    path('record/<int:pk>/history/<int:version>/', views.MedicalRecordVersionView.as_view(), name='record_version'),
     path('appointment/<int:appointment_pk>/record/create/', views.MedicalRecordCreateView.as_view(), name='record_create'),
     path('appointment/<int:appointment_pk>/record/update/', views.MedicalRecordUpdateView.as_view(), name='record_update'),
 
     path('record/<int:record_pk>/prescription/create/', views.PrescriptionCreateView.as_view(), name='prescription_create'),
+    path('record/<int:record_pk>/prescription/check/', views.PrescriptionCheckView.as_view(), name='prescription_check'),
+    path('prescription-templates/', views.PrescriptionTemplateListView.as_view(), name='prescription_template_list'),
+    path('prescription-templates/create/', views.PrescriptionTemplateCreateView.as_view(), name='prescription_template_create'),
+    path('prescription-templates/search/', views.PrescriptionTemplateSearchView.as_view(), name='prescription_template_search'),
+    path('prescription-templates/<int:pk>/edit/', views.PrescriptionTemplateUpdateView.as_view(), name='prescription_template_update'),
+    path('prescription-templates/<int:pk>/delete/', views.PrescriptionTemplateDeleteView.as_view(), name='prescription_template_delete'),
+    path('prescription/<int:pk>/status/', views.PrescriptionStatusView.as_view(), name='prescription_status'),
+    path('prescription/<int:pk>/file/', views.PrescriptionFileView.as_view(), name='prescription_file'),
+    path('exam/<int:pk>/result/', views.ExamResultFileView.as_view(), name='exam_result_file'),
+    path('exam/<int:pk>/values/', views.ExamResultValuesView.as_view(), name='exam_values'),
+    path('exam/<int:pk>/upload/', views.ExamUploadCreateView.as_view(), name='exam_upload_create'),
+    path('upload/<uuid:upload_id>/', views.ExamUploadView.as_view(), name='exam_upload'),
+    path('exam-preview/<int:pk>/', views.ExamPreviewFileView.as_view(), name='exam_preview_file'),
     path('record/<int:record_pk>/exam/create/', views.ExamCreateView.as_view(), name='exam_create'),
 
     path('', views.MedicalRecordListView.as_view(), name='medical_record_list'),
+    path('search/', views.MedicalRecordSearchView.as_view(), name='record_search'),
+    path('cid10/autocomplete/', views.Cid10AutocompleteView.as_view(), name='cid10_autocomplete'),
 
     # AQUI ESTÁ O PROBLEMA — FALTAVA O IMPORT
     path('quick-create/<int:patient_pk>/', MedicalRecordQuickCreateView.as_view(), name='medical_record_quick_create'),
@@ -1,81 +1,160 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
-from django.conf import settings
+import base64
+import binascii
 import os
 from datetime import datetime
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from accounts.storage import clinical_file_storage, new_temp_path
+from appointments.models import Appointment
+
+from .models import Cid10Code, Exam, MedicalRecord
+from .pdf_engine import get_engine
+
 
 def generate_prescription_pdf(prescription_instance, file_path):
     """
     Gera o PDF da receita médica usando reportlab.
+    Usa o motor compartilhado do processo (estilos e cabeçalhos em cache).
+    """
+    return get_engine().render(prescription_instance, file_path)
+
+
+def render_prescription_to_temp(prescription, media_root=None):
+    """
+    Gera o PDF em um arquivo temporário do armazenamento de arquivos clínicos
+    e retorna o caminho. Não acessa o banco de dados.
+    """
+    temp_path = new_temp_path(media_root, suffix='.pdf')
+    try:
+        generate_prescription_pdf(prescription, temp_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+
+def store_prescription_pdf(prescription):
+    """
+    Gera o PDF e o grava no armazenamento endereçado por conteúdo (o arquivo
+    final surge de uma só vez, por rename). Retorna o nome a ser gravado em
+    ``prescription_file``.
+
+    Deve ser chamada dentro da transação que grava o nome: a referência ao
+    arquivo anterior é liberada só quando ela for confirmada, mesmo que seja o
+    mesmo blob (``adopt`` sempre registra uma referência nova).
+    """
+    storage = clinical_file_storage()
+    name = storage.adopt(render_prescription_to_temp(prescription), '.pdf')
+    old_name = prescription.prescription_file.name
+    if old_name:
+        transaction.on_commit(partial(storage.delete, old_name))
+    return name
+
+
+# Campos cifrados que as listas de prontuários não exibem (ficam sem decifrar)
+RECORD_LIST_DEFERRED = ('physical_examination', 'observations', 'patient__medical_notes')
+
+
+def records_visible_to(user, queryset=None):
+    """
+    Prontuários que o usuário pode consultar: administradores veem todos,
+    médicos os que criaram e os de pacientes que atenderam, pacientes os próprios.
+    """
+    if queryset is None:
+        queryset = MedicalRecord.objects.all()
+    if user.is_admin():
+        return queryset
+    if user.is_doctor():
+        doctor = user.doctor_profile
+        attended = Appointment.objects.filter(patient=OuterRef('patient'), doctor=doctor)
+        return queryset.filter(Q(doctor=doctor) | Exists(attended))
+    if user.is_patient():
+        return queryset.filter(patient__user=user)
+    return queryset.none()
+
+
+def exams_visible_to(user, queryset=None):
+    """
+    Exames que o usuário pode consultar: os de prontuários visíveis e, para os
+    exames sem prontuário, a mesma regra aplicada ao paciente e ao médico do exame.
+    """
+    if queryset is None:
+        queryset = Exam.objects.all()
+    loose = records_visible_to(user, Exam.objects.filter(medical_record__isnull=True))
+    return queryset.filter(Q(medical_record__in=records_visible_to(user)) | Q(pk__in=loose.values('pk')))
+
+
+def encode_record_cursor(record):
+    raw = f'{record.created_at.isoformat()}|{record.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_record_cursor(cursor):
+    """Converte o cursor em (criado em, id); ValueError se inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        moment, pk = raw.split('|')
+        moment = datetime.fromisoformat(moment)
+        if timezone.is_naive(moment):
+            raise ValueError
+        return moment, int(pk)
+    except (UnicodeDecodeError, ValueError, binascii.Error):
+        raise ValueError('Cursor inválido.')
+
+
+def records_page(queryset, cursor=None, limit=20):
     """
-    
-    # Cria o diretório se não existir
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-    doc = SimpleDocTemplate(
-        file_path,
-        pagesize=A4,
-        leftMargin=2.5*cm,
-        rightMargin=2.5*cm,
-        topMargin=2.5*cm,
-        bottomMargin=2.5*cm
+    Página de prontuários do mais recente para o mais antigo, por chave
+    (criado em, id) em vez de OFFSET: cada página lê apenas ``limite + 1``
+    linhas pelo índice, qualquer que seja a profundidade.
+    Retorna (prontuários, cursor da próxima página ou None).
+    """
+    if cursor:
+        moment, pk = decode_record_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=moment) | Q(created_at=moment, pk__lt=pk))
+    records = list(queryset.order_by('-created_at', '-pk')[:limit + 1])
+    next_cursor = encode_record_cursor(records[limit - 1]) if len(records) > limit else None
+    return records[:limit], next_cursor
+
+
+def comments_page(queryset, cursor=None, limit=20):
+    """
+    Página de comentários em ordem cronológica, pela mesma chave (criado em,
+    id) dos prontuários, no índice (prontuário, criado em, id).
+    Retorna (comentários, cursor da próxima página ou None).
+    """
+    if cursor:
+        moment, pk = decode_record_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__gt=moment) | Q(created_at=moment, pk__gt=pk))
+    comments = list(queryset.order_by('created_at', 'pk')[:limit + 1])
+    next_cursor = encode_record_cursor(comments[limit - 1]) if len(comments) > limit else None
+    return comments[:limit], next_cursor
+
+
+def top_diagnoses(records, limit=5):
+    """
+    Diagnósticos mais frequentes (por código CID-10) entre os prontuários
+    informados. O agrupamento é feito pelo ID do código na tabela de ligação,
+    e só os códigos vencedores são buscados no catálogo.
+    Retorna dicionários com code, description e count.
+    """
+    rows = list(
+        MedicalRecord.diagnosis_codes.through.objects
+        .filter(medicalrecord__in=records.order_by().values('pk'))
+        .values('cid10code_id')
+        .annotate(count=Count('cid10code_id'))
+        .order_by('-count', 'cid10code_id')[:limit]
     )
-    
-    styles = getSampleStyleSheet()
-    Story = []
-
-    # --- Cabeçalho (Dados do Médico) ---
-    doctor = prescription_instance.doctor
-    doctor_info = [
-        Paragraph(f"<b>Dr(a). {doctor.user.get_full_name()}</b>", styles['h2']),
-        Paragraph(f"CRM: {doctor.crm} - {doctor.crm_state}", styles['Normal']),
-        Paragraph(f"Especialidade: {doctor.specialty}", styles['Normal']),
-        Paragraph(f"Telefone: {doctor.user.phone or 'N/A'}", styles['Normal']),
-        Spacer(1, 0.5*cm)
-    ]
-    Story.extend(doctor_info)
-
-    # --- Título ---
-    Story.append(Paragraph("<b>RECEITUÁRIO MÉDICO</b>", styles['h1']))
-    Story.append(Spacer(1, 0.5*cm))
-
-    # --- Dados do Paciente ---
-    patient = prescription_instance.patient
-    patient_info = [
-        Paragraph(f"<b>Paciente:</b> {patient.user.get_full_name()}", styles['Normal']),
-        Paragraph(f"<b>Data de Nascimento:</b> {patient.user.birth_date.strftime('%d/%m/%Y') if patient.user.birth_date else 'N/A'}", styles['Normal']),
-        Paragraph(f"<b>CPF:</b> {patient.user.cpf}", styles['Normal']),
-        Spacer(1, 0.5*cm)
+    codes = Cid10Code.objects.in_bulk([row['cid10code_id'] for row in rows])
+    return [
+        {
+            'code': codes[row['cid10code_id']].code,
+            'description': codes[row['cid10code_id']].description,
+            'count': row['count'],
+        }
+        for row in rows
     ]
-    Story.extend(patient_info)
-
-    # --- Medicamentos ---
-    Story.append(Paragraph("<b>MEDICAMENTOS PRESCRITOS:</b>", styles['h3']))
-    medications_text = prescription_instance.medications.replace('\n', '<br/>')
-    Story.append(Paragraph(medications_text, styles['Normal']))
-    Story.append(Spacer(1, 0.5*cm))
-
-    # --- Instruções ---
-    if prescription_instance.instructions:
-        Story.append(Paragraph("<b>INSTRUÇÕES DE USO:</b>", styles['h3']))
-        instructions_text = prescription_instance.instructions.replace('\n', '<br/>')
-        Story.append(Paragraph(instructions_text, styles['Normal']))
-        Story.append(Spacer(1, 0.5*cm))
-
-    # --- Data e Validade ---
-    Story.append(Paragraph(f"<b>Data da Emissão:</b> {prescription_instance.created_at.strftime('%d/%m/%Y')}", styles['Normal']))
-    if prescription_instance.valid_until:
-        Story.append(Paragraph(f"<b>Válida até:</b> {prescription_instance.valid_until.strftime('%d/%m/%Y')}", styles['Normal']))
-    else:
-        Story.append(Paragraph("<b>Validade:</b> Indeterminada", styles['Normal']))
-    Story.append(Spacer(1, 2*cm))
-
-    # --- Assinatura (Espaço) ---
-    Story.append(Paragraph("___________________________________________________", styles['Normal']))
-    Story.append(Paragraph(f"Assinatura e Carimbo do Dr(a). {doctor.user.get_full_name()}", styles['Normal']))
-    
-    doc.build(Story)
-    return file_path
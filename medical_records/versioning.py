@@ -0,0 +1,212 @@
+"""
+Versionamento do prontuário no histórico de alterações.
+
+Cada alteração grava em MedicalRecordHistory apenas os novos valores dos
+campos que mudaram (``changes``). A primeira versão e uma a cada
+``SNAPSHOT_INTERVAL`` guardam também o estado completo (``snapshot``). Para
+reconstruir uma versão parte-se da cópia completa mais próxima e aplicam-se
+as alterações seguintes: no máximo ``SNAPSHOT_INTERVAL`` linhas lidas.
+
+Os campos cifrados no prontuário também são gravados cifrados no JSON do
+histórico; ``reseal_history`` os regrava na rotação de chaves.
+"""
+
+import time
+
+from django.db import transaction
+
+from accounts.encryption import token_key_id
+from accounts.fields import encrypted_fields
+
+from .models import MedicalRecord, MedicalRecordHistory
+
+SNAPSHOT_INTERVAL = 10
+
+TRACKED_FIELDS = (
+    'chief_complaint', 'symptoms', 'physical_examination', 'diagnosis',
+    'treatment_plan', 'observations', 'is_closed',
+)
+# Códigos CID-10 (muitos-para-muitos) guardados como lista ordenada de códigos
+DIAGNOSIS_CODES = 'diagnosis_codes'
+# Campos cifrados no prontuário também ficam cifrados no histórico
+ENCRYPTED_FIELDS = tuple(field for field in TRACKED_FIELDS if field in encrypted_fields(MedicalRecord))
+
+
+def record_state(record):
+    """Estado versionado do prontuário (valores serializáveis em JSON)."""
+    state = {field: getattr(record, field) for field in TRACKED_FIELDS}
+    state[DIAGNOSIS_CODES] = sorted(record.diagnosis_codes.values_list('code', flat=True))
+    return state
+
+
+def seal_state(state):
+    """Cifra os campos cifrados de um estado antes de gravá-lo no histórico."""
+    return {
+        field: MedicalRecord._meta.get_field(field).encrypt(value) if field in ENCRYPTED_FIELDS else value
+        for field, value in state.items()
+    }
+
+
+def open_state(state):
+    """Decifra os campos cifrados de um estado lido do histórico."""
+    return {
+        field: MedicalRecord._meta.get_field(field).decrypt(value) if field in ENCRYPTED_FIELDS else value
+        for field, value in state.items()
+    }
+
+
+def field_label(field):
+    return MedicalRecord._meta.get_field(field).verbose_name
+
+
+def display_value(value):
+    """Valor versionado em texto para as telas de auditoria e de conflito."""
+    if isinstance(value, bool):
+        return 'Sim' if value else 'Não'
+    if isinstance(value, list):
+        return ', '.join(value)
+    return value
+
+
+def submitted_state(cleaned_data):
+    """Estado versionado a partir dos dados de um formulário (apenas os campos presentes)."""
+    state = {field: cleaned_data[field] for field in TRACKED_FIELDS if field in cleaned_data}
+    if DIAGNOSIS_CODES in cleaned_data:
+        state[DIAGNOSIS_CODES] = sorted(code.code for code in cleaned_data[DIAGNOSIS_CODES])
+    return state
+
+
+def conflicting_fields(current, submitted):
+    """Campos em que a versão enviada difere da gravada: (rótulo, gravado, enviado)."""
+    return [
+        (field_label(field), display_value(current.get(field)), display_value(value))
+        for field, value in submitted.items() if current.get(field) != value
+    ]
+
+
+def _versioned(record):
+    return MedicalRecordHistory.objects.filter(medical_record=record, version__isnull=False)
+
+
+def reconstruct_version(record, version):
+    """
+    Estado do prontuário na versão informada, ou None se ela não existir.
+    Lê a cópia completa mais recente até a versão e as alterações posteriores.
+    """
+    base = (
+        _versioned(record)
+        .filter(version__lte=version, snapshot__isnull=False)
+        .order_by('-version')
+        .values_list('version', 'snapshot')
+        .first()
+    )
+    if base is None:
+        return None
+    base_version, state = base
+    state = open_state(state)
+    rows = (
+        _versioned(record)
+        .filter(version__gt=base_version, version__lte=version)
+        .order_by('version')
+        .values_list('version', 'changes')
+    )
+    current = base_version
+    for current, changes in rows:
+        state.update(open_state(changes))
+    return state if current == version else None
+
+
+def latest_version(record):
+    return _versioned(record).order_by('-version').values_list('version', flat=True).first() or 0
+
+
+def record_version(record, user, action, description=''):
+    """
+    Registra a alteração no histórico com a diferença para a versão anterior.
+    Deve ser chamada depois de salvar o prontuário (e seus códigos CID-10).
+    """
+    with transaction.atomic():
+        # Serializa as gravações de versão do mesmo prontuário
+        MedicalRecord.objects.select_for_update().filter(pk=record.pk).exists()
+        previous = latest_version(record)
+        state = record_state(record)
+        old_state = reconstruct_version(record, previous) if previous else {}
+        changes = {field: value for field, value in state.items() if old_state.get(field) != value}
+        version = previous + 1
+        return MedicalRecordHistory.objects.create(
+            medical_record=record,
+            user=user,
+            action=action,
+            description=description,
+            version=version,
+            changes=seal_state(changes),
+            snapshot=seal_state(state) if (version - 1) % SNAPSHOT_INTERVAL == 0 else None,
+        )
+
+
+def version_diffs(record):
+    """
+    Percorre as versões do prontuário em ordem, retornando para cada uma
+    (histórico, lista de (rótulo, valor anterior, novo valor)).
+    """
+    state = {}
+    diffs = []
+    for history in _versioned(record).select_related('user').order_by('version'):
+        before = state
+        if history.snapshot is not None:
+            state = open_state(history.snapshot)
+        else:
+            state = {**state, **open_state(history.changes)}
+        diffs.append((history, [
+            (field_label(field), display_value(before.get(field)), display_value(state.get(field)))
+            for field in history.changes
+        ]))
+    return diffs
+
+
+def _reseal(state, primary_id):
+    """Estado com os campos cifrados com outra chave (ou em texto puro) cifrados com a principal."""
+    stale = {
+        field: state[field] for field in ENCRYPTED_FIELDS
+        if state.get(field) and token_key_id(state[field]) != primary_id
+    }
+    return {**state, **seal_state(open_state(stale))}, len(stale)
+
+
+def reseal_history(primary_id, batch_size=1000, dry_run=False, sleep=0.0):
+    """
+    Cifra com a chave principal os campos do histórico (``changes`` e
+    ``snapshot``) gravados com outra chave ou em texto puro, em lotes por ordem
+    de ID com as linhas travadas. Retorna (linhas lidas, valores regravados).
+    """
+    scanned = rewritten = 0
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            queryset = MedicalRecordHistory.objects.order_by('pk').only('pk', 'changes', 'snapshot')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            if not dry_run:
+                queryset = queryset.select_for_update()
+            rows = list(queryset[:batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+            scanned += len(rows)
+
+            stale = []
+            for history in rows:
+                count = 0
+                history.changes, changed = _reseal(history.changes or {}, primary_id)
+                count += changed
+                if history.snapshot is not None:
+                    history.snapshot, changed = _reseal(history.snapshot, primary_id)
+                    count += changed
+                if count:
+                    rewritten += count
+                    stale.append(history)
+            if stale and not dry_run:
+                MedicalRecordHistory.objects.bulk_update(stale, ['changes', 'snapshot'])
+        if sleep:
+            time.sleep(sleep)
+    return scanned, rewritten
@@ -1,19 +1,41 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.views.generic import CreateView, UpdateView, DetailView, ListView
+from django.core.exceptions import PermissionDenied
+from django.views.generic import CreateView, DeleteView, UpdateView, DetailView, ListView, TemplateView
 from django.shortcuts import get_object_or_404, redirect
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.db import transaction
-from accounts.utils import log_access
-from datetime import datetime
-import os
+from django.db.models import Prefetch
+from accounts.utils import AUTOCOMPLETE_LIMIT, get_autocomplete_term, log_access
+from accounts.idempotency import IdempotentPostMixin
+from accounts.jobs import enqueue
+from accounts.storage import IMMUTABLE_CACHE_CONTROL
 from django.conf import settings
-from django.http import Http404
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, JsonResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
 from django.views import View
+from datetime import datetime, time, timedelta
+from urllib.parse import quote
+import json
+import mimetypes
+import os
 
-from .models import MedicalRecord, Prescription, Exam
-from .forms import MedicalRecordForm, PrescriptionForm, ExamForm
-from .utils import generate_prescription_pdf
+from .models import (
+    MedicalRecord, MedicalRecordComment, MedicalRecordHistory, Prescription, PrescriptionTemplate, Exam, ExamResultPreview,
+    ExamUpload
+)
+from .forms import MedicalRecordFilterForm, MedicalRecordForm, PrescriptionForm, PrescriptionTemplateForm, ExamForm
+from .analytes import ingest_values
+from .prescription_checks import check_prescription
+from .prescription_templates import favorite_templates, record_template_use, search_templates
+from .search import search_records
+from .uploads import ChunkRejected, start_upload, write_chunk
+from .cid10 import get_index as get_cid10_index
+from .utils import RECORD_LIST_DEFERRED, comments_page, exams_visible_to, records_page, records_visible_to
+from .versioning import (
+    conflicting_fields, reconstruct_version, record_state, record_version, submitted_state, version_diffs
+)
 from accounts.models import DoctorProfile
 from patients.models import Patient
 from appointments.models import Appointment
@@ -26,41 +48,102 @@ class DoctorRequiredMixin(UserPassesTestMixin):
 
 
 class MedicalRecordDetailView(LoginRequiredMixin, DetailView):
-    """Visualização detalhada de um prontuário médico."""
+    """
+    Visualização detalhada de um prontuário médico.
+    O prontuário vem em uma consulta (com paciente, médico e consulta) e cada
+    lista da página em uma consulta de prefetch, incluindo os autores dos
+    comentários e do histórico.
+    """
     model = MedicalRecord
     template_name = 'medical_records/medical_record_detail.html'
     context_object_name = 'record'
 
+    def get_queryset(self):
+        queryset = (
+            MedicalRecord.objects
+            .select_related('patient__user', 'doctor__user', 'appointment')
+            .prefetch_related(
+                Prefetch('prescriptions', queryset=Prescription.objects.order_by('-created_at')),
+                Prefetch('exams', queryset=Exam.objects.order_by('-requested_date')),
+                Prefetch('history', queryset=MedicalRecordHistory.objects.select_related('user')),
+            )
+        )
+        # Mesma regra do histórico e da listagem: paciente vê os próprios prontuários,
+        # médico os que criou e os dos pacientes que atendeu
+        return records_visible_to(self.request.user, queryset)
+
     def get_object(self, queryset=None):
         record = super().get_object(queryset)
-        user = self.request.user
-        
-        # Registrar log de acesso
         log_access(self.request, 'view_record', f'Visualizou o prontuário do paciente {record.patient.user.get_full_name()} (ID: {record.pk})')
-        
-        # Paciente só pode ver seu próprio prontuário
-        if user.is_patient() and record.patient.user != user:
-            raise Http404("Acesso negado.")
-        
-        # Médico só pode ver prontuários de seus pacientes ou que ele criou
-        if user.is_doctor() and record.doctor.user != user.doctor_profile:
-            # Poderia ser mais complexo, mas por enquanto, apenas o médico criador
-            # ou o médico do paciente (se for o caso)
-            # Para simplificar, vamos permitir que o médico veja todos os prontuários
-            # de seus pacientes. A lógica de "seus pacientes" deve ser implementada
-            # em outro lugar (ex: PatientDetailView)
-            pass
-        
         return record
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['prescriptions'] = context['record'].prescriptions.all()
-        context['exams'] = context['record'].exams.all()
-        context['comments'] = context['record'].comments.all()
+        record = context['record']
+        context['prescriptions'] = record.prescriptions.all()
+        context['exams'] = record.exams.all()
+        # Prontuários de UTI acumulam centenas de comentários: só a primeira página
+        context['comments'], context['comments_next_cursor'] = comments_page(
+            record.comments.select_related('author'), limit=COMMENTS_PAGE_SIZE
+        )
         return context
 
 
+COMMENTS_PAGE_SIZE = 20
+MAX_COMMENTS_PAGE_SIZE = 100
+
+
+def comment_data(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.get_full_name() or comment.author.username,
+        'comment': comment.comment,
+        'created_at': comment.created_at.isoformat(),
+    }
+
+
+class MedicalRecordCommentsView(LoginRequiredMixin, View):
+    """
+    API JSON dos comentários (adendos) de um prontuário.
+    GET: página em ordem cronológica (?cursor=&limit=) e o total do prontuário.
+    POST (médicos e administradores), corpo JSON {"comment"}: adiciona um
+    comentário, também em prontuário fechado.
+    """
+
+    def get_record(self, request, pk):
+        return get_object_or_404(records_visible_to(request.user).only('pk', 'comment_count'), pk=pk)
+
+    def get(self, request, pk):
+        record = self.get_record(request, pk)
+        try:
+            limit = min(max(int(request.GET.get('limit', COMMENTS_PAGE_SIZE)), 1), MAX_COMMENTS_PAGE_SIZE)
+            comments, next_cursor = comments_page(
+                MedicalRecordComment.objects.filter(medical_record=record).select_related('author'),
+                request.GET.get('cursor'), limit,
+            )
+        except ValueError as exc:
+            return JsonResponse({'error': str(exc) or 'Parâmetros inválidos.'}, status=400)
+        return JsonResponse({
+            'count': record.comment_count,
+            'results': [comment_data(comment) for comment in comments],
+            'next_cursor': next_cursor,
+        })
+
+    def post(self, request, pk):
+        if not (request.user.is_doctor() or request.user.is_admin()):
+            raise PermissionDenied
+        record = self.get_record(request, pk)
+        try:
+            text = str(json.loads(request.body)['comment']).strip()
+        except (ValueError, KeyError, TypeError):
+            text = ''
+        if not text:
+            return JsonResponse({'error': 'Informe o comentário.'}, status=400)
+        comment = record.add_comment(request.user, text)
+        log_access(request, 'update_record', f'Adicionou comentário ao prontuário ID {record.pk}.')
+        return JsonResponse({**comment_data(comment), 'count': record.comment_count}, status=201)
+
+
 class MedicalRecordCreateUpdateMixin(DoctorRequiredMixin, LoginRequiredMixin):
     """Mixin para criação e atualização de prontuários."""
     model = MedicalRecord
@@ -83,18 +166,26 @@ class MedicalRecordCreateUpdateMixin(DoctorRequiredMixin, LoginRequiredMixin):
             
             # 2. Salvar o prontuário
             is_new = form.instance.pk is None
-            response = super().form_valid(form)
+            if is_new:
+                response = super().form_valid(form)
+            else:
+                # UPDATE condicional: falha se outra edição gravou depois que o formulário foi aberto
+                self.object = form.save(commit=False)
+                expected = form.cleaned_data.get('version') or self.object.version
+                fields = [field.name for field in MedicalRecord._meta.concrete_fields if field.editable and field.name in form.fields]
+                if not self.object.update_if_current(expected, fields):
+                    return self.render_conflict(form)
+                form.save_m2m()
+                response = HttpResponseRedirect(self.get_success_url())
             
             # 2.5. Registrar log de acesso
             action_log = 'create_record' if is_new else 'update_record'
             log_access(self.request, action_log, f'Prontuário do paciente {patient.user.get_full_name()} (ID: {self.object.pk}) {action_log}d.')
             
-            # 3. Criar histórico (Audit Trail)
+            # 3. Criar histórico (Audit Trail) com os campos alterados
             action = 'created' if is_new else 'updated'
-            self.object.history.create(
-                medical_record=self.object,
-                user=self.request.user,
-                action=action,
+            record_version(
+                self.object, self.request.user, action,
                 description=f"Prontuário {action} pelo Dr(a). {doctor.user.get_full_name()}"
             )
             
@@ -106,6 +197,25 @@ class MedicalRecordCreateUpdateMixin(DoctorRequiredMixin, LoginRequiredMixin):
             messages.success(self.request, f'Prontuário {action} com sucesso!')
             return response
 
+    def render_conflict(self, form):
+        """
+        Tela de conflito: mostra os campos em que a versão gravada difere da
+        enviada e reapresenta o formulário com os dados do usuário, já na
+        versão atual (gravar novamente sobrescreve a outra edição).
+        """
+        current = MedicalRecord.objects.get(pk=self.object.pk)
+        conflicts = conflicting_fields(record_state(current), submitted_state(form.cleaned_data))
+        data = form.data.copy()
+        data['version'] = current.version
+        self.object = current
+        conflict_form = self.get_form_class()(data=data, instance=current)
+        last_change = current.history.filter(version__isnull=False).select_related('user').order_by('-version').first()
+        log_access(self.request, 'update_record', f'Conflito de edição no prontuário (ID: {current.pk}, versão {current.version}).')
+        return self.render_to_response(
+            self.get_context_data(form=conflict_form, conflicts=conflicts, last_change=last_change),
+            status=409
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # Se for uma atualização, o objeto já está no contexto
@@ -168,14 +278,124 @@ from django.views.generic import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from .models import MedicalRecord
 
+class MedicalRecordSearchView(LoginRequiredMixin, TemplateView):
+    """Busca textual nos prontuários visíveis ao usuário."""
+    template_name = 'medical_records/medical_record_search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        context['query'] = query
+        context['results'] = search_records(self.request.user, query) if query else []
+        if query:
+            log_access(self.request, 'view_record', f'Buscou nos prontuários: "{query[:100]}" ({len(context["results"])} resultados)')
+        return context
+
+
+class MedicalRecordHistoryView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+    """
+    Auditoria das versões do prontuário: para cada alteração, os campos
+    modificados com o valor anterior e o novo (admin e médicos com acesso).
+    """
+    model = MedicalRecord
+    template_name = 'medical_records/medical_record_history.html'
+    context_object_name = 'record'
+
+    def test_func(self):
+        user = self.request.user
+        return user.is_admin() or user.is_doctor()
+
+    def get_queryset(self):
+        return records_visible_to(self.request.user).select_related('patient__user')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['versions'] = list(reversed(version_diffs(self.object)))
+        log_access(self.request, 'view_record', f'Consultou o histórico de versões do prontuário (ID: {self.object.pk})')
+        return context
+
+
+class MedicalRecordVersionView(MedicalRecordHistoryView):
+    """API JSON com o estado completo do prontuário em uma versão."""
+
+    def get(self, request, *args, **kwargs):
+        record = self.get_object()
+        state = reconstruct_version(record, kwargs['version'])
+        if state is None:
+            raise Http404("Versão não encontrada.")
+        log_access(request, 'view_record', f'Consultou a versão {kwargs["version"]} do prontuário (ID: {record.pk})')
+        return JsonResponse({'id': record.pk, 'version': kwargs['version'], 'fields': state})
+
+
+class Cid10AutocompleteView(LoginRequiredMixin, View):
+    """
+    API JSON de autocomplete de códigos CID-10 por prefixo do código ou de
+    palavras da descrição (sem acentos). Usa o índice em memória do processo.
+    """
+
+    def get(self, request):
+        term = get_autocomplete_term(request)
+        if term is None:
+            return JsonResponse({'results': []})
+        results = [
+            {'id': pk, 'text': f'{code} - {description}'}
+            for pk, code, description in get_cid10_index().search(term, AUTOCOMPLETE_LIMIT)
+        ]
+        return JsonResponse({'results': results})
+
+
 class MedicalRecordListView(LoginRequiredMixin, ListView):
+    """
+    Lista de prontuários visíveis ao usuário, com filtros e paginação por
+    cursor. Sem filtro de paciente, o médico vê os prontuários que criou.
+    """
     model = MedicalRecord
     template_name = 'medical_records/medical_record_list.html'
     context_object_name = 'records'
+    page_size = 20
 
+    def get_filter_form(self):
+        return MedicalRecordFilterForm(self.request.GET or None, user=self.request.user)
 
+    def get_queryset(self):
+        user = self.request.user
+        self.filter_form = self.get_filter_form()
+        filters = self.filter_form.cleaned_data if self.filter_form.is_valid() else {}
+
+        queryset = records_visible_to(user)
+        if filters.get('patient'):
+            queryset = queryset.filter(patient=filters['patient'])
+        elif user.is_doctor():
+            queryset = queryset.filter(doctor=user.doctor_profile)
+        if filters.get('date_from'):
+            start = timezone.make_aware(datetime.combine(filters['date_from'], time.min))
+            queryset = queryset.filter(created_at__gte=start)
+        if filters.get('date_to'):
+            end = timezone.make_aware(datetime.combine(filters['date_to'] + timedelta(days=1), time.min))
+            queryset = queryset.filter(created_at__lt=end)
+        if filters.get('status'):
+            queryset = queryset.filter(is_closed=filters['status'] == 'closed')
+        return queryset.select_related('patient__user', 'doctor__user', 'appointment').defer(*RECORD_LIST_DEFERRED)
 
-class PrescriptionCreateView(DoctorRequiredMixin, LoginRequiredMixin, CreateView):
+    def get_context_data(self, **kwargs):
+        try:
+            records, next_cursor = records_page(self.object_list, self.request.GET.get('cursor'), self.page_size)
+        except ValueError:
+            records, next_cursor = records_page(self.object_list, None, self.page_size)
+        params = self.request.GET.copy()
+        params.pop('cursor', None)
+        kwargs.update({
+            'object_list': records,
+            'next_cursor': next_cursor,
+            'filter_form': self.filter_form,
+            'filter_query': params.urlencode(),
+            'is_first_page': not self.request.GET.get('cursor'),
+        })
+        return super().get_context_data(**kwargs)
+
+
+
+class PrescriptionCreateView(DoctorRequiredMixin, LoginRequiredMixin, IdempotentPostMixin, CreateView):
     """Criação de Receita Médica."""
     model = Prescription
     form_class = PrescriptionForm
@@ -184,42 +404,319 @@ class PrescriptionCreateView(DoctorRequiredMixin, LoginRequiredMixin, CreateView
     def get_success_url(self):
         return reverse_lazy('medical_records:record_detail', kwargs={'pk': self.kwargs['record_pk']})
 
+    def get_medical_record(self):
+        if not hasattr(self, 'medical_record'):
+            self.medical_record = get_object_or_404(
+                MedicalRecord.objects.select_related('patient__user', 'doctor__user'), pk=self.kwargs['record_pk']
+            )
+        return self.medical_record
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['patient'] = self.get_medical_record().patient
+        kwargs['doctor'] = self.request.user.doctor_profile
+        return kwargs
+
     def form_valid(self, form):
-        medical_record = get_object_or_404(MedicalRecord, pk=self.kwargs['record_pk'])
+        medical_record = self.get_medical_record()
         
         form.instance.medical_record = medical_record
         form.instance.patient = medical_record.patient
         form.instance.doctor = self.request.user.doctor_profile
         
-        response = super().form_valid(form)
-        messages.success(self.request, 'Receita criada com sucesso!')
-        
-        # Geração do PDF da receita
-        prescription = form.instance
-        file_name = f"receita_{prescription.pk}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-        
-        # Registrar log de acesso
-        log_access(self.request, 'generate_pdf', f'Gerou PDF de Receita para o paciente {medical_record.patient.user.get_full_name()} (ID: {medical_record.pk}).')
-        file_path = os.path.join(settings.MEDIA_ROOT, 'prescriptions', file_name)
-        
-        # Garante que o diretório MEDIA_ROOT/prescriptions exista
-        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'prescriptions'), exist_ok=True)
-        
-        generate_prescription_pdf(prescription, file_path)
-        
-        # Salva o caminho do arquivo no modelo
-        prescription.prescription_file.name = os.path.join('prescriptions', file_name)
-        prescription.save()
-        
+        # O PDF é gerado pelo worker (run_jobs); a tarefa só é enfileirada
+        # junto com a receita, na mesma transação.
+        with transaction.atomic():
+            response = super().form_valid(form)
+            enqueue('medical_records.tasks.render_prescription_pdf', prescription_id=form.instance.pk)
+            if form.cleaned_data.get('template'):
+                record_template_use(form.cleaned_data['template'])
+
+        log_access(self.request, 'generate_pdf', f'Solicitou PDF de Receita para o paciente {medical_record.patient.user.get_full_name()} (ID: {medical_record.pk}).')
+        messages.success(self.request, 'Receita criada com sucesso! O PDF está em geração e ficará disponível em instantes.')
         return response
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['medical_record'] = get_object_or_404(MedicalRecord, pk=self.kwargs['record_pk'])
+        context['medical_record'] = self.get_medical_record()
+        context['favorite_templates'] = favorite_templates(self.request.user.doctor_profile.pk)
         return context
 
 
-class ExamCreateView(DoctorRequiredMixin, LoginRequiredMixin, CreateView):
+class PrescriptionTemplateMixin(DoctorRequiredMixin, LoginRequiredMixin):
+    """Receitas favoritas do médico logado."""
+    model = PrescriptionTemplate
+    success_url = reverse_lazy('medical_records:prescription_template_list')
+
+    def get_queryset(self):
+        return PrescriptionTemplate.objects.filter(doctor=self.request.user.doctor_profile)
+
+
+class PrescriptionTemplateListView(PrescriptionTemplateMixin, ListView):
+    """Lista das receitas favoritas do médico, das mais usadas às menos usadas."""
+    template_name = 'medical_records/prescription_template_list.html'
+    context_object_name = 'templates'
+    paginate_by = 30
+
+
+class PrescriptionTemplateFormMixin(PrescriptionTemplateMixin):
+    form_class = PrescriptionTemplateForm
+    template_name = 'medical_records/prescription_template_form.html'
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['doctor'] = self.request.user.doctor_profile
+        return kwargs
+
+
+class PrescriptionTemplateCreateView(PrescriptionTemplateFormMixin, CreateView):
+    """Criação de Receita Favorita."""
+
+    def get_initial(self):
+        # "Salvar como favorita" a partir de uma receita já emitida
+        initial = super().get_initial()
+        prescription_id = self.request.GET.get('prescription')
+        if prescription_id and prescription_id.isdigit():
+            prescription = (
+                Prescription.objects.filter(pk=prescription_id, doctor=self.request.user.doctor_profile)
+                .values('medications', 'instructions').first()
+            )
+            if prescription:
+                initial.update(prescription)
+        return initial
+
+    def form_valid(self, form):
+        form.instance.doctor = self.request.user.doctor_profile
+        messages.success(self.request, 'Receita favorita criada com sucesso!')
+        return super().form_valid(form)
+
+
+class PrescriptionTemplateUpdateView(PrescriptionTemplateFormMixin, UpdateView):
+    """Edição de Receita Favorita."""
+
+    def form_valid(self, form):
+        messages.success(self.request, 'Receita favorita atualizada com sucesso!')
+        return super().form_valid(form)
+
+
+class PrescriptionTemplateDeleteView(PrescriptionTemplateMixin, DeleteView):
+    """Exclusão de Receita Favorita (pelo botão da lista)."""
+    http_method_names = ['post']
+
+    def form_valid(self, form):
+        messages.success(self.request, 'Receita favorita excluída.')
+        return super().form_valid(form)
+
+
+class PrescriptionTemplateSearchView(DoctorRequiredMixin, LoginRequiredMixin, View):
+    """
+    API JSON de busca nas receitas favoritas do médico (nome e medicamentos).
+    Sem termo, retorna as mais usadas. A busca usa a lista em cache do médico.
+    """
+
+    def get(self, request):
+        doctor_id = request.user.doctor_profile.pk
+        term = request.GET.get('q', '')
+        return JsonResponse({'results': search_templates(doctor_id, term, AUTOCOMPLETE_LIMIT)})
+
+
+class PrescriptionCheckView(DoctorRequiredMixin, LoginRequiredMixin, View):
+    """Alertas de alergia e duplicidade para o texto da receita (validação enquanto o médico digita)."""
+    def post(self, request, record_pk):
+        patient_id = get_object_or_404(
+            records_visible_to(request.user).values_list('patient_id', flat=True), pk=record_pk
+        )
+        warnings = check_prescription(patient_id, request.POST.get('medications', ''))
+        return JsonResponse({'warnings': warnings})
+
+
+class PrescriptionStatusView(LoginRequiredMixin, View):
+    """Situação da geração do PDF de uma receita (consultada pela página do prontuário)."""
+    def get(self, request, pk):
+        prescription = get_object_or_404(
+            Prescription.objects.select_related('doctor', 'patient'), pk=pk
+        )
+        user = request.user
+        allowed = (
+            user.is_admin()
+            or (user.is_doctor() and prescription.doctor.user_id == user.pk)
+            or (user.is_patient() and prescription.patient.user_id == user.pk)
+        )
+        if not allowed:
+            raise Http404
+
+        file_url = None
+        if prescription.prescription_file:
+            file_url = reverse('medical_records:prescription_file', kwargs={'pk': prescription.pk})
+        return JsonResponse({
+            'id': prescription.pk,
+            'status': prescription.pdf_status,
+            'file_url': file_url,
+        })
+
+
+class ProtectedFileView(LoginRequiredMixin, View):
+    """
+    Download de arquivo clínico com controle de acesso e registro no AccessLog.
+
+    Com PROTECTED_MEDIA_ACCEL_PREFIX configurado, a resposta leva apenas o
+    cabeçalho X-Accel-Redirect e o nginx envia o arquivo (location internal),
+    liberando o worker imediatamente. Sem ele (desenvolvimento), o arquivo é
+    enviado com FileResponse, que usa o sendfile do servidor WSGI quando disponível.
+    """
+    model = None
+    file_field = None
+
+    def get_queryset(self):
+        return self.model.objects.select_related('patient__user', 'doctor__user')
+
+    def has_permission(self, obj):
+        # Mesma regra de records_visible_to: o médico precisa ter emitido o
+        # documento ou atendido o paciente
+        user = self.request.user
+        if user.is_admin():
+            return True
+        if user.is_doctor():
+            doctor = user.doctor_profile
+            return obj.doctor_id == doctor.pk or Appointment.objects.filter(
+                patient_id=obj.patient_id, doctor=doctor
+            ).exists()
+        return user.is_patient() and obj.patient.user_id == user.pk
+
+    def get_download_name(self, obj, field_file):
+        return os.path.basename(field_file.name)
+
+    def get(self, request, pk):
+        obj = get_object_or_404(self.get_queryset(), pk=pk)
+        field_file = getattr(obj, self.file_field)
+        if not self.has_permission(obj) or not field_file:
+            raise Http404
+
+        log_access(request, 'download_file', f'Baixou {self.model._meta.verbose_name} do paciente {obj.patient.user.get_full_name()} (ID: {obj.pk})')
+
+        etag = field_file.storage.etag(field_file.name)
+        if etag and etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        elif settings.PROTECTED_MEDIA_ACCEL_PREFIX:
+            response = HttpResponse(content_type=mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream')
+            response['X-Accel-Redirect'] = settings.PROTECTED_MEDIA_ACCEL_PREFIX + quote(field_file.name)
+        else:
+            try:
+                response = FileResponse(field_file.open('rb'))
+            except FileNotFoundError:
+                raise Http404
+        response['Content-Disposition'] = content_disposition_header(False, self.get_download_name(obj, field_file))
+        if etag:
+            response['ETag'] = etag
+            response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class PrescriptionFileView(ProtectedFileView):
+    """Download do PDF da receita."""
+    model = Prescription
+    file_field = 'prescription_file'
+
+    def get_download_name(self, obj, field_file):
+        return f'receita_{obj.pk}.pdf'
+
+
+class ExamResultFileView(ProtectedFileView):
+    """Download do arquivo de resultado do exame."""
+    model = Exam
+    file_field = 'result_file'
+
+    def get_download_name(self, obj, field_file):
+        return f'exame_{obj.pk}{os.path.splitext(field_file.name)[1]}'
+
+
+class ExamPreviewFileView(ProtectedFileView):
+    """Imagem de pré-visualização do resultado do exame."""
+    model = ExamResultPreview
+    file_field = 'image'
+
+    def get_queryset(self):
+        return self.model.objects.select_related('exam__patient__user')
+
+    def get_download_name(self, obj, field_file):
+        return f'exame_{obj.exam_id}_pagina_{obj.page}.jpg'
+
+
+class ExamUploadCreateView(DoctorRequiredMixin, LoginRequiredMixin, View):
+    """
+    Inicia o envio em partes do resultado de um exame.
+    Corpo JSON: {"filename", "size", "sha256" (opcional)}.
+    """
+
+    def post(self, request, pk):
+        exam = get_object_or_404(exams_visible_to(request.user), pk=pk)
+        try:
+            data = json.loads(request.body)
+            upload = start_upload(
+                exam, request.user, str(data['filename']), int(data['size']), data.get('sha256', '')
+            )
+        except (ValueError, KeyError, TypeError) as exc:
+            return JsonResponse({'error': str(exc) or 'Dados inválidos.'}, status=400)
+        log_access(request, 'update_record', f'Iniciou o envio do resultado do exame {exam.exam_name} (ID: {exam.pk}).')
+        return JsonResponse(upload_status(upload), status=201)
+
+
+class ExamResultValuesView(DoctorRequiredMixin, LoginRequiredMixin, View):
+    """
+    Grava em lote os valores numéricos do resultado do exame.
+    Corpo JSON: {"values": [{"analyte", "value", "unit", "reference_low",
+    "reference_high", "collected_at"}, ...]}. Reenviar um analito atualiza o valor.
+    """
+
+    def post(self, request, pk):
+        exam = get_object_or_404(exams_visible_to(request.user), pk=pk)
+        try:
+            rows = json.loads(request.body)['values']
+            if not isinstance(rows, list):
+                raise ValueError('O campo "values" deve ser uma lista.')
+            saved = ingest_values(exam, rows)
+        except (ValueError, KeyError, TypeError) as exc:
+            return JsonResponse({'error': str(exc) or 'Dados inválidos.'}, status=400)
+        log_access(request, 'update_record', f'Registrou {saved} valores do exame {exam.exam_name} (ID: {exam.pk}).')
+        return JsonResponse({'saved': saved}, status=201)
+
+
+class ExamUploadView(DoctorRequiredMixin, LoginRequiredMixin, View):
+    """
+    Situação do envio (GET, para retomar) e recebimento das partes (PUT com
+    Content-Range e X-Chunk-SHA256; o corpo é a parte em bytes).
+    """
+
+    def get_upload(self, upload_id):
+        return get_object_or_404(ExamUpload, pk=upload_id, uploaded_by=self.request.user)
+
+    def get(self, request, upload_id):
+        return JsonResponse(upload_status(self.get_upload(upload_id)))
+
+    def put(self, request, upload_id):
+        upload = self.get_upload(upload_id)
+        try:
+            write_chunk(upload, request.headers.get('Content-Range'), request.headers.get('X-Chunk-SHA256'), request)
+        except ChunkRejected as exc:
+            offset = upload.received_bytes if exc.offset is None else exc.offset
+            return JsonResponse({'error': str(exc), 'offset': offset}, status=exc.status)
+        return JsonResponse(upload_status(upload))
+
+
+def upload_status(upload):
+    return {
+        'id': str(upload.pk),
+        'status': upload.status,
+        'offset': upload.received_bytes,
+        'size': upload.total_size,
+        'chunk_size': upload.chunk_size,
+        'error': upload.error,
+    }
+
+
+class ExamCreateView(DoctorRequiredMixin, LoginRequiredMixin, IdempotentPostMixin, CreateView):
     """Solicitação de Exame."""
     model = Exam
     form_class = ExamForm
@@ -0,0 +1,59 @@
+"""
+Funções executadas pelos workers de ProcessPoolExecutor (comando
+rerender_prescriptions, pré-visualizações dos resultados de exames e leitura
+dos arquivos HL7 do comando import_hl7).
+
+Este módulo não importa modelos no carregamento: os workers criados com
+"spawn" o importam antes de o Django estar configurado.
+"""
+
+import django
+
+
+def init_render_worker():
+    """Inicializa o Django no worker."""
+    django.setup()
+
+
+def render_prescription_item(item):
+    """Gera o PDF de (receita, MEDIA_ROOT) em um temporário e retorna (id, caminho, erro)."""
+    from .utils import render_prescription_to_temp
+
+    prescription, media_root = item
+    try:
+        temp_path = render_prescription_to_temp(prescription, media_root)
+    except Exception as exc:
+        return prescription.pk, None, f'{type(exc).__name__}: {exc}'
+    return prescription.pk, temp_path, None
+
+
+def render_preview_page(item):
+    """
+    Gera a imagem JPEG de uma página de (arquivo, página, tamanho máximo, destino)
+    e retorna (largura, altura). Usa apenas o Pillow, sem acessar o banco.
+    """
+    from PIL import Image
+
+    source, page, size, output = item
+    with Image.open(source) as image:
+        image.seek(page)
+        # Em JPEG, decodifica já reduzido (bem mais rápido para imagens grandes)
+        image.draft('RGB', (size, size))
+        frame = image.convert('RGB')
+    frame.thumbnail((size, size))
+    frame.save(output, 'JPEG', quality=85, optimize=True)
+    return frame.size
+
+
+def parse_hl7_item(item):
+    """Lê o arquivo HL7 de (caminho, codificação) e retorna (caminho, resultados, erro)."""
+    from .hl7 import Hl7Error, parse_file
+
+    path, encoding = item
+    try:
+        return path, parse_file(path, encoding), None
+    except (Hl7Error, OSError, UnicodeDecodeError) as exc:
+        return path, None, str(exc)
+    except Exception as exc:
+        # Qualquer outro erro de leitura põe o arquivo em quarentena sem interromper a importação
+        return path, None, f'{type(exc).__name__}: {exc}'
@@ -3,7 +3,7 @@ Configuração do Django Admin para o app patients.
 """
 
 from django.contrib import admin
-from .models import Patient, Allergy, Vaccine, Medication
+from .models import Patient, PatientDataExport, Allergy, Vaccine, Medication
 
 
 @admin.register(Patient)
@@ -38,3 +38,10 @@ class MedicationAdmin(admin.ModelAdmin):
     search_fields = ['patient__user__first_name', 'patient__user__last_name', 'name']
     raw_id_fields = ['patient', 'prescribed_by']
     date_hierarchy = 'start_date'
+
+
+@admin.register(PatientDataExport)
+class PatientDataExportAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'status', 'size', 'created_at', 'expires_at']
+    list_filter = ['status']
+    raw_id_fields = ['patient', 'requested_by']
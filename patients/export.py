@@ -0,0 +1,154 @@
+"""
+Exportação dos dados do paciente (portabilidade, LGPD).
+
+O ZIP é escrito em streaming: cada tabela é lida com ``iterator()`` e
+gravada linha a linha como um vetor JSON dentro do ZIP, e os arquivos de
+receitas e exames são copiados em blocos. A memória usada não depende do
+tamanho do histórico. O ZIP é montado em um temporário do armazenamento de
+arquivos clínicos e depois movido para ele (rename, sem cópia).
+"""
+
+import io
+import json
+import os
+import shutil
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.storage import CHUNK_SIZE, clean_extension, clinical_file_storage, new_temp_path
+from appointments.models import Appointment
+from medical_records.models import Exam, ExamResultValue, MedicalRecord, Prescription
+
+from .models import Allergy, Medication, PatientDataExport, Vaccine
+
+USER_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'email', 'cpf', 'user_type', 'phone',
+    'birth_date', 'address', 'city', 'state', 'zip_code', 'date_joined', 'last_login',
+)
+
+
+def _fields(model, exclude=()):
+    return [field.attname for field in model._meta.concrete_fields if field.name not in exclude]
+
+
+def _rows(model, queryset, exclude=()):
+    return queryset.order_by('pk').values(*_fields(model, exclude))
+
+
+def export_tables(patient):
+    """Pares (nome do arquivo, consulta) com os dados do paciente, em ordem de ID."""
+    diagnosis_codes = (
+        MedicalRecord.diagnosis_codes.through.objects
+        .filter(medicalrecord__patient=patient)
+        .order_by('medicalrecord_id', 'cid10code__code')
+        .values('medicalrecord_id', code=F('cid10code__code'), description=F('cid10code__description'))
+    )
+    return [
+        ('alergias.json', _rows(Allergy, Allergy.objects.filter(patient=patient))),
+        ('vacinas.json', _rows(Vaccine, Vaccine.objects.filter(patient=patient))),
+        ('medicamentos.json', _rows(Medication, Medication.objects.filter(patient=patient))),
+        ('consultas.json', _rows(Appointment, Appointment.objects.filter(patient=patient))),
+        ('prontuarios.json', _rows(MedicalRecord, MedicalRecord.objects.filter(patient=patient), exclude=('version',))),
+        ('prontuarios_cid10.json', diagnosis_codes),
+        ('receitas.json', _rows(Prescription, Prescription.objects.filter(patient=patient))),
+        ('exames.json', _rows(Exam, Exam.objects.filter(patient=patient))),
+        ('exames_valores.json', _rows(ExamResultValue, ExamResultValue.objects.filter(patient=patient))),
+    ]
+
+
+def export_files(patient):
+    """Arquivos referenciados: (caminho no ZIP, nome no armazenamento)."""
+    prescriptions = (
+        Prescription.objects.filter(patient=patient).exclude(prescription_file='')
+        .order_by('pk').values_list('pk', 'prescription_file')
+    )
+    for pk, name in prescriptions.iterator():
+        yield f'arquivos/receitas/receita_{pk}{clean_extension(name)}', name
+    exams = (
+        Exam.objects.filter(patient=patient).exclude(result_file='')
+        .order_by('pk').values_list('pk', 'result_file')
+    )
+    for pk, name in exams.iterator():
+        yield f'arquivos/exames/exame_{pk}{clean_extension(name)}', name
+
+
+def write_json_array(archive, name, rows):
+    """Grava as linhas como vetor JSON, uma por vez, sem montar a lista em memória."""
+    count = 0
+    with archive.open(name, 'w', force_zip64=True) as raw:
+        with io.TextIOWrapper(raw, encoding='utf-8') as output:
+            output.write('[')
+            for row in rows:
+                output.write(',\n' if count else '\n')
+                output.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+                count += 1
+            output.write('\n]\n')
+    return count
+
+
+def write_json(archive, name, data):
+    archive.writestr(name, json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2))
+
+
+def write_export(patient, output):
+    """Escreve o ZIP com os dados do paciente em ``output`` (arquivo aberto para escrita)."""
+    storage = clinical_file_storage()
+    user = patient.user
+    manifest = {
+        'gerado_em': timezone.now(),
+        'paciente': user.get_full_name(),
+        'tabelas': {},
+        'arquivos': 0,
+        'arquivos_ausentes': [],
+    }
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        write_json(archive, 'dados/usuario.json', {
+            field: getattr(user, field) for field in USER_FIELDS
+        })
+        write_json(archive, 'dados/paciente.json', {
+            field: getattr(patient, field) for field in _fields(type(patient))
+        })
+        for name, rows in export_tables(patient):
+            manifest['tabelas'][name] = write_json_array(archive, f'dados/{name}', rows.iterator())
+
+        for archive_name, name in export_files(patient):
+            try:
+                source = storage.open(name, 'rb')
+            except FileNotFoundError:
+                manifest['arquivos_ausentes'].append(archive_name)
+                continue
+            # PDFs e imagens já são comprimidos
+            info = zipfile.ZipInfo(archive_name, date_time=timezone.localtime().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with source, archive.open(info, 'w', force_zip64=True) as target:
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+            manifest['arquivos'] += 1
+
+        write_json(archive, 'manifesto.json', manifest)
+    return manifest
+
+
+def build_export(export):
+    """Gera o ZIP da exportação e o grava no armazenamento de arquivos clínicos."""
+    storage = clinical_file_storage()
+    temp_path = new_temp_path(storage.location, suffix='.zip')
+    try:
+        with open(temp_path, 'wb') as output:
+            write_export(export.patient, output)
+        size = os.path.getsize(temp_path)
+        name = storage.adopt(temp_path, '.zip')
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    now = timezone.now()
+    PatientDataExport.objects.filter(pk=export.pk).update(
+        status='ready', file=name, size=size, finished_at=now,
+        expires_at=now + timedelta(days=settings.DATA_EXPORT_RETENTION_DAYS),
+    )
+    return name
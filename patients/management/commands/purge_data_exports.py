@@ -0,0 +1,17 @@
+"""
+Comando para remover as exportações de dados de pacientes expiradas.
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from patients.models import PatientDataExport
+
+
+class Command(BaseCommand):
+    help = 'Remove as exportações de dados de pacientes cujo prazo de download terminou'
+
+    def handle(self, *args, **options):
+        # A exclusão libera a referência ao ZIP; o arquivo é apagado pelo gc_blobs
+        deleted = PatientDataExport.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'✓ {deleted} exportações expiradas removidas'))
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='allergy',
+            index=models.Index(fields=['patient', 'created_at'], name='allergy_patient_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['patient', 'start_date'], name='medication_patient_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaccine',
+            index=models.Index(fields=['patient', 'application_date'], name='vaccine_patient_date_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:46
+
+import accounts.storage
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('patients', '0002_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientDataExport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Na fila'), ('running', 'Gerando'), ('ready', 'Disponível'), ('failed', 'Falhou')], default='pending', max_length=20, verbose_name='Status')),
+                ('file', models.FileField(blank=True, storage=accounts.storage.clinical_file_storage, upload_to='exports/', verbose_name='Arquivo')),
+                ('size', models.BigIntegerField(blank=True, null=True, verbose_name='Tamanho (bytes)')),
+                ('error', models.TextField(blank=True, verbose_name='Erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Solicitado em')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Concluído em')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Disponível até')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='data_exports', to='patients.patient', verbose_name='Paciente')),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='requested_data_exports', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Exportação de Dados do Paciente',
+                'verbose_name_plural': 'Exportações de Dados dos Pacientes',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
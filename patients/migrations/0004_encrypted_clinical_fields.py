@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:56
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0003_data_exports'),
+    ]
+
+    # A coluna continua do tipo texto: só o estado do modelo muda (sem recriar
+    # a tabela). Os valores existentes são cifrados por rotate_encryption_keys.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='patient',
+                    name='medical_notes',
+                    field=accounts.fields.EncryptedTextField(blank=True, help_text='Informações médicas gerais do paciente', verbose_name='Observações Médicas'),
+                ),
+            ],
+        ),
+    ]
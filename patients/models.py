@@ -5,6 +5,9 @@ Modelos para o app de pacientes.
 from django.db import models
 from django.conf import settings
 
+from accounts.fields import EncryptedTextField
+from accounts.storage import clinical_file_storage
+
 
 class Patient(models.Model):
     """
@@ -64,7 +67,7 @@ class Patient(models.Model):
         blank=True
     )
     
-    medical_notes = models.TextField(
+    medical_notes = EncryptedTextField(
         'Observações Médicas',
         blank=True,
         help_text='Informações médicas gerais do paciente'
@@ -161,6 +164,9 @@ class Allergy(models.Model):
         verbose_name = 'Alergia'
         verbose_name_plural = 'Alergias'
         ordering = ['-severity', 'allergen']
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='allergy_patient_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.patient.user.get_full_name()} - {self.allergen}"
@@ -232,6 +238,9 @@ class Vaccine(models.Model):
         verbose_name = 'Vacina'
         verbose_name_plural = 'Vacinas'
         ordering = ['-application_date']
+        indexes = [
+            models.Index(fields=['patient', 'application_date'], name='vaccine_patient_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.dose} ({self.application_date.strftime('%d/%m/%Y')})"
@@ -304,6 +313,88 @@ class Medication(models.Model):
         verbose_name = 'Medicamento'
         verbose_name_plural = 'Medicamentos'
         ordering = ['-is_active', '-start_date']
+        indexes = [
+            models.Index(fields=['patient', 'start_date'], name='medication_patient_start_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.dosage} ({self.frequency})"
+
+
+class PatientDataExport(models.Model):
+    """
+    Cópia dos dados do paciente (portabilidade, LGPD art. 18): um ZIP com os
+    dados em JSON e os arquivos de receitas e exames, gerado em segundo plano.
+    """
+    
+    STATUS_CHOICES = (
+        ('pending', 'Na fila'),
+        ('running', 'Gerando'),
+        ('ready', 'Disponível'),
+        ('failed', 'Falhou'),
+    )
+    
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='data_exports',
+        verbose_name='Paciente'
+    )
+    
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='requested_data_exports',
+        verbose_name='Solicitado por'
+    )
+    
+    status = models.CharField(
+        'Status',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    
+    file = models.FileField(
+        'Arquivo',
+        upload_to='exports/',
+        storage=clinical_file_storage,
+        blank=True
+    )
+    
+    size = models.BigIntegerField(
+        'Tamanho (bytes)',
+        null=True,
+        blank=True
+    )
+    
+    error = models.TextField(
+        'Erro',
+        blank=True
+    )
+    
+    created_at = models.DateTimeField(
+        'Solicitado em',
+        auto_now_add=True
+    )
+    
+    finished_at = models.DateTimeField(
+        'Concluído em',
+        null=True,
+        blank=True
+    )
+    
+    expires_at = models.DateTimeField(
+        'Disponível até',
+        null=True,
+        blank=True
+    )
+    
+    class Meta:
+        verbose_name = 'Exportação de Dados do Paciente'
+        verbose_name_plural = 'Exportações de Dados dos Pacientes'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Exportação {self.pk} - {self.patient.user.get_full_name()} ({self.get_status_display()})"
@@ -0,0 +1,19 @@
+"""
+Tarefas em segundo plano do app patients (executadas pelo comando run_jobs).
+"""
+
+from .export import build_export
+from .models import PatientDataExport
+
+
+def build_patient_data_export(export_id):
+    """Gera o ZIP com os dados do paciente (portabilidade, LGPD)."""
+    export = PatientDataExport.objects.select_related('patient__user').get(pk=export_id)
+    if export.status == 'ready':
+        return
+    PatientDataExport.objects.filter(pk=export_id).update(status='running', error='')
+    try:
+        build_export(export)
+    except Exception as exc:
+        PatientDataExport.objects.filter(pk=export_id).update(status='failed', error=f'{type(exc).__name__}: {exc}')
+        raise
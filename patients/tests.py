@@ -2,9 +2,30 @@
 Testes para o app patients.
 """
 
+import io
+import json
+import zipfile
+from datetime import date, datetime, time, timedelta
+
 import pytest
 from django.contrib.auth import get_user_model
-from patients.models import Patient, Allergy
+from django.db import connection
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from accounts.jobs import run_pending_jobs
+from accounts.models import DoctorProfile
+from appointments.models import Appointment
+from medical_records.models import Exam, MedicalRecord, Prescription
+from patients.models import Patient, PatientDataExport, Allergy, Vaccine
+from patients.timeline import STREAMS, timeline_page
+from medical_records.analytes import ingest_values
+from patients.views import (
+    PatientAnalyteTrendView, PatientAutocompleteView, PatientDataExportFileView, PatientDataExportView, PatientTimelineView
+)
 
 User = get_user_model()
 
@@ -54,3 +75,183 @@ class TestAllergyModel:
         )
         assert allergy.allergen == 'Penicilina'
         assert allergy.severity == 'severe'
+
+
+@pytest.mark.django_db
+class TestPatientAutocomplete:
+    """Testes para o endpoint de autocomplete de pacientes."""
+
+    def _get(self, user, term):
+        request = RequestFactory().get('/patients/autocomplete/', {'q': term})
+        request.user = user
+        response = PatientAutocompleteView.as_view()(request)
+        return json.loads(response.content)['results']
+
+    def test_search_by_name_and_cpf_prefix(self):
+        """Testa busca por prefixo de nome e de CPF."""
+        attendant = User.objects.create_user(
+            username='att', password='x', cpf='999.999.999-99', user_type='attendant'
+        )
+        for username, first, cpf in [('p1', 'Ana', '123.456.789-00'), ('p2', 'Bruno', '987.654.321-00')]:
+            user = User.objects.create_user(
+                username=username, password='x', cpf=cpf, first_name=first,
+                last_name='Souza', user_type='patient'
+            )
+            Patient.objects.create(user=user)
+
+        assert [r['text'] for r in self._get(attendant, 'an')] == ['Ana Souza - CPF: 123.456.789-00']
+        assert len(self._get(attendant, 'souza')) == 2
+        assert self._get(attendant, '98765')[0]['text'].startswith('Bruno')
+        assert self._get(attendant, 'a') == []
+
+
+@pytest.mark.django_db
+class TestPatientTimeline:
+    """Testes para a linha do tempo clínica paginada por cursor."""
+
+    @pytest.fixture
+    def patient(self):
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doc', password='x', cpf='100.000.000-00', user_type='doctor'),
+            crm='1/SP', specialty='Clínica'
+        )
+        patient = Patient.objects.create(
+            user=User.objects.create_user(username='pac', password='x', cpf='200.000.000-00', user_type='patient')
+        )
+        start = date(2020, 1, 1)
+        for index in range(6):
+            day = start + timedelta(days=index * 30)
+            appointment = Appointment.objects.create(
+                patient=patient, doctor=doctor, scheduled_date=day, scheduled_time=time(8, index)
+            )
+            record = MedicalRecord.objects.create(
+                appointment=appointment, patient=patient, doctor=doctor,
+                chief_complaint='Retorno', diagnosis=f'Controle {index}'
+            )
+            moment = timezone.make_aware(datetime.combine(day, time(9)))
+            MedicalRecord.objects.filter(pk=record.pk).update(created_at=moment)
+            prescription = Prescription.objects.create(
+                medical_record=record, patient=patient, doctor=doctor, medications='Losartana'
+            )
+            # Receita no mesmo instante do prontuário: desempate por tipo
+            Prescription.objects.filter(pk=prescription.pk).update(created_at=moment)
+            exam = Exam.objects.create(patient=patient, doctor=doctor, exam_type='blood', exam_name='Hemograma')
+            Exam.objects.filter(pk=exam.pk).update(requested_date=day)
+            Vaccine.objects.create(patient=patient, name='Influenza', dose='Dose única', application_date=day)
+        return patient
+
+    def test_pages_cover_all_events_in_order(self, patient):
+        """Testa que as páginas intercalam os fluxos sem repetir nem perder eventos."""
+        events, cursor = timeline_page(patient, limit=100)
+        assert cursor is None
+        assert len(events) == 24
+        assert [event['type'] for event in events[:4]] == ['record', 'prescription', 'exam', 'vaccine']
+
+        paged, cursor = timeline_page(patient, limit=5)
+        while cursor:
+            with CaptureQueriesContext(connection) as queries:
+                page, cursor = timeline_page(patient, cursor, limit=5)
+            assert len(queries) == len(STREAMS)
+            paged.extend(page)
+        assert [(e['type'], e['id']) for e in paged] == [(e['type'], e['id']) for e in events]
+
+    def test_view_scopes_patient_and_rejects_bad_cursor(self, patient):
+        """Testa que o paciente só vê a própria linha do tempo e que cursores inválidos são recusados."""
+        other = Patient.objects.create(
+            user=User.objects.create_user(username='pac2', password='x', cpf='300.000.000-00', user_type='patient')
+        )
+        request = RequestFactory().get(f'/patients/{patient.pk}/timeline/', {'limit': 3})
+        request.user = other.user
+        data = json.loads(PatientTimelineView.as_view()(request, pk=patient.pk).content)
+        assert data == {'results': [], 'next_cursor': None}
+
+        request = RequestFactory().get(f'/patients/{patient.pk}/timeline/', {'cursor': 'invalido'})
+        request.user = patient.user
+        assert PatientTimelineView.as_view()(request, pk=patient.pk).status_code == 400
+
+
+@pytest.mark.django_db
+class TestPatientAnalyteTrend:
+    """Testes para a API de séries de analitos do paciente."""
+
+    def test_trend_view_filters_period_and_scopes_patient(self):
+        """Testa o filtro por período e que outro paciente não vê a série."""
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doc', password='x', cpf='100.000.000-00', user_type='doctor'),
+            crm='1/SP', specialty='Endocrinologia'
+        )
+        patient = Patient.objects.create(
+            user=User.objects.create_user(username='pac', password='x', cpf='200.000.000-00', user_type='patient')
+        )
+        for year in range(2016, 2026):
+            exam = Exam.objects.create(patient=patient, doctor=doctor, exam_type='blood', exam_name='Glicemia')
+            ingest_values(exam, [{'analyte': 'GLI', 'value': year - 1900, 'collected_at': f'{year}-06-01'}])
+
+        request = RequestFactory().get(f'/patients/{patient.pk}/trend/GLI/', {'start': '2020-01-01', 'end': '2023-01-01'})
+        request.user = doctor.user
+        data = json.loads(PatientAnalyteTrendView.as_view()(request, pk=patient.pk, analyte='GLI').content)
+        assert data['v'] == [120.0, 121.0, 122.0]
+
+        other = Patient.objects.create(
+            user=User.objects.create_user(username='pac2', password='x', cpf='300.000.000-00', user_type='patient')
+        )
+        request = RequestFactory().get(f'/patients/{patient.pk}/trend/GLI/')
+        request.user = other.user
+        assert json.loads(PatientAnalyteTrendView.as_view()(request, pk=patient.pk, analyte='GLI').content)['total'] == 0
+
+
+@pytest.mark.django_db
+class TestPatientDataExport:
+    """Testes para a exportação dos dados do paciente (LGPD)."""
+
+    def test_export_job_builds_zip_with_data_and_files(self, settings, tmp_path):
+        """Testa a solicitação, a geração em segundo plano e o download restrito ao paciente."""
+        settings.MEDIA_ROOT = str(tmp_path)
+        doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doc', password='x', cpf='100.000.000-00', user_type='doctor'),
+            crm='1/SP', specialty='Clínica'
+        )
+        patient = Patient.objects.create(
+            user=User.objects.create_user(
+                username='pac', password='x', cpf='200.000.000-00', user_type='patient', first_name='Maria'
+            )
+        )
+        Allergy.objects.create(patient=patient, allergen='Dipirona', severity='severe', reaction='Urticária')
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, scheduled_date=date(2026, 1, 1), scheduled_time=time(8, 0)
+        )
+        record = MedicalRecord.objects.create(
+            appointment=appointment, patient=patient, doctor=doctor, chief_complaint='Cefaleia'
+        )
+        exam = Exam.objects.create(
+            medical_record=record, patient=patient, doctor=doctor, exam_type='blood', exam_name='Hemograma'
+        )
+        exam.result_file.save('hemograma.pdf', ContentFile(b'%PDF-1.4 resultado'))
+
+        request = RequestFactory().post('/patients/my-data/')
+        request.user = patient.user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        assert PatientDataExportView.as_view()(request).status_code == 302
+        assert run_pending_jobs() == 1
+
+        export = PatientDataExport.objects.get(patient=patient)
+        assert export.status == 'ready' and export.expires_at > export.finished_at
+        with export.file.open('rb') as export_file:
+            archive = zipfile.ZipFile(io.BytesIO(export_file.read()))
+        assert json.loads(archive.read('dados/usuario.json'))['first_name'] == 'Maria'
+        assert 'password' not in json.loads(archive.read('dados/usuario.json'))
+        assert json.loads(archive.read('dados/alergias.json'))[0]['allergen'] == 'Dipirona'
+        assert json.loads(archive.read('dados/prontuarios.json'))[0]['chief_complaint'] == 'Cefaleia'
+        assert archive.read(f'arquivos/exames/exame_{exam.pk}.pdf') == b'%PDF-1.4 resultado'
+        assert json.loads(archive.read('manifesto.json'))['arquivos'] == 1
+
+        other = Patient.objects.create(
+            user=User.objects.create_user(username='pac2', password='x', cpf='300.000.000-00', user_type='patient')
+        )
+        request = RequestFactory().get(f'/patients/data-export/{export.pk}/file/')
+        request.user = other.user
+        with pytest.raises(Http404):
+            PatientDataExportFileView.as_view()(request, pk=export.pk)
+        request.user = patient.user
+        assert PatientDataExportFileView.as_view()(request, pk=export.pk).status_code == 200
@@ -0,0 +1,157 @@
+"""
+Linha do tempo clínica do paciente.
+
+Consultas, receitas, exames, vacinas, medicamentos e alergias ficam em tabelas
+separadas. Cada tabela é lida como um fluxo já ordenado pela data (índice
+paciente + data), limitado ao tamanho da página e posicionado após o cursor;
+os fluxos são intercalados com um heap (``heapq.merge``). Assim cada página
+lê no máximo ``limite + 1`` linhas por tabela, independentemente de quantos
+anos de histórico o paciente tenha.
+
+O cursor é a chave do último evento da página: (data/hora, tipo, id).
+Eventos com apenas data (vacinas, exames...) são posicionados à meia-noite
+do dia, no fuso do projeto.
+"""
+
+import base64
+import binascii
+import heapq
+from datetime import datetime, time
+from itertools import islice
+from operator import itemgetter
+
+from django.db.models import DateTimeField, Q
+from django.utils import timezone
+
+from medical_records.models import Exam, MedicalRecord, Prescription
+
+from .models import Allergy, Medication, Vaccine
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class TimelineStream:
+    """Fluxo de eventos de uma tabela, em ordem decrescente de data."""
+
+    def __init__(self, kind, model, date_field, fields, describe):
+        self.kind = kind
+        self.model = model
+        self.date_field = date_field
+        self.fields = fields
+        self.describe = describe
+        self.is_date = not isinstance(model._meta.get_field(date_field), DateTimeField)
+        self.rank = None
+
+    def sort_value(self, value):
+        if self.is_date:
+            return timezone.make_aware(datetime.combine(value, time.min))
+        return value
+
+    def before(self, position):
+        """Filtro das linhas cuja chave (data, tipo, id) vem depois do cursor na ordem decrescente."""
+        moment, rank, pk = position
+        field = self.date_field
+        if self.is_date:
+            day = timezone.localtime(moment).date()
+            at_midnight = moment == self.sort_value(day)
+            earlier = Q(**{f'{field}__lt': day}) if at_midnight else Q(**{f'{field}__lte': day})
+            same = Q(**{field: day}) if at_midnight else None
+            earlier_or_same = Q(**{f'{field}__lte': day})
+        else:
+            earlier = Q(**{f'{field}__lt': moment})
+            same = Q(**{field: moment})
+            earlier_or_same = Q(**{f'{field}__lte': moment})
+
+        if self.rank < rank:
+            return earlier_or_same
+        if self.rank > rank or same is None:
+            return earlier
+        return earlier | (same & Q(pk__lt=pk))
+
+    def events(self, patient, position, limit):
+        queryset = self.model.objects.filter(patient=patient)
+        if position is not None:
+            queryset = queryset.filter(self.before(position))
+        rows = (
+            queryset
+            .order_by(f'-{self.date_field}', '-pk')
+            .values('pk', self.date_field, *self.fields)[:limit]
+        )
+        for row in rows:
+            value = row[self.date_field]
+            title, summary = self.describe(row)
+            yield (self.sort_value(value), self.rank, row['pk']), {
+                'type': self.kind,
+                'id': row['pk'],
+                'date': value.isoformat(),
+                'title': title,
+                'summary': summary,
+            }
+
+
+def _doctor_name(row):
+    return f"Dr(a). {row['doctor__user__first_name']} {row['doctor__user__last_name']}".strip()
+
+
+STREAMS = [
+    TimelineStream(
+        'allergy', Allergy, 'created_at', ('allergen', 'severity', 'reaction'),
+        lambda row: (f"Alergia: {row['allergen']}", row['reaction']),
+    ),
+    TimelineStream(
+        'medication', Medication, 'start_date', ('name', 'dosage', 'frequency'),
+        lambda row: (f"Medicamento: {row['name']}", f"{row['dosage']} - {row['frequency']}"),
+    ),
+    TimelineStream(
+        'vaccine', Vaccine, 'application_date', ('name', 'dose'),
+        lambda row: (f"Vacina: {row['name']}", row['dose']),
+    ),
+    TimelineStream(
+        'exam', Exam, 'requested_date', ('exam_name', 'status', 'doctor__user__first_name', 'doctor__user__last_name'),
+        lambda row: (f"Exame: {row['exam_name']}", _doctor_name(row)),
+    ),
+    TimelineStream(
+        'prescription', Prescription, 'created_at', ('medications', 'doctor__user__first_name', 'doctor__user__last_name'),
+        lambda row: (f"Receita - {_doctor_name(row)}", row['medications'][:200]),
+    ),
+    TimelineStream(
+        'record', MedicalRecord, 'created_at', ('chief_complaint', 'diagnosis', 'doctor__user__first_name', 'doctor__user__last_name'),
+        lambda row: (f"Consulta - {_doctor_name(row)}", row['diagnosis'][:200] or row['chief_complaint'][:200]),
+    ),
+]
+# Em eventos no mesmo instante, o tipo de maior posição aparece primeiro
+for _rank, _stream in enumerate(STREAMS):
+    _stream.rank = _rank
+STREAM_RANKS = {stream.kind: stream.rank for stream in STREAMS}
+
+
+def encode_cursor(key):
+    moment, rank, pk = key
+    raw = f'{moment.isoformat()}|{STREAMS[rank].kind}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Converte o cursor recebido na chave (data/hora, tipo, id); ValueError se inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        moment, kind, pk = raw.split('|')
+        moment = datetime.fromisoformat(moment)
+        if timezone.is_naive(moment):
+            raise ValueError
+        return moment, STREAM_RANKS[kind], int(pk)
+    except (KeyError, UnicodeDecodeError, ValueError, binascii.Error):
+        raise ValueError('Cursor inválido.')
+
+
+def timeline_page(patient, cursor=None, limit=PAGE_SIZE):
+    """
+    Página da linha do tempo do paciente, do mais recente para o mais antigo.
+    Retorna (eventos, cursor da próxima página ou None).
+    """
+    position = decode_cursor(cursor) if cursor else None
+    streams = [stream.events(patient, position, limit + 1) for stream in STREAMS]
+    page = list(islice(heapq.merge(*streams, key=itemgetter(0), reverse=True), limit + 1))
+    next_cursor = encode_cursor(page[limit - 1][0]) if len(page) > limit else None
+    return [event for _, event in page[:limit]], next_cursor
@@ -5,11 +5,17 @@ app_name = 'patients'
 
 urlpatterns = [
     path('', views.PatientListView.as_view(), name='patient_list'),
+    path('autocomplete/', views.PatientAutocompleteView.as_view(), name='patient_autocomplete'),
     path('<int:pk>/', views.PatientDetailView.as_view(), name='patient_detail'),
+    path('<int:pk>/timeline/', views.PatientTimelineView.as_view(), name='patient_timeline'),
+    path('<int:pk>/trend/<str:analyte>/', views.PatientAnalyteTrendView.as_view(), name='patient_analyte_trend'),
     path('create/', views.PatientCreateView.as_view(), name='patient_create'),
     path('<int:pk>/edit/', views.PatientUpdateView.as_view(), name='patient_update'),
     path('allergies/', views.AllergyListView.as_view(), name='allergy_list'),
     path('vaccines/', views.VaccineListView.as_view(), name='vaccine_list'),
     path('medications/', views.MedicationListView.as_view(), name='medication_list'),
     path("my-record/", views.PatientDetailView.as_view(), name="my_medical_record"),
+    path('my-data/', views.PatientDataExportView.as_view(), name='my_data_export'),
+    path('<int:pk>/data-export/', views.PatientDataExportView.as_view(), name='patient_data_export'),
+    path('data-export/<int:pk>/file/', views.PatientDataExportFileView.as_view(), name='data_export_file'),
 ]
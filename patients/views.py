@@ -1,11 +1,36 @@
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
-from accounts.utils import log_access
+from accounts.utils import log_access, format_cpf_prefix, get_autocomplete_term, AUTOCOMPLETE_LIMIT
 from django.db.models import Q
-from django.shortcuts import get_object_or_404
-from django.http import Http404
+from django.db import transaction
+from django.shortcuts import get_object_or_404, render
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.views import View
 from django.urls import reverse_lazy
-from .models import Patient, Allergy, Vaccine, Medication
+from django.utils import timezone
+from accounts.jobs import enqueue
+from medical_records.views import ProtectedFileView
+from .models import Patient, PatientDataExport, Allergy, Vaccine, Medication
+from .timeline import MAX_PAGE_SIZE, PAGE_SIZE, timeline_page
+from medical_records.analytes import DEFAULT_POINTS, MAX_POINTS, analyte_trend, parse_moment
+
+
+def get_patient_for_user(user, pk):
+    """
+    Garante que o paciente só pode ver seu próprio prontuário,
+    ou que médicos/atendentes podem ver qualquer prontuário.
+    """
+    if user.is_patient():
+        # Paciente só pode ver o próprio prontuário
+        return get_object_or_404(Patient, user=user)
+
+    # Médicos, Atendentes e Admins podem ver qualquer prontuário
+    if user.is_doctor() or user.is_attendant() or user.is_admin():
+        return get_object_or_404(Patient, pk=pk)
+
+    raise Http404("Acesso negado.")
+
 
 class PatientDetailView(LoginRequiredMixin, DetailView):
     def get(self, request, *args, **kwargs):
@@ -21,22 +46,7 @@ class PatientDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'patient'
 
     def get_object(self, queryset=None):
-        """
-        Garante que o paciente só pode ver seu próprio prontuário,
-        ou que médicos/atendentes podem ver qualquer prontuário.
-        """
-        user = self.request.user
-        
-        if user.is_patient():
-            # Paciente só pode ver o próprio prontuário
-            return get_object_or_404(Patient, user=user)
-        
-        # Médicos, Atendentes e Admins podem ver qualquer prontuário
-        if user.is_doctor() or user.is_attendant() or user.is_admin():
-            pk = self.kwargs.get(self.pk_url_kwarg)
-            return get_object_or_404(Patient, pk=pk)
-            
-        raise Http404("Acesso negado.")
+        return get_patient_for_user(self.request.user, self.kwargs.get(self.pk_url_kwarg))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -50,6 +60,100 @@ class PatientDetailView(LoginRequiredMixin, DetailView):
         
         return context
 
+class PatientTimelineView(LoginRequiredMixin, View):
+    """
+    API JSON da linha do tempo clínica do paciente (consultas, receitas, exames,
+    vacinas, medicamentos e alergias), paginada por cursor: ``?cursor=`` recebe
+    o ``next_cursor`` da página anterior.
+    """
+
+    def get(self, request, pk=None):
+        patient = get_patient_for_user(request.user, pk)
+        try:
+            limit = min(max(int(request.GET.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+            events, next_cursor = timeline_page(patient, request.GET.get('cursor') or None, limit)
+        except ValueError:
+            return JsonResponse({'error': 'Parâmetros de paginação inválidos.'}, status=400)
+
+        if not request.GET.get('cursor'):
+            log_access(request, 'view_patient', f'Visualizou a linha do tempo do paciente {patient.user.get_full_name()} (ID: {patient.pk})')
+        return JsonResponse({'results': events, 'next_cursor': next_cursor})
+
+class PatientAnalyteTrendView(LoginRequiredMixin, View):
+    """
+    API JSON da série de um analito do paciente (ex.: glicose ao longo dos anos),
+    reduzida a no máximo ``?points=`` pontos. Aceita ``?start=`` e ``?end=`` (ISO 8601).
+    """
+
+    def get(self, request, pk, analyte):
+        patient = get_patient_for_user(request.user, pk)
+        try:
+            points = min(max(int(request.GET.get('points', DEFAULT_POINTS)), 3), MAX_POINTS)
+            start = parse_moment(request.GET['start']) if request.GET.get('start') else None
+            end = parse_moment(request.GET['end']) if request.GET.get('end') else None
+        except ValueError:
+            return JsonResponse({'error': 'Parâmetros inválidos.'}, status=400)
+
+        log_access(request, 'view_patient', f'Visualizou a série de {analyte} do paciente {patient.user.get_full_name()} (ID: {patient.pk})')
+        return JsonResponse(analyte_trend(patient, analyte, start, end, points))
+
+class PatientDataExportView(LoginRequiredMixin, View):
+    """
+    Cópia dos dados do paciente (LGPD): o paciente solicita a própria
+    exportação e o administrador, a de qualquer paciente. O ZIP é gerado pelo
+    worker e fica disponível por DATA_EXPORT_RETENTION_DAYS dias.
+    """
+    template_name = 'patients/data_export.html'
+
+    def get_patient(self):
+        user = self.request.user
+        if user.is_patient():
+            return get_object_or_404(Patient.objects.select_related('user'), user=user)
+        if user.is_admin() and 'pk' in self.kwargs:
+            return get_object_or_404(Patient.objects.select_related('user'), pk=self.kwargs['pk'])
+        raise Http404("Acesso negado.")
+
+    def get(self, request, pk=None):
+        patient = self.get_patient()
+        exports = list(patient.data_exports.all()[:10])
+        return render(request, self.template_name, {
+            'patient': patient,
+            'exports': exports,
+            'in_progress': any(export.status in ('pending', 'running') for export in exports),
+            'now': timezone.now(),
+        })
+
+    def post(self, request, pk=None):
+        patient = self.get_patient()
+        if patient.data_exports.filter(status__in=['pending', 'running']).exists():
+            messages.info(request, 'Já existe uma exportação em andamento.')
+            return HttpResponseRedirect(request.path)
+
+        with transaction.atomic():
+            export = PatientDataExport.objects.create(patient=patient, requested_by=request.user)
+            enqueue('patients.tasks.build_patient_data_export', export_id=export.pk)
+
+        log_access(request, 'export_data', f'Solicitou a exportação dos dados do paciente {patient.user.get_full_name()} (ID: {patient.pk})')
+        messages.success(request, 'Exportação solicitada. O arquivo ficará disponível nesta página em instantes.')
+        return HttpResponseRedirect(request.path)
+
+
+class PatientDataExportFileView(ProtectedFileView):
+    """Download do ZIP da exportação de dados (apenas o próprio paciente ou administradores)."""
+    model = PatientDataExport
+    file_field = 'file'
+
+    def get_queryset(self):
+        return self.model.objects.filter(status='ready', expires_at__gt=timezone.now()).select_related('patient__user')
+
+    def has_permission(self, obj):
+        user = self.request.user
+        return user.is_admin() or (user.is_patient() and obj.patient.user_id == user.pk)
+
+    def get_download_name(self, obj, field_file):
+        return f'meus_dados_{timezone.localtime(obj.finished_at):%Y%m%d}.zip'
+
+
 class PatientCreateView(LoginRequiredMixin, CreateView):
     model = Patient
     template_name = 'patients/patient_form.html'
@@ -101,3 +205,44 @@ class PatientListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
                 Q(user__cpf__icontains=query)
             )
         return queryset
+
+
+class PatientAutocompleteView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    API JSON de autocomplete de pacientes por prefixo de nome ou CPF.
+    Retorna apenas id e rótulo, sem instanciar os modelos.
+    """
+
+    def test_func(self):
+        user = self.request.user
+        return user.is_doctor() or user.is_attendant() or user.is_admin()
+
+    def get(self, request):
+        term = get_autocomplete_term(request)
+        if term is None:
+            return JsonResponse({'results': []})
+
+        digits = ''.join(c for c in term if c.isdigit())
+        if digits and len(digits) == len(term.replace('.', '').replace('-', '')):
+            # Termo numérico: busca por prefixo do CPF formatado
+            search = Q(user__cpf__startswith=format_cpf_prefix(digits))
+        else:
+            first, _, rest = term.partition(' ')
+            search = Q(user__first_name__istartswith=first)
+            if rest:
+                search &= Q(user__last_name__istartswith=rest)
+            else:
+                search |= Q(user__last_name__istartswith=first)
+
+        rows = (
+            Patient.objects
+            .filter(search)
+            .order_by('user__first_name', 'user__last_name')
+            .values_list('pk', 'user__first_name', 'user__last_name', 'user__cpf')
+            [:AUTOCOMPLETE_LIMIT]
+        )
+        results = [
+            {'id': pk, 'text': f"{first_name} {last_name} - CPF: {cpf}"}
+            for pk, first_name, last_name, cpf in rows
+        ]
+        return JsonResponse({'results': results})
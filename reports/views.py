@@ -15,7 +15,9 @@ import tempfile
 from django.views import View
 
 from appointments.models import Appointment
+from appointments.durations import projected_capacity
 from medical_records.models import MedicalRecord
+from medical_records.utils import top_diagnoses
 # from .models import Report # Assumindo que Report não é necessário para o relatório do médico
 
 
@@ -57,14 +59,34 @@ class DoctorReportView(LoginRequiredMixin, DoctorRequiredMixin, TemplateView):
         
         context['recent_appointments_count'] = recent_appointments.count()
         
-        # 5. Top 5 Diagnósticos (simples)
-        # Agrupa por diagnóstico e conta
-        top_diagnoses = medical_records.values('diagnosis').annotate(count=Count('diagnosis')).order_by('-count')[:5]
-        context['top_diagnoses'] = top_diagnoses
+        # 5. Top 5 Diagnósticos
+        # Agrupa pelos códigos CID-10 (o texto livre varia entre prontuários)
+        context['top_diagnoses'] = top_diagnoses(medical_records)
         
         return context
 
 
+class DurationCapacityReportView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """
+    Projeção da capacidade de atendimento com as durações estimadas de consulta
+    em comparação com a duração fixa atual (apenas admin).
+    """
+    template_name = 'reports/duration_capacity_report.html'
+
+    def test_func(self):
+        return self.request.user.is_admin()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        projection = projected_capacity()
+        context['projection'] = projection
+        if projection:
+            context['average_change'] = round(
+                sum(row['capacity_change'] for row in projection) / len(projection), 1
+            )
+        return context
+
+
 # Views placeholder existentes (mantidas para compatibilidade)
 class ReportListView(LoginRequiredMixin, ListView):
     # model = Report # Descomentar se o modelo Report for implementado
@@ -135,11 +157,7 @@ class ReportGenerateView(LoginRequiredMixin, TemplateView):
         # ---------------------------
         # 5. Top diagnósticos
         # ---------------------------
-        top_diagnoses = (
-            medical_records.values('diagnosis')
-            .annotate(count=Count('diagnosis'))
-            .order_by('-count')[:5]
-        )
+        diagnoses = top_diagnoses(medical_records)
 
         # ---------------------------
         # Enviar tudo para o template
@@ -157,7 +175,7 @@ class ReportGenerateView(LoginRequiredMixin, TemplateView):
 
             "recent_appointments_count": recent_appointments_count,
 
-            "top_diagnoses": top_diagnoses,
+            "top_diagnoses": diagnoses,
         }
 
         return self.render_to_response(context)
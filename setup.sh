@@ -64,6 +64,11 @@ echo "Executando migrações..."
 python manage.py migrate > /dev/null 2>&1
 echo -e "${GREEN}✓ Migrações executadas${NC}"
 
+# Catálogo CID-10
+echo "Carregando catálogo CID-10..."
+python manage.py load_cid10
+echo -e "${GREEN}✓ Catálogo CID-10 carregado${NC}"
+
 # Usuários iniciais
 echo "Criando usuários..."
 python manage.py create_initial_users
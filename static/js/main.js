@@ -47,3 +47,57 @@ function formatCEP(input) {
     }
     input.value = value;
 }
+
+// Autocomplete para selects com data-autocomplete-url
+// O select renderiza apenas a opção escolhida; as demais vêm do endpoint JSON.
+function initAutocompleteSelect(select) {
+    if (select.dataset.autocompleteReady) {
+        return;
+    }
+    select.dataset.autocompleteReady = '1';
+    const url = select.dataset.autocompleteUrl;
+    const minLength = parseInt(select.dataset.autocompleteMinLength || '2', 10);
+    const input = document.createElement('input');
+    input.type = 'search';
+    input.className = 'form-control';
+    input.placeholder = 'Digite para buscar...';
+    input.setAttribute('autocomplete', 'off');
+    select.parentNode.insertBefore(input, select);
+
+    let timer = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const term = input.value.trim();
+        if (term.length < minLength) {
+            return;
+        }
+        timer = setTimeout(function() {
+            fetch(url + '?q=' + encodeURIComponent(term), {credentials: 'same-origin'})
+                .then(function(response) { return response.json(); })
+                .then(function(data) {
+                    // Mantém as opções escolhidas (mais de uma em selects múltiplos)
+                    const selected = new Set();
+                    select.querySelectorAll('option').forEach(function(option) {
+                        if (option.selected) {
+                            selected.add(option.value);
+                        } else if (option.value) {
+                            option.remove();
+                        }
+                    });
+                    data.results.forEach(function(item) {
+                        if (selected.has(String(item.id))) {
+                            return;
+                        }
+                        const option = document.createElement('option');
+                        option.value = item.id;
+                        option.textContent = item.text;
+                        select.appendChild(option);
+                    });
+                });
+        }, 250);
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(initAutocompleteSelect);
+});